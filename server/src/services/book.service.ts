@@ -248,11 +248,20 @@ export async function uploadBookAndTriggerPipeline({
 
   // Fire the pipeline with only the book id; Flask will process in background and set state=finished
   try {
-    await triggerUploadPipeline({
-      book_id: created._id.toString(),
-      use_ocr: useOcr,
-    });
+    await triggerUploadPipeline(
+      {
+        book_id: created._id.toString(),
+        use_ocr: useOcr,
+      },
+      user._id.toString()
+    );
   } catch (error) {
+    if (error instanceof HttpError && error.statusCode === 429) {
+      // Admission control turned the job away: nothing will ever process this
+      // placeholder, so remove it and let the client retry the upload
+      await performBookDeletion(created);
+      throw error;
+    }
     // Log and continue – the client should still see the placeholder entry
     logger.warn("Trigger pipeline failed (request)", error);
   }
@@ -17,7 +17,11 @@ export interface UploadPipelinePayload {
   use_ocr?: boolean;
 }
 
-export async function triggerUploadPipeline(payload: UploadPipelinePayload) {
+// Flask admits pipeline work per user (admission control); without this header all
+// uploads would share one identity
+const USER_ID_HEADER = "X-User-Id";
+
+export async function triggerUploadPipeline(payload: UploadPipelinePayload, userId: string) {
   try {
     const response = await axios.post<{ status: string; book_id: string }>(
       `${env.flaskBaseUrl}/api/v1/pipelines/upload-embed`,
@@ -25,6 +29,7 @@ export async function triggerUploadPipeline(payload: UploadPipelinePayload) {
       {
         // Flask returns immediately and processes in background
         timeout: 15 * 1000,
+        headers: { [USER_ID_HEADER]: userId },
       }
     );
 
@@ -34,6 +39,13 @@ export async function triggerUploadPipeline(payload: UploadPipelinePayload) {
 
     return { status: response.data.status, book_id: response.data.book_id, book_title: "", visibility: "Private", used_ocr: Boolean((payload as any).use_ocr) } as unknown as UploadPipelineResponse;
   } catch (error) {
+    if (axios.isAxiosError(error) && error.response?.status === 429) {
+      // Admission control rejected the job: the pipeline is busy, not broken
+      logger.warn("Upload pipeline busy", error.response.headers["retry-after"]);
+      throw new HttpError(429, "Upload pipeline is busy, please retry later", {
+        retryAfter: error.response.headers["retry-after"],
+      });
+    }
     logger.error("Upload pipeline failed", error);
     throw new HttpError(502, "Failed to execute upload pipeline", error);
   }
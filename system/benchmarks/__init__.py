@@ -0,0 +1 @@
+"""Offline performance benchmarks with local Mistral, S3 and MongoDB stand-ins."""
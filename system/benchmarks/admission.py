@@ -0,0 +1,131 @@
+"""Admission control benchmark: small-request tail latency next to a heavy user.
+
+Simulates the generation pool in-process, with requests that sleep for
+--ms-per-question per requested question instead of calling the LLM. One
+heavy user keeps --heavy-clients requests of --heavy-questions questions in
+flight while --light-users users each send --light-questions-question
+requests in a closed loop. The run is repeated with:
+
+- semaphore: only a global concurrency limit, first come first served
+- admission: AdmissionController (per-user limit and weighted fair queuing)
+
+and reports latency for the light users, throughput per user class and
+how many requests were rejected with 429.
+
+Usage:
+    python benchmarks/admission.py
+    python benchmarks/admission.py --duration 20 --heavy-clients 16 --json admission.json
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, List
+
+# Ensure we can import from src/ and benchmarks/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stats import latency_summary
+from src.utils.admission import AdmissionController, AdmissionRejected
+
+
+def _semaphore_admit(max_concurrent: int) -> Callable[[str, int], ContextManager[Any]]:
+    semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    @contextmanager
+    def _admit(user: str, cost: int):
+        with semaphore:
+            yield
+
+    return _admit
+
+
+def simulate(admit: Callable[[str, int], ContextManager[Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    """Run heavy and light clients against admit for args.duration seconds."""
+    latencies: Dict[str, List[float]] = {"light": [], "heavy": []}
+    rejected = {"light": 0, "heavy": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def _client(kind: str, user: str, questions: int) -> None:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                with admit(user, questions):
+                    time.sleep(questions * args.ms_per_question / 1000)
+            except AdmissionRejected as exc:
+                with lock:
+                    rejected[kind] += 1
+                time.sleep(min(exc.retry_after, 1))
+                continue
+            with lock:
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    clients = [
+        threading.Thread(target=_client, args=("heavy", "heavy", args.heavy_questions), daemon=True)
+        for _ in range(args.heavy_clients)
+    ]
+    clients += [
+        threading.Thread(target=_client, args=("light", f"light-{i}", args.light_questions), daemon=True)
+        for i in range(args.light_users)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    return {
+        kind: dict(
+            latency_summary(values),
+            max_ms=round(max(values, default=0.0), 3),
+            requests_per_s=round(len(values) / args.duration, 1),
+            rejected=rejected[kind],
+        )
+        for kind, values in latencies.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="global concurrency limit")
+    parser.add_argument("--max-per-user", type=int, default=2, help="per-user concurrency limit")
+    parser.add_argument("--heavy-clients", type=int, default=12, help="concurrent requests from the heavy user")
+    parser.add_argument("--heavy-questions", type=int, default=200, help="questions per heavy request")
+    parser.add_argument("--light-users", type=int, default=6, help="users sending small requests")
+    parser.add_argument("--light-questions", type=int, default=5, help="questions per small request")
+    parser.add_argument("--ms-per-question", type=float, default=5, help="simulated generation time per question")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    runs = {
+        "semaphore": _semaphore_admit(args.max_concurrent),
+        "admission": AdmissionController(
+            "benchmark", max_concurrent=args.max_concurrent, max_per_user=args.max_per_user
+        ).admit,
+    }
+    results = {}
+    for name, admit in runs.items():
+        print(f"{name}: {args.duration:.0f}s...")
+        results[name] = simulate(admit, args)
+
+    print(f"\n{'mode':<12}{'class':<8}{'req/s':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'429s':>7}")
+    for name, by_class in results.items():
+        for kind, result in by_class.items():
+            print(
+                f"{name:<12}{kind:<8}{result['requests_per_s']:>8.1f}{result['p50_ms']:>10.1f}"
+                f"{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}{result['rejected']:>7}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump({"config": vars(args), "results": results}, out, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
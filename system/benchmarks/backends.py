@@ -0,0 +1,166 @@
+"""Offline stand-ins for Mistral, S3 and MongoDB.
+
+OfflineBackends starts the fake Mistral server, an S3 server (moto's
+ThreadedMotoServer unless an S3-compatible endpoint is given) and MongoDB
+(mongomock in-process unless a mongod URI is given), and sets the
+environment the pipeline reads so PDFProcessor, TextEmbedder and
+NewQuestionGenerator run unchanged against them.
+
+Retrieval uses the local NumPy engine (RETRIEVAL_BACKEND=local), since
+neither mongomock nor a plain mongod implements $vectorSearch.
+"""
+
+import json
+import logging
+import os
+import socket
+import tempfile
+from typing import Any, Dict, Optional
+
+import boto3
+
+from .fake_mistral import FakeMistralServer
+
+BUCKET_NAME = "booktestmaker-bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OfflineBackends:
+    """Starts local backends and points the pipeline's environment at them."""
+
+    def __init__(
+        self,
+        embed_latency: float = 0.05,
+        chat_latency: float = 1.0,
+        embed_pause: float = 0.0,
+        mongo_uri: Optional[str] = None,
+        s3_endpoint: Optional[str] = None,
+        use_caches: bool = False,
+    ):
+        self.mistral = FakeMistralServer(embed_latency=embed_latency, chat_latency=chat_latency)
+        self.embed_pause = embed_pause
+        self.mongo_uri = mongo_uri
+        self.s3_endpoint = s3_endpoint
+        self.use_caches = use_caches
+        self.workdir = tempfile.mkdtemp(prefix="btm-bench-")
+        self._moto = None
+        self._mongo_client = None
+        self._previous_env: Dict[str, Optional[str]] = {}
+
+    def _set_env(self, values: Dict[str, str]) -> None:
+        for key, value in values.items():
+            self._previous_env.setdefault(key, os.environ.get(key))
+            os.environ[key] = value
+
+    def start(self) -> "OfflineBackends":
+        self.mistral.start()
+
+        if not self.s3_endpoint:
+            from moto.server import ThreadedMotoServer
+
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+            port = _free_port()
+            self._moto = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+            self._moto.start()
+            self.s3_endpoint = f"http://127.0.0.1:{port}"
+
+        cache_flag = "true" if self.use_caches else "false"
+        self._set_env({
+            "MISTRAL_SERVER_URL": self.mistral.url,
+            "MISTRAL_KEY": "offline",
+            "MISTRAL_NAME": "fake-large",
+            "MISTRAL_SMALL_NAME": "fake-small",
+            "MISTRAL_EMBED_NAME": "fake-embed",
+            "MISTRAL_OCR_NAME": "fake-ocr",
+            "MISTRAL_EMBED_PAUSE_SECONDS": str(self.embed_pause),
+            "AWS_ACCESS_KEY_ID": "offline",
+            "AWS_SECRET_ACCESS_KEY": "offline",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "AWS_BUCKET_NAME": BUCKET_NAME,
+            "AWS_ENDPOINT_URL_S3": self.s3_endpoint,
+            "MONGO_URI": self.mongo_uri or "mongodb://mongomock.invalid:27017",
+            "RETRIEVAL_BACKEND": "local",
+            "RETRIEVAL_CACHE_DIR": os.path.join(self.workdir, "retrieval"),
+            "QUESTION_POOL_ENABLED": "false",
+            "LLM_CACHE_ENABLED": cache_flag,
+            "EMBEDDING_CACHE_ENABLED": cache_flag,
+        })
+
+        if not self.mongo_uri:
+            import mongomock
+
+            from src.utils import database_funcs
+
+            # One in-process server shared by every get_mongo_client() call
+            self._mongo_client = mongomock.MongoClient()
+            database_funcs.MongoClient = lambda *args, **kwargs: self._mongo_client
+
+        s3 = self.s3_client()
+        existing = {bucket["Name"] for bucket in s3.list_buckets().get("Buckets", [])}
+        if BUCKET_NAME not in existing:
+            s3.create_bucket(Bucket=BUCKET_NAME)
+        # Subchapter links are downloaded anonymously, as from the production bucket
+        s3.put_bucket_policy(
+            Bucket=BUCKET_NAME,
+            Policy=json.dumps({
+                "Version": "2012-10-17",
+                "Statement": [{
+                    "Effect": "Allow",
+                    "Principal": "*",
+                    "Action": "s3:GetObject",
+                    "Resource": f"arn:aws:s3:::{BUCKET_NAME}/*",
+                }],
+            }),
+        )
+        return self
+
+    def stop(self) -> None:
+        self.mistral.stop()
+        if self._moto is not None:
+            self._moto.stop()
+        for key, value in self._previous_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    def __enter__(self) -> "OfflineBackends":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def s3_client(self) -> Any:
+        return boto3.client("s3", endpoint_url=self.s3_endpoint)
+
+    def upload_pdf(self, path: str, object_name: str) -> str:
+        """Upload a source PDF and return the URL the pipeline downloads it from."""
+        self.s3_client().upload_file(path, BUCKET_NAME, object_name)
+        return f"{self.s3_endpoint.rstrip('/')}/{BUCKET_NAME}/{object_name}"
+
+    def ingest(self, pdf_path: str, title: str) -> Any:
+        """Upload a PDF as a new book, process and embed it; return the book id."""
+        from bson import ObjectId
+
+        from src.core.pdf_processor import PDFProcessor
+        from src.core.text_embedder import TextEmbedder
+        from src.utils.database_funcs import get_mongo_client
+
+        book_id = ObjectId()
+        get_mongo_client()["bookTestMaker"]["books"].insert_one({
+            "_id": book_id,
+            "bookTitle": title,
+            "s3Link": self.upload_pdf(pdf_path, f"uploads/{book_id}.pdf"),
+            "visibility": "Private",
+            "uploader": ObjectId(),
+            "subchapterIds": [],
+            "chapterIds": [],
+        })
+        PDFProcessor().process_existing_book(book_id)
+        TextEmbedder().process_book(book_id)
+        return book_id
@@ -0,0 +1,186 @@
+"""Local stand-in for the Mistral embeddings and chat completions API.
+
+Serves POST /v1/embeddings, POST /v1/chat/completions and GET /v1/models
+(for health probes) with the response shapes the mistralai SDK validates,
+after a configurable latency. Embeddings
+are deterministic unit vectors derived from the input text, so repeated
+inputs get identical vectors. Chat responses are recognised by their system
+message: the exam maker gets a JSON object with questions, quality control a
+JSON object with one score per question.
+
+Point the models at it with MISTRAL_SERVER_URL=server.url.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+class FakeMistralServer:
+    """Threaded HTTP server imitating the Mistral API with fixed latencies."""
+
+    def __init__(
+        self,
+        embed_latency: float = 0.05,
+        chat_latency: float = 1.0,
+        jitter: float = 0.1,
+        dimensions: int = 1024,
+        questions_per_response: int = 5,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.embed_latency = embed_latency
+        self.chat_latency = chat_latency
+        self.jitter = jitter
+        self.dimensions = dimensions
+        self.questions_per_response = questions_per_response
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-mistral", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMistralServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeMistralServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _sleep(self, latency: float) -> None:
+        if latency > 0:
+            time.sleep(max(latency * (1 + random.uniform(-self.jitter, self.jitter)), 0))
+
+    def _count(self, endpoint: str) -> None:
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def embedding(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector.tolist()
+
+    def embeddings_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("inputs", body.get("input", []))
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self._sleep(self.embed_latency)
+        tokens = sum(len(text) // 4 for text in inputs)
+        return {
+            "id": f"emb-{random.getrandbits(48):012x}",
+            "object": "list",
+            "model": body.get("model", "fake-embed"),
+            "data": [
+                {"object": "embedding", "embedding": self.embedding(text), "index": index}
+                for index, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "completion_tokens": 0, "total_tokens": tokens},
+        }
+
+    def chat_content(self, system: str, prompt: str) -> str:
+        if "quality control" in system.lower():
+            count = len(re.findall(r'"text"\s*:', prompt)) or self.questions_per_response
+            return json.dumps({"scores": [round(random.uniform(0.6, 1.0), 2) for _ in range(count)]})
+
+        digest = hashlib.sha256(prompt.encode("utf-8", "surrogatepass")).hexdigest()[:12]
+        difficulties = ("easy", "medium", "hard")
+        return json.dumps({
+            "questions": [
+                {
+                    "text": f"Synthetic question {index} ({digest}): which statement about the passage holds?",
+                    "alternatives": [f"Statement {letter}" for letter in "ABCD"],
+                    "correct_alternative": "A",
+                    "difficulty": difficulties[index % len(difficulties)],
+                }
+                for index in range(self.questions_per_response)
+            ]
+        })
+
+    def chat_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages", [])
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        self._sleep(self.chat_latency)
+        content = self.chat_content(system, prompt)
+        prompt_tokens = (len(system) + len(prompt)) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chat-{random.getrandbits(48):012x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-chat"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0].rstrip("/").endswith("/models"):
+                    server._count("models")
+                    self._send_json({"object": "list", "data": [{"id": "fake-large", "object": "model"}]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.split("?", 1)[0].rstrip("/")
+                if path.endswith("/embeddings"):
+                    server._count("embeddings")
+                    payload = server.embeddings_response(body)
+                elif path.endswith("/chat/completions"):
+                    server._count("chat")
+                    payload = server.chat_response(body)
+                else:
+                    self.send_error(404)
+                    return
+                self._send_json(payload)
+
+            def _send_json(self, payload: Dict[str, Any]) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
@@ -0,0 +1,100 @@
+"""Import-time benchmark for the Flask service.
+
+Times, in fresh interpreters, the imports a worker performs before it can
+answer a request, and lists which heavy dependencies each one loads:
+
+- src: the top-level package
+- metrics: src.utils.metrics, as used by /metrics
+- blueprints: the upload and exam generation blueprints
+- api_server: scripts/api_server.py (imports the blueprints and runs
+  create_app), plus the first /health request; the pipeline is imported
+  and warmed by a background thread, so only the startup path is timed
+- pipeline: PDFProcessor, TextEmbedder and NewQuestionGenerator, the
+  imports startup used to pay for before they were deferred
+
+For a per-module breakdown run e.g.:
+    python -X importtime -c "import scripts.api_server" 2> importtime.log
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --json imports.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+# Ensure we can import benchmarks/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.stats import latency_summary
+
+ROOT = Path(__file__).parent.parent
+
+HEAVY_MODULES = (
+    "fitz", "PyPDF2", "boto3", "numpy", "openai", "mistralai",
+    "pymongo", "requests", "src.utils.tokenizer",
+)
+
+TARGETS = {
+    "src": "import src",
+    "metrics": "from src.utils.metrics import metrics_payload",
+    "blueprints": "import scripts.exam_generation_api, scripts.upload_embed_api",
+    "api_server": "from scripts.api_server import app; app.test_client().get('/health')",
+    "pipeline": (
+        "from src.core.pdf_processor import PDFProcessor; "
+        "from src.core.text_embedder import TextEmbedder; "
+        "from src.core.new_question_generation import NewQuestionGenerator"
+    ),
+}
+
+_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(statement: str, runs: int) -> Dict[str, Any]:
+    """Run statement in runs fresh interpreters and summarise the elapsed times."""
+    times = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _SNIPPET.format(statement=statement, heavy=HEAVY_MODULES)],
+            cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        times.append(result["ms"])
+        loaded = result["loaded"]
+    return dict(latency_summary(times), loaded=loaded)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {name: time_import(statement, args.runs) for name, statement in TARGETS.items()}
+
+    print(f"{'target':<12}{'p50 ms':>10}{'p99 ms':>10}  heavy modules loaded")
+    for name, result in results.items():
+        # api_server starts background threads that import the pipeline concurrently
+        loaded = "(background warm-up)" if name == "api_server" else ", ".join(result["loaded"]) or "-"
+        print(f"{name:<12}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}  {loaded}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(results, out, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
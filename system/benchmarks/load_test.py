@@ -0,0 +1,229 @@
+"""Load test: the Flask development server versus gunicorn.
+
+Starts the API twice against the offline backends (backends.py), once under
+Werkzeug's threaded development server (what python scripts/api_server.py
+runs) and once under gunicorn with gunicorn.conf.py. Each server is driven
+with a closed-loop load of --concurrency clients for --duration seconds per
+endpoint, and the script reports requests/s, p50/p99 latency and errors:
+
+- health: GET /health, measuring pure server overhead
+- ready: GET /ready, answered from cached probe results
+- generate: POST /api/v1/pipelines/generate-questions for one subchapter of
+  a small ingested book, with the fake LLM's latency (--chat-latency)
+
+Both servers run in processes forked from this one, so they inherit the
+in-process MongoDB stand-in with the ingested book; the fake Mistral and S3
+servers keep running here. Requires Linux (fork) and gunicorn.
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --duration 20 --concurrency 32 --workers 4 --threads 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Ensure we can import from src/ and benchmarks/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import requests
+
+from benchmarks.backends import OfflineBackends
+from benchmarks.run_pipeline import _generation_requests
+from benchmarks.stats import latency_summary
+from benchmarks.synthetic_pdf import build_textbook
+from src.utils.database_funcs import get_mongo_client
+
+ROOT = Path(__file__).parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _silence() -> None:
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+
+def _serve_dev(app: Any, port: int) -> None:
+    from werkzeug.serving import run_simple
+
+    from src.utils.health import get_health_monitor
+
+    _silence()
+    get_health_monitor().start()
+    # What app.run() does, without the debugger and reloader
+    run_simple("127.0.0.1", port, app, threaded=True)
+
+
+def _serve_gunicorn(app: Any, port: int, workers: int, threads: int) -> None:
+    from gunicorn.app.base import Application
+
+    class _Server(Application):
+        def load_config(self) -> None:
+            # gunicorn.conf.py supplies the settings and hooks; the command line is ours
+            self.load_config_from_file(str(ROOT / "gunicorn.conf.py"))
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("accesslog", None)
+
+        def load(self) -> Any:
+            return app
+
+    _silence()
+    _Server().run()
+
+
+def _start(target: Callable[..., None], *args: Any) -> multiprocessing.Process:
+    process = multiprocessing.get_context("fork").Process(target=target, args=args, daemon=False)
+    process.start()
+    return process
+
+
+def _wait_until_up(base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"server at {base_url} did not come up")
+
+
+def run_load(
+    send: Callable[[requests.Session], requests.Response],
+    concurrency: int,
+    duration: float,
+) -> Dict[str, Any]:
+    """Run concurrency closed-loop clients for duration seconds and summarise their requests."""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def _client() -> None:
+        nonlocal errors
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = send(session).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                errors += 0 if ok else 1
+
+    started = time.monotonic()
+    clients = [threading.Thread(target=_client, daemon=True) for _ in range(concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    wall = time.monotonic() - started
+    return dict(latency_summary(latencies), requests_per_s=round(len(latencies) / wall, 1), errors=errors)
+
+
+def _scenarios(base_url: str, payload: Dict[str, Any]) -> Dict[str, Callable[[requests.Session], requests.Response]]:
+    return {
+        "health": lambda session: session.get(f"{base_url}/health", timeout=30),
+        "ready": lambda session: session.get(f"{base_url}/ready", timeout=30),
+        "generate": lambda session: session.post(
+            f"{base_url}/api/v1/pipelines/generate-questions", json=payload, timeout=300
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="fake chat API latency (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="fake embeddings API latency (s)")
+    parser.add_argument("--endpoint", action="append", choices=("health", "ready", "generate"),
+                        help="endpoints to load (repeatable; default all)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    endpoints = args.endpoint or ["health", "ready", "generate"]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with OfflineBackends(embed_latency=args.embed_latency, chat_latency=args.chat_latency) as backends:
+        print("Ingesting a 20-page synthetic textbook...")
+        path = build_textbook(os.path.join(backends.workdir, "load-test.pdf"), pages=20, chapters=2)
+        book_id = backends.ingest(path, "load-test")
+        request = _generation_requests(get_mongo_client()["bookTestMaker"], book_id, 1)[0]
+        payload = {"subchapter_requests": [dict(request, questions_to_generate=5)]}
+
+        from scripts.api_server import create_app
+        from src.utils.health import get_health_monitor
+
+        app = create_app()
+        # Fork only once warm-up has finished and the probe thread is stopped: a
+        # thread holding an import or client lock at fork() would deadlock the child
+        client = app.test_client()
+        deadline = time.monotonic() + 60
+        while client.get("/ready").status_code != 200:
+            if time.monotonic() > deadline:
+                raise TimeoutError("application did not become ready")
+            time.sleep(0.2)
+        get_health_monitor().stop()
+        servers = {
+            "dev server": lambda port: _start(_serve_dev, app, port),
+            f"gunicorn {args.workers}x{args.threads}": lambda port: _start(
+                _serve_gunicorn, app, port, args.workers, args.threads
+            ),
+        }
+        for name, start in servers.items():
+            port = _free_port()
+            process: Optional[multiprocessing.Process] = start(port)
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                _wait_until_up(base_url)
+                scenarios = _scenarios(base_url, payload)
+                for endpoint in endpoints:
+                    print(f"{name}: {endpoint} for {args.duration:.0f}s at concurrency {args.concurrency}...")
+                    results.setdefault(name, {})[endpoint] = run_load(
+                        scenarios[endpoint], args.concurrency, args.duration
+                    )
+            finally:
+                # SIGTERM: gunicorn shuts down gracefully, draining in-flight requests
+                process.terminate()
+                process.join(30)
+                if process.is_alive():
+                    process.kill()
+
+    print(f"\n{'server':<18}{'endpoint':<10}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, by_endpoint in results.items():
+        for endpoint, result in by_endpoint.items():
+            print(
+                f"{name:<18}{endpoint:<10}{result['requests_per_s']:>9.1f}{result['p50_ms']:>10.1f}"
+                f"{result['p99_ms']:>10.1f}{result['errors']:>8}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump({"config": vars(args), "results": results}, out, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""End-to-end offline pipeline benchmark.
+
+Runs ingestion (PDFProcessor.process_existing_book), embedding
+(TextEmbedder.process_book) and question generation
+(NewQuestionGenerator.generate_for_subchapter) on real and synthetic
+textbooks against local stand-ins for Mistral, S3 and MongoDB (see
+backends.py), and reports per stage: throughput, p50/p99 latency of every
+traced sub-stage (download, extract, chunk, embed, insert, vector_search,
+generate, evaluate, ...) and peak RSS.
+
+Results can be saved with --json and compared against a saved baseline
+with --baseline; the exit code is 1 when a metric regressed by more than
+--tolerance.
+
+Requires the packages in benchmarks/requirements.txt.
+
+Usage:
+    python benchmarks/run_pipeline.py
+    python benchmarks/run_pipeline.py --synthetic-pages 1000 --generate 40 --concurrency 8
+    python benchmarks/run_pipeline.py --json bench.json
+    python benchmarks/run_pipeline.py --baseline bench.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Ensure we can import from src/ and benchmarks/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import fitz
+from bson import ObjectId
+
+from benchmarks.backends import OfflineBackends
+from benchmarks.stats import StageResult, StageTimer, span_summary
+from benchmarks.synthetic_pdf import build_textbook, with_toc
+from src.core.new_question_generation import NewQuestionGenerator
+from src.core.pdf_processor import PDFProcessor
+from src.core.text_embedder import TextEmbedder
+from src.utils.database_funcs import get_mongo_client
+from src.utils.tracing import InMemorySpanExporter, Tracer, set_tracer
+
+DEFAULT_PDF = str(Path(__file__).parent.parent / "data" / "textbooks" / "2.pdf")
+
+
+def _run_stage(exporter: InMemorySpanExporter, result: StageResult, fn: Any) -> Any:
+    exporter.clear()
+    with StageTimer(result):
+        value = fn()
+    result.spans = span_summary(exporter.spans)
+    return value
+
+
+def _generation_requests(db: Any, book_id: ObjectId, limit: int) -> List[Dict[str, Any]]:
+    book = db["books"].find_one({"_id": book_id})
+    requests: List[Dict[str, Any]] = []
+    for sub in db["subchapters"].find({"_id": {"$in": book.get("subchapterIds", [])}}).limit(limit):
+        requests.append(
+            {
+                "subchapter_id": str(sub["_id"]),
+                "book_id": str(book_id),
+                "chapter_id": str(sub["chapterID"]),
+                "subchapter_title": sub.get("subchapterTitle", ""),
+                "book_title": book.get("bookTitle", ""),
+                "chapter_title": "",
+                "questions_to_generate": 5,
+                "difficulty_distribution": {"easy": 2, "medium": 2, "hard": 1},
+                "exclude_hashes": [],
+            }
+        )
+    return requests
+
+
+def benchmark_book(
+    backends: OfflineBackends,
+    exporter: InMemorySpanExporter,
+    pdf_path: str,
+    label: str,
+    generate: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Run the three pipeline stages on one PDF and return their results."""
+    db = get_mongo_client()["bookTestMaker"]
+    pdf_path = with_toc(pdf_path, os.path.join(backends.workdir, f"{label}-toc.pdf"))
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count
+
+    book_id = ObjectId()
+    db["books"].insert_one(
+        {
+            "_id": book_id,
+            "bookTitle": label,
+            "s3Link": backends.upload_pdf(pdf_path, f"uploads/{book_id}.pdf"),
+            "visibility": "Private",
+            "uploader": ObjectId(),
+            "subchapterIds": [],
+            "chapterIds": [],
+        }
+    )
+
+    ingest = StageResult("ingest", "pages")
+    ingest.items = pages
+    _run_stage(exporter, ingest, lambda: PDFProcessor().process_existing_book(book_id))
+
+    embed = StageResult("embed", "chunks")
+    _run_stage(exporter, embed, lambda: TextEmbedder().process_book(book_id))
+    embed.items = db["chunkEmbeddings"].count_documents({"bookID": book_id})
+
+    generation = StageResult("generate", "subchapters")
+    requests = _generation_requests(db, book_id, generate)
+    generator = NewQuestionGenerator()
+
+    def _timed(request: Dict[str, Any]) -> float:
+        start = time.perf_counter()
+        result = generator.generate_for_subchapter(request)
+        if result.get("error"):
+            print(f"  generation error: {result['error']}")
+        return (time.perf_counter() - start) * 1000
+
+    def _generate_all() -> None:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            generation.latencies_ms = list(executor.map(_timed, requests))
+
+    _run_stage(exporter, generation, _generate_all)
+    generation.items = len(requests)
+
+    return {
+        "pages": pages,
+        "stages": {stage.name: stage.to_dict() for stage in (ingest, embed, generation)},
+    }
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    for label, book in results["books"].items():
+        print(f"\n=== {label} ({book['pages']} pages) ===")
+        print(f"{'stage':<10}{'items':>8}{'seconds':>10}{'items/s':>10}{'peak RSS MB':>13}{'+RSS MB':>9}")
+        for name, stage in book["stages"].items():
+            print(
+                f"{name:<10}{stage['items']:>8}{stage['seconds']:>10.2f}{stage['throughput_per_s']:>10.2f}"
+                f"{stage['peak_rss_mb']:>13.1f}{stage['rss_growth_mb']:>9.1f}"
+            )
+        for name, stage in book["stages"].items():
+            if "latency" in stage:
+                latency = stage["latency"]
+                print(f"\n{name} request latency: p50 {latency['p50_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms")
+            print(f"\n{name} spans{'':<22}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'total s':>10}")
+            for span_name, summary in stage["spans"].items():
+                print(
+                    f"  {span_name:<34}{summary['count']:>8}{summary['p50_ms']:>10.1f}"
+                    f"{summary['p99_ms']:>10.1f}{summary['total_ms'] / 1000:>10.2f}"
+                )
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a description of every metric that regressed by more than tolerance."""
+    regressions: List[str] = []
+
+    def _check(name: str, current: float, previous: float, higher_is_worse: bool = True) -> None:
+        if not previous:
+            return
+        change = (current - previous) / previous
+        if (change if higher_is_worse else -change) > tolerance:
+            regressions.append(f"{name}: {previous:.2f} -> {current:.2f} ({change:+.0%})")
+
+    for label, book in results["books"].items():
+        previous_book = baseline.get("books", {}).get(label)
+        if not previous_book:
+            continue
+        for stage_name, stage in book["stages"].items():
+            previous = previous_book["stages"].get(stage_name)
+            if not previous:
+                continue
+            prefix = f"{label}/{stage_name}"
+            _check(f"{prefix} throughput", stage["throughput_per_s"], previous["throughput_per_s"], False)
+            _check(f"{prefix} peak RSS MB", stage["peak_rss_mb"], previous["peak_rss_mb"])
+            if "latency" in stage and "latency" in previous:
+                _check(f"{prefix} p99 ms", stage["latency"]["p99_ms"], previous["latency"]["p99_ms"])
+            for span_name, summary in stage["spans"].items():
+                previous_span = previous["spans"].get(span_name)
+                if previous_span:
+                    _check(f"{prefix}/{span_name} p50 ms", summary["p50_ms"], previous_span["p50_ms"])
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", action="append", default=[], help="textbook PDF to run (repeatable)")
+    parser.add_argument("--synthetic-pages", action="append", type=int, default=[],
+                        help="also run a synthetic textbook with this many pages (repeatable)")
+    parser.add_argument("--generate", type=int, default=20, help="subchapters to generate questions for per book")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent generation requests")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="fake embeddings API latency (s)")
+    parser.add_argument("--chat-latency", type=float, default=1.0, help="fake chat API latency (s)")
+    parser.add_argument("--embed-pause", type=float, default=0.0,
+                        help="MISTRAL_EMBED_PAUSE_SECONDS; 0.17 reproduces the production rate limit pause")
+    parser.add_argument("--mongo-uri", help="use this mongod instead of in-process mongomock")
+    parser.add_argument("--s3-endpoint", help="use this S3-compatible endpoint instead of a moto server")
+    parser.add_argument("--with-cache", action="store_true", help="keep the response and embedding caches enabled")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    pdfs = [(path, Path(path).stem) for path in args.pdf]
+    if not pdfs and not args.synthetic_pages:
+        pdfs = [(DEFAULT_PDF, "textbook-2")]
+
+    exporter = InMemorySpanExporter()
+    set_tracer(Tracer(exporter))
+
+    results: Dict[str, Any] = {
+        "config": {key: value for key, value in vars(args).items() if key not in {"json", "baseline"}},
+        "books": {},
+    }
+    with OfflineBackends(
+        embed_latency=args.embed_latency,
+        chat_latency=args.chat_latency,
+        embed_pause=args.embed_pause,
+        mongo_uri=args.mongo_uri,
+        s3_endpoint=args.s3_endpoint,
+        use_caches=args.with_cache,
+    ) as backends:
+        for pages in args.synthetic_pages:
+            path = os.path.join(backends.workdir, f"synthetic-{pages}.pdf")
+            print(f"Building synthetic {pages}-page textbook...")
+            build_textbook(path, pages=pages, chapters=max(pages // 50, 1))
+            pdfs.append((path, f"synthetic-{pages}"))
+
+        for path, label in pdfs:
+            print(f"\nBenchmarking {label}...")
+            results["books"][label] = benchmark_book(
+                backends, exporter, path, label, args.generate, args.concurrency
+            )
+        results["upstream_requests"] = dict(backends.mistral.requests)
+
+    print_report(results)
+    print(f"\nFake Mistral requests: {results['upstream_requests']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(results, out, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as source:
+            regressions = compare(results, json.load(source), args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            raise SystemExit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Measurement helpers: peak RSS sampling and per-span latency summaries."""
+
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+_PAGE_SIZE = resource.getpagesize()
+
+
+def current_rss() -> int:
+    """Return the resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # No procfs (macOS): fall back to the lifetime peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Samples RSS in a background thread and keeps the peak seen while active."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.start_rss = self.peak_rss = current_rss()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def latency_summary(values_ms: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values_ms),
+        "p50_ms": round(percentile(values_ms, 0.5), 3),
+        "p99_ms": round(percentile(values_ms, 0.99), 3),
+        "total_ms": round(sum(values_ms), 3),
+    }
+
+
+def span_summary(spans: List[Any]) -> Dict[str, Dict[str, float]]:
+    """Group finished tracing spans by name into latency summaries."""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    for span in spans:
+        durations[span.name].append(span.duration_ms)
+    return {name: latency_summary(values) for name, values in sorted(durations.items())}
+
+
+class StageResult:
+    """Wall time, throughput and memory of one pipeline stage."""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.seconds = 0.0
+        self.peak_rss = 0
+        self.rss_growth = 0
+        self.latencies_ms: List[float] = []
+        self.spans: Dict[str, Dict[str, float]] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "items": self.items,
+            "unit": self.unit,
+            "seconds": round(self.seconds, 3),
+            "throughput_per_s": round(self.items / self.seconds, 3) if self.seconds else 0.0,
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+            "rss_growth_mb": round(self.rss_growth / 2**20, 1),
+            "spans": self.spans,
+        }
+        if self.latencies_ms:
+            result["latency"] = latency_summary(self.latencies_ms)
+        return result
+
+
+class StageTimer:
+    """Measures a stage: wall time with perf_counter and peak RSS with RssSampler."""
+
+    def __init__(self, result: StageResult):
+        self.result = result
+        self._sampler = RssSampler()
+        self._start = 0.0
+
+    def __enter__(self) -> StageResult:
+        self._sampler.__enter__()
+        self._start = time.perf_counter()
+        return self.result
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.result.seconds = time.perf_counter() - self._start
+        self._sampler.__exit__(*exc_info)
+        self.result.peak_rss = self._sampler.peak_rss
+        self.result.rss_growth = self._sampler.peak_rss - self._sampler.start_rss
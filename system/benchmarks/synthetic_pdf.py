@@ -0,0 +1,98 @@
+"""Synthetic textbook PDFs with a two-level table of contents.
+
+The generated books have the structure PDFProcessor expects (level 1
+chapters, level 2 subchapters) and pages of deterministic pseudo-random
+prose, so extraction, chunking and embedding see realistic text volumes.
+"""
+
+import random
+from typing import List
+
+import fitz
+
+_WORDS = (
+    "energy system model function process structure cell force value rate "
+    "reaction theory data method result equation change network pressure "
+    "surface layer signal level current field measure sample protein market "
+    "policy history language memory image light wave matter particle"
+).split()
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def build_textbook(
+    path: str,
+    pages: int = 1000,
+    chapters: int = 20,
+    subchapters_per_chapter: int = 5,
+    words_per_page: int = 450,
+    seed: int = 0,
+) -> str:
+    """
+    Write a synthetic textbook PDF.
+
+    Args:
+        path: Output file path
+        pages: Number of pages
+        chapters: Number of level 1 TOC entries, spread evenly over the pages
+        subchapters_per_chapter: Level 2 TOC entries per chapter
+        words_per_page: Words of body text per page
+        seed: Seed for the page text
+
+    Returns:
+        path
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    rect = fitz.Rect(56, 56, 539, 786)
+    for number in range(1, pages + 1):
+        page = doc.new_page(width=595, height=842)
+        paragraphs: List[str] = []
+        remaining = words_per_page
+        while remaining > 0:
+            size = min(remaining, rng.randint(40, 90))
+            paragraphs.append(_paragraph(rng, size))
+            remaining -= size
+        page.insert_textbox(rect, f"Page {number}\n\n" + "\n\n".join(paragraphs), fontsize=9)
+
+    doc.set_toc(_even_toc(pages, chapters, subchapters_per_chapter))
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+def _even_toc(pages: int, chapters: int, subchapters_per_chapter: int) -> List[List]:
+    toc: List[List] = []
+    pages_per_chapter = max(pages // max(chapters, 1), 1)
+    for chapter in range(chapters):
+        start = chapter * pages_per_chapter + 1
+        if start > pages:
+            break
+        toc.append([1, f"Chapter {chapter + 1}", start])
+        step = max(pages_per_chapter // max(subchapters_per_chapter, 1), 1)
+        for sub in range(subchapters_per_chapter):
+            sub_start = start + sub * step
+            if sub_start > min(start + pages_per_chapter - 1, pages):
+                break
+            toc.append([2, f"Section {chapter + 1}.{sub + 1}", sub_start])
+    return toc
+
+
+def with_toc(source_path: str, path: str, pages_per_chapter: int = 25, subchapters_per_chapter: int = 4) -> str:
+    """
+    Return a PDF with a table of contents for source_path.
+
+    PDFProcessor splits books by their outline, so a source without one is
+    copied to path with evenly spaced chapters and subchapters; a source
+    that has an outline is returned as is.
+    """
+    with fitz.open(source_path) as doc:
+        if doc.get_toc():
+            return source_path
+        chapters = max(doc.page_count // pages_per_chapter, 1)
+        doc.set_toc(_even_toc(doc.page_count, chapters, subchapters_per_chapter))
+        doc.save(path, garbage=3, deflate=True)
+    return path
@@ -0,0 +1,141 @@
+"""Cold versus warm first-request latency.
+
+Measures what the shared AppContext saves per request and per worker:
+
+- worker start: a fresh interpreter importing the pipeline and building
+  the context (tokenizer, model clients, Mongo and S3 clients), as a
+  newly started worker process does before its first request
+- first request: PDFProcessor, TextEmbedder and NewQuestionGenerator
+  construction plus one generate_for_subchapter call, with a fresh
+  AppContext (cold, the cost every request used to pay) and with one
+  warmed at startup (warm)
+
+Rounds alternate cold and warm after a discarded first request, so both
+see the same retrieval and connection state and differ only in the
+context. Runs against the offline backends of backends.py.
+
+Usage:
+    python benchmarks/warm_start.py
+    python benchmarks/warm_start.py --rounds 20 --chat-latency 0.2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Ensure we can import from src/ and benchmarks/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.backends import OfflineBackends
+from benchmarks.run_pipeline import _generation_requests
+from benchmarks.stats import latency_summary
+from benchmarks.synthetic_pdf import build_textbook
+from src.core.app_context import AppContext, set_app_context
+from src.core.new_question_generation import NewQuestionGenerator
+from src.core.pdf_processor import PDFProcessor
+from src.core.text_embedder import TextEmbedder
+from src.utils.database_funcs import get_mongo_client
+
+ROOT = Path(__file__).parent.parent
+
+_WORKER_START = """
+import json, time
+start = time.perf_counter()
+from src.core.app_context import AppContext
+from src.core.new_question_generation import NewQuestionGenerator
+imported = time.perf_counter()
+components = AppContext().warm()
+print(json.dumps({"import": imported - start, "build": time.perf_counter() - imported, "components": components}))
+"""
+
+
+def _worker_start(runs: int) -> Dict[str, Any]:
+    imports: List[float] = []
+    builds: List[float] = []
+    components: Dict[str, float] = {}
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _WORKER_START],
+            cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        timings = json.loads(output)
+        imports.append(timings["import"] * 1000)
+        builds.append(timings["build"] * 1000)
+        components = timings["components"]
+    return {
+        "import": latency_summary(imports),
+        "build_context": latency_summary(builds),
+        "components_ms": {name: round(seconds * 1000, 2) for name, seconds in components.items()},
+    }
+
+
+def _first_request(request: Dict[str, Any], warm: bool) -> Dict[str, float]:
+    context = AppContext()
+    if warm:
+        context.warm()
+    set_app_context(context)
+
+    start = time.perf_counter()
+    PDFProcessor()
+    TextEmbedder()
+    generator = NewQuestionGenerator()
+    constructed = time.perf_counter()
+    result = generator.generate_for_subchapter(request)
+    if result.get("error"):
+        print(f"  generation error: {result['error']}")
+    return {
+        "construct_ms": (constructed - start) * 1000,
+        "total_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=10, help="cold/warm request pairs")
+    parser.add_argument("--worker-starts", type=int, default=3, help="fresh interpreters to time")
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="fake chat API latency (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="fake embeddings API latency (s)")
+    args = parser.parse_args()
+
+    with OfflineBackends(embed_latency=args.embed_latency, chat_latency=args.chat_latency) as backends:
+        print(f"Timing {args.worker_starts} worker starts...")
+        worker = _worker_start(args.worker_starts)
+
+        print("Ingesting a 30-page synthetic textbook...")
+        path = build_textbook(os.path.join(backends.workdir, "warm-start.pdf"), pages=30, chapters=3)
+        book_id = backends.ingest(path, "warm-start")
+        request = _generation_requests(get_mongo_client()["bookTestMaker"], book_id, 1)[0]
+
+        # Discarded: fills retrieval caches and connection pools shared by both modes
+        _first_request(request, warm=True)
+        samples: Dict[str, Dict[str, List[float]]] = {
+            mode: {"construct_ms": [], "total_ms": []} for mode in ("cold", "warm")
+        }
+        for _ in range(args.rounds):
+            for mode in ("cold", "warm"):
+                for key, value in _first_request(request, warm=mode == "warm").items():
+                    samples[mode][key].append(value)
+
+    print("\nWorker start (fresh interpreter)")
+    print(f"  import pipeline       p50 {worker['import']['p50_ms']:>9.1f} ms")
+    print(f"  build AppContext      p50 {worker['build_context']['p50_ms']:>9.1f} ms")
+    for name, ms in worker["components_ms"].items():
+        print(f"    {name:<20}{ms:>13.1f} ms")
+
+    print(f"\nFirst request ({args.rounds} rounds)   construct p50   construct p99    total p50    total p99")
+    for mode, values in samples.items():
+        construct = latency_summary(values["construct_ms"])
+        total = latency_summary(values["total_ms"])
+        print(
+            f"  {mode:<30}{construct['p50_ms']:>12.1f}{construct['p99_ms']:>16.1f}"
+            f"{total['p50_ms']:>13.1f}{total['p99_ms']:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
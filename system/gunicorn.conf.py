@@ -0,0 +1,97 @@
+"""Gunicorn configuration for the production API server.
+
+Run from system/ (gunicorn picks up ./gunicorn.conf.py automatically):
+
+    gunicorn scripts.wsgi:app
+
+Requests are long and I/O bound (LLM, embedding and S3 calls), so workers
+are gthread workers: a few processes, each with a pool of request threads.
+Every setting can be overridden with the GUNICORN_* variables below or on
+the command line.
+
+Shutdown (SIGTERM) is graceful: each worker stops accepting connections,
+finishes in-flight requests (including streamed generation responses) and
+then, in worker_exit, waits for background ingestion and re-embedding jobs
+(src/utils/jobs.py) for up to JOB_DRAIN_SECONDS. Books whose jobs are still
+running after that are marked state="interrupted" before the worker exits.
+Keep JOB_DRAIN_SECONDS below graceful_timeout, after which the master kills
+the worker.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+workers = int(os.getenv("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+# Generation requests wait on several sequential LLM calls
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 120))
+# Keep below the load balancer's idle timeout, so it never reuses a connection we closed
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Worker recycling is off by default: health probes count as requests, and a
+# recycled worker gives running ingestion jobs only JOB_DRAIN_SECONDS to finish.
+# Set GUNICORN_MAX_REQUESTS only to contain a memory leak.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Importing the app in the master shares the decoded tokenizer copy-on-write;
+# clients and background threads are recreated per worker in post_fork
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").strip().lower() in {"1", "true", "yes"}
+
+# Heartbeat files on tmpfs, so a slow disk cannot make workers look hung
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", max(graceful_timeout - 20, 0)))
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork(): with a preloaded app, restart the health
+    # probes (the monitor drops the master's clients and results on the new
+    # pid) and build this worker's clients in the background
+    if not server.cfg.preload_app:
+        return
+    import threading
+
+    from src.core.app_context import get_app_context
+    from src.utils.health import get_health_monitor
+
+    get_health_monitor().start()
+    threading.Thread(target=get_app_context().warm, name="warm-up", daemon=True).start()
+
+
+def post_worker_init(worker):
+    # Every worker runs a question pool scheduler; its Mongo lease lets one top up at a time
+    from scripts.api_server import start_question_pool_scheduler
+
+    start_question_pool_scheduler()
+
+
+def worker_exit(server, worker):
+    from src.utils.jobs import get_job_registry
+
+    registry = get_job_registry()
+    if not registry.running():
+        return
+    server.log.info("Worker %s draining jobs: %s", worker.pid, ", ".join(registry.running()))
+    unfinished = registry.drain(JOB_DRAIN_SECONDS)
+    if unfinished:
+        from scripts.upload_embed_api import mark_interrupted_jobs
+
+        server.log.warning("Worker %s exiting with unfinished jobs: %s", worker.pid, ", ".join(unfinished))
+        mark_interrupted_jobs(unfinished)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live-gauge files when metrics are aggregated across processes
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,19 +1,58 @@
 import os
 import sys
+import threading
 from pathlib import Path
-from flask import Flask, jsonify
-from dotenv import load_dotenv
+from flask import Flask, Response, jsonify
 
 # Ensure we can import from src/
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from scripts.upload_embed_api import upload_bp
 from scripts.exam_generation_api import exam_bp
+from scripts.usage_api import usage_bp
+from src.utils.env import load_env
+from src.utils.health import READINESS_CHECKS, get_health_monitor
+from src.utils.jobs import get_job_registry
+from src.utils.metrics import metrics_payload
+
+load_env()
+
+
+def _warm_up(done: threading.Event) -> None:
+    # Imports the pipeline and builds the tokenizer and clients off the startup path
+    try:
+        from src.core.app_context import get_app_context
+
+        get_app_context().warm()
+    except Exception as exc:
+        print(f"Warming the application context failed: {exc}")
+    finally:
+        done.set()
+
+
+def start_question_pool_scheduler() -> None:
+    """
+    Keep pregenerated questions topped up during off-peak hours.
+
+    Called once per serving process (each gunicorn worker in post_worker_init,
+    or the development server); the scheduler's Mongo lease lets only one of
+    them top up at a time. Not started by create_app, whose threads would not
+    survive the fork of a preloaded app.
+    """
+    from src.core.question_pool import QuestionPoolScheduler, pool_enabled
+
+    if pool_enabled():
+        QuestionPoolScheduler.from_env().start()
 
-load_dotenv()
 
 def create_app() -> Flask:
     app = Flask(__name__)
+    # Build the tokenizer, model clients and Mongo/S3 clients before the first request,
+    # without holding up startup; /ready reports unready until this is done
+    warmed = threading.Event()
+    threading.Thread(target=_warm_up, args=(warmed,), name="warm-up", daemon=True).start()
+    # Probe Mongo, S3, Mistral and the vector index in the background
+    health_monitor = get_health_monitor()
 
     @app.get("/health")
     def health():
@@ -21,15 +60,34 @@ def create_app() -> Flask:
 
     @app.get("/ready")
     def ready():
-        return jsonify(status="ready"), 200
+        if get_job_registry().draining:
+            return jsonify(status="draining", checks={}), 503
+        if not warmed.is_set():
+            return jsonify(status="warming", checks={}), 503
+        # Served from the last probe round; never calls a dependency
+        body, status_code = health_monitor.status(READINESS_CHECKS)
+        return jsonify(body), status_code
+
+    @app.get("/metrics")
+    def metrics():
+        # Prometheus scrape endpoint: per-stage latency, LLM tokens, retries, cache hits
+        body, content_type = metrics_payload()
+        return Response(body, mimetype=content_type)
 
     # Versioned API with modular blueprints
     app.register_blueprint(upload_bp, url_prefix="/api/v1/pipelines")
     app.register_blueprint(exam_bp, url_prefix="/api/v1/pipelines")
+    app.register_blueprint(usage_bp, url_prefix="/api/v1/usage")
     return app
 
 app = create_app()
 
 if __name__ == "__main__":
+    # Development server only (single process; FLASK_DEBUG enables the debugger and reloader).
     # Windows-friendly dev run: python scripts\api_server.py
-    app.run(host="0.0.0.0", port=int(os.getenv("PORT", os.getenv("PORT"))), debug=True)
\ No newline at end of file
+    # Production: gunicorn scripts.wsgi:app (see gunicorn.conf.py)
+    debug = os.getenv("FLASK_DEBUG", "false").strip().lower() in {"1", "true", "yes"}
+    # With the reloader, only the child process that serves requests runs the scheduler
+    if not debug or os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        start_question_pool_scheduler()
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 8000)), debug=debug)
\ No newline at end of file
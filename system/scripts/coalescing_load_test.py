@@ -0,0 +1,263 @@
+"""Load test for request coalescing in NewQuestionGenerator.
+
+Fires concurrent generation requests for the same subchapter, the way a class
+opening the same exam does, at generators whose upstream dependencies (S3 PDF
+download, embedding API, $vectorSearch, chat models, MongoDB) are replaced by
+in-process fakes with a fixed latency. Reports how many upstream calls were made
+with single-flight coalescing enabled and disabled.
+
+Usage:
+    python scripts/coalescing_load_test.py --clients 30 --latency 0.2
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Ensure we can import from src/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# Measure coalescing on its own, not the response cache, and keep usage records out of Mongo
+os.environ["LLM_CACHE_ENABLED"] = "false"
+os.environ["USAGE_TRACKING_ENABLED"] = "false"
+
+from bson import ObjectId
+
+from src.core.new_question_generation import NewQuestionGenerator
+from src.models.ai_models import AIModel
+from src.utils.prompt_budget import PromptBudgeter
+from src.utils.single_flight import SingleFlight
+from src.utils.vector_search import VectorSearchConfig
+
+
+class UpstreamCounter:
+    """Thread-safe tally of calls that would leave the process."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def hit(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] += 1
+        time.sleep(self.latency)
+
+
+class _InsertResult:
+    def __init__(self, inserted_id: ObjectId):
+        self.inserted_id = inserted_id
+
+
+class _Cursor(list):
+    def limit(self, _count: int) -> "_Cursor":
+        return self
+
+
+class FakeQuestionCollection:
+    def __init__(self, counter: UpstreamCounter):
+        self.counter = counter
+        self._by_hash: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def find_one(self, query: Dict[str, Any], *args: Any, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._by_hash.get(query.get("contentHash"))
+
+    def find(self, *args: Any, **kwargs: Any) -> _Cursor:
+        return _Cursor()
+
+    def insert_one(self, document: Dict[str, Any]) -> _InsertResult:
+        self.counter.calls["question_insert"] += 1
+        document = {"_id": ObjectId(), **document}
+        with self._lock:
+            self._by_hash[document["contentHash"]] = document
+        return _InsertResult(document["_id"])
+
+    def update_one(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+class FakeChunkCollection:
+    def __init__(self, counter: UpstreamCounter):
+        self.counter = counter
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.counter.hit("vector_search")
+        return [
+            {"text": f"Related passage {index}", "subchapterTitle": "Neighbour", "score": 1 - index / 10}
+            for index in range(3)
+        ]
+
+
+class FakeEmbed(AIModel):
+    def __init__(self, counter: UpstreamCounter):
+        self.name = "fake-embed"
+        self.counter = counter
+
+    def _generate(self, prompt: str) -> List[float]:
+        self.counter.hit("embed")
+        return [0.1] * 8
+
+
+class FakeChat(AIModel):
+    SYSTEM_MESSAGE = "fake exam maker"
+
+    def __init__(self, counter: UpstreamCounter):
+        self.name = "fake-chat"
+        self.counter = counter
+
+    def _generate(self, prompt: str) -> str:
+        self.counter.hit("chat")
+        return json.dumps({
+            "questions": [
+                {
+                    "text": f"Question {index} about the subchapter?",
+                    "alternatives": ["A", "B", "C", "D"],
+                    "correct_alternative": "A",
+                    "difficulty": "medium",
+                }
+                for index in range(5)
+            ]
+        })
+
+
+class FakeEvaluator(AIModel):
+    SYSTEM_MESSAGE = "fake quality control"
+
+    def __init__(self, counter: UpstreamCounter):
+        self.name = "fake-eval"
+        self.counter = counter
+
+    def _generate(self, prompt: str) -> str:
+        self.counter.hit("evaluate")
+        return json.dumps({"scores": [0.9] * 5})
+
+
+class LoadTestGenerator(NewQuestionGenerator):
+    """NewQuestionGenerator wired to in-process fakes instead of Mongo, S3 and Mistral."""
+
+    def __init__(
+        self,
+        counter: UpstreamCounter,
+        subchapter_text: str,
+        budgeter: PromptBudgeter,
+        question_collection: FakeQuestionCollection,
+    ):
+        self.counter = counter
+        self.subchapter_text = subchapter_text
+        self.rag_depth = self.DEFAULT_RAG_DEPTH
+        self.prompt_budgeter = budgeter
+        self._configure_retrieval()
+        self.question_pool = None
+        self.question_collection = question_collection
+        self.chunk_embedding_collection = FakeChunkCollection(counter)
+        self.embed_model = FakeEmbed(counter)
+        self.generation_model = FakeChat(counter)
+        self.evaluation_model = FakeEvaluator(counter)
+
+    def _configure_retrieval(self) -> None:
+        # FakeChunkCollection stands in for $vectorSearch: no active index lookup in Mongo
+        self.retrieval_backend = "atlas"
+        self.vector_search = VectorSearchConfig()
+        self.mmr_lambda = self.DEFAULT_MMR_LAMBDA
+        self.candidate_multiplier = self.DEFAULT_CANDIDATE_MULTIPLIER
+        self.max_per_subchapter = None
+
+    def _load_subchapter_text(self, subchapter_id: ObjectId) -> Optional[str]:
+        self.counter.hit("pdf_download")
+        return self.subchapter_text
+
+
+def run(clients: int, latency: float, coalesce: bool, budgeter: PromptBudgeter) -> Dict[str, Any]:
+    """Run one round of concurrent identical requests and return upstream call counts."""
+    SingleFlight.enabled = coalesce
+    counter = UpstreamCounter(latency)
+    subchapter_text = "Photosynthesis converts light energy into chemical energy. " * 200
+    request = {
+        "subchapter_id": str(ObjectId()),
+        "book_id": str(ObjectId()),
+        "chapter_id": str(ObjectId()),
+        "subchapter_title": "Photosynthesis",
+        "book_title": "Biology",
+        "chapter_title": "Plants",
+        "questions_to_generate": 5,
+        "difficulty_distribution": {"easy": 0, "medium": 5, "hard": 0},
+        "exclude_hashes": [],
+    }
+
+    # One collection for all clients, like the questions collection they share in Mongo
+    question_collection = FakeQuestionCollection(counter)
+    barrier = threading.Barrier(clients)
+    results: List[Dict[str, Any]] = []
+    failures: List[BaseException] = []
+    results_lock = threading.Lock()
+
+    def _client() -> None:
+        try:
+            generator = LoadTestGenerator(counter, subchapter_text, budgeter, question_collection)
+            barrier.wait()
+            result = generator.generate_for_subchapter(request)
+        except BaseException as exc:
+            barrier.abort()
+            with results_lock:
+                failures.append(exc)
+            return
+        with results_lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=_client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if failures:
+        # A client that crashed made no upstream calls; counting it would flatter the run
+        raise RuntimeError(f"{len(failures)} of {clients} clients failed") from failures[0]
+    return {
+        "elapsed": elapsed,
+        "calls": dict(counter.calls),
+        "errors": sum(1 for result in results if result.get("error")),
+        "unique_questions": len({qid for result in results for qid in result["generated_question_ids"]}),
+        "questions": sum(len(result["generated_question_ids"]) for result in results),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=30, help="concurrent identical requests")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per upstream call")
+    args = parser.parse_args()
+
+    budgeter = PromptBudgeter()
+    rounds = {
+        "uncoalesced": run(args.clients, args.latency, False, budgeter),
+        "coalesced": run(args.clients, args.latency, True, budgeter),
+    }
+
+    stages = sorted({stage for result in rounds.values() for stage in result["calls"]})
+    print(f"{args.clients} concurrent requests, {args.latency:.2f}s per upstream call\n")
+    print(f"{'upstream call':<18}{'uncoalesced':>12}{'coalesced':>12}")
+    for stage in stages:
+        before = rounds["uncoalesced"]["calls"].get(stage, 0)
+        after = rounds["coalesced"]["calls"].get(stage, 0)
+        print(f"{stage:<18}{before:>12}{after:>12}")
+    for label in ("elapsed", "errors", "questions", "unique_questions"):
+        before = rounds["uncoalesced"][label]
+        after = rounds["coalesced"][label]
+        if label == "elapsed":
+            print(f"{'wall time (s)':<18}{before:>12.2f}{after:>12.2f}")
+        else:
+            print(f"{label:<18}{before:>12}{after:>12}")
+
+
+if __name__ == "__main__":
+    main()
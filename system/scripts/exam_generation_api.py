@@ -1,9 +1,15 @@
 """Flask blueprint for exam/question generation API endpoints."""
 
-from flask import Blueprint, jsonify, request
-from typing import List, Dict, Any
+import json
+import os
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from typing import List, Dict, Any, Optional, Tuple
 
-from src.core.new_question_generation import NewQuestionGenerator
+from src.utils.admission import AdmissionRejected, get_admission_controller, requester_id
+from src.utils.health import GENERATION_CHECKS, get_health_monitor
+
+# The generators (PyPDF2, numpy, the model SDKs, the tokenizer) are imported
+# inside the handlers, so importing the app stays fast for health checks.
 
 exam_bp = Blueprint("exam", __name__)
 
@@ -15,6 +21,7 @@ def generate_questions():
     
     Expected JSON payload:
     {
+        "use_pool": bool,  // optional, defaults to QUESTION_POOL_ENABLED
         "subchapter_requests": [
             {
                 "subchapter_id": "string",
@@ -25,11 +32,16 @@ def generate_questions():
                 "chapter_title": "string",
                 "questions_to_generate": int,
                 "difficulty_distribution": {"easy": int, "medium": int, "hard": int},
-                "exclude_hashes": ["hash1", "hash2", ...]
+                "exclude_hashes": ["hash1", "hash2", ...],
+                "bypass_cache": bool  // optional, skip the LLM response cache
             },
             ...
         ]
     }
+
+    Requests are admitted per user (X-User-Id header) with weighted fair
+    queuing by requested question count; under overload the endpoint answers
+    429 with a Retry-After header (see src/utils/admission.py).
     
     Returns:
     {
@@ -42,104 +54,51 @@ def generate_questions():
                 "message": "string"
             },
             ...
+        ],
+        "metrics": [
+            {
+                "subchapterId": "string",
+                "prompt_tokens": {"instructions": int, "subchapter_text": int, "context": int, "total": int, ...}
+            },
+            ...
         ]
     }
     """
     try:
-        data = request.get_json()
+        validated_requests, validation_errors, error_response = _parse_generation_request(
+            request.get_json(silent=True)
+        )
+        if error_response is not None:
+            return error_response
         
-        if not data:
-            return jsonify({
-                "status": "failed",
-                "generatedQuestionIds": [],
-                "errors": [{"subchapterId": "", "errorType": "invalid_request", "message": "No JSON data provided"}]
-            }), 400
-        
-        subchapter_requests = data.get("subchapter_requests", [])
-        
-        if not subchapter_requests:
-            return jsonify({
-                "status": "failed",
-                "generatedQuestionIds": [],
-                "errors": [{"subchapterId": "", "errorType": "invalid_request", "message": "No subchapter requests provided"}]
-            }), 400
-        
-        # Validate each request
-        validated_requests: List[Dict[str, Any]] = []
-        validation_errors: List[Dict[str, str]] = []
-        
-        for req in subchapter_requests:
-            subchapter_id = req.get("subchapter_id")
-            
-            if not subchapter_id:
-                validation_errors.append({
-                    "subchapterId": "",
-                    "errorType": "validation_error",
-                    "message": "Missing subchapter_id"
-                })
-                continue
-            
-            questions_to_generate = req.get("questions_to_generate", 0)
-            if questions_to_generate <= 0:
-                # Skip subchapters with no questions needed
-                continue
-            
-            difficulty_distribution = req.get("difficulty_distribution", {})
-            if not difficulty_distribution:
-                validation_errors.append({
-                    "subchapterId": subchapter_id,
-                    "errorType": "validation_error",
-                    "message": "Missing difficulty_distribution"
-                })
-                continue
-            
-            validated_requests.append({
-                "subchapter_id": subchapter_id,
-                "book_id": req.get("book_id", ""),
-                "chapter_id": req.get("chapter_id", ""),
-                "subchapter_title": req.get("subchapter_title", ""),
-                "book_title": req.get("book_title", ""),
-                "chapter_title": req.get("chapter_title", ""),
-                "questions_to_generate": questions_to_generate,
-                "difficulty_distribution": {
-                    "easy": difficulty_distribution.get("easy", 0),
-                    "medium": difficulty_distribution.get("medium", 0),
-                    "hard": difficulty_distribution.get("hard", 0),
-                },
-                "exclude_hashes": req.get("exclude_hashes", []),
-            })
-        
-        if not validated_requests:
-            return jsonify({
-                "status": "failed",
-                "generatedQuestionIds": [],
-                "errors": validation_errors if validation_errors else [
-                    {"subchapterId": "", "errorType": "invalid_request", "message": "No valid requests to process"}
-                ]
-            }), 400
-        
-        # Initialize the generator and process requests
-        generator = NewQuestionGenerator()
-        result = generator.generate_for_subchapters(validated_requests)
+        # Wait for a generation slot, then initialize the generator and process requests
+        use_pool = _use_pool(request.get_json(silent=True))
+        with get_admission_controller("generation").admit(
+            requester_id(request.headers), _estimated_cost(validated_requests)
+        ):
+            if _async_generation_enabled() and not use_pool:
+                from src.core.async_question_generation import get_async_runner
+
+                result = get_async_runner().generate_for_subchapters(validated_requests)
+            else:
+                from src.core.new_question_generation import NewQuestionGenerator
+
+                generator = NewQuestionGenerator(use_pool=use_pool)
+                result = generator.generate_for_subchapters(validated_requests)
         
         # Combine validation errors with generation errors
         all_errors = validation_errors + result.get("errors", [])
-        
-        # Determine overall status
         generated_ids = result.get("generated_question_ids", [])
-        if not generated_ids and all_errors:
-            status = "failed"
-        elif all_errors:
-            status = "partial"
-        else:
-            status = "success"
         
         return jsonify({
-            "status": status,
+            "status": _overall_status(generated_ids, all_errors),
             "generatedQuestionIds": generated_ids,
-            "errors": all_errors
+            "errors": all_errors,
+            "metrics": result.get("metrics", []),
         }), 200
         
+    except AdmissionRejected as e:
+        return _overloaded_response(e)
     except Exception as e:
         print(f"Error in generate_questions endpoint: {e}")
         return jsonify({
@@ -149,19 +108,205 @@ def generate_questions():
         }), 500
 
 
-@exam_bp.route("/generation-health", methods=["GET"])
-def generation_health():
-    """Health check for the question generation service."""
+@exam_bp.route("/generate-questions/stream", methods=["POST"])
+def generate_questions_stream():
+    """
+    Generate questions for multiple subchapters, streaming results as NDJSON.
+
+    Accepts the same JSON payload as /generate-questions. Each line of the
+    response body is one JSON object:
+
+    {"type": "question", "subchapterId": "string", "questionId": "string"}
+        emitted as soon as a question has been generated, deduplicated and inserted
+    {"type": "summary", "status": ..., "generatedQuestionIds": [...], "errors": [...], "metrics": [...]}
+        emitted once at the end, matching the /generate-questions response body
+
+    Question confidence scores are filled in after each subchapter finishes.
+    Admission is the same as for /generate-questions: the slot is held until
+    the stream closes, and overload is answered with 429 before streaming.
+    """
     try:
-        # Quick validation that we can instantiate the generator
-        generator = NewQuestionGenerator()
-        return jsonify({
-            "status": "healthy",
-            "service": "question-generation"
-        }), 200
+        validated_requests, validation_errors, error_response = _parse_generation_request(
+            request.get_json(silent=True)
+        )
+        if error_response is not None:
+            return error_response
+
+        from src.core.new_question_generation import NewQuestionGenerator
+
+        generator = NewQuestionGenerator(use_pool=_use_pool(request.get_json(silent=True)))
+        admission = get_admission_controller("generation")
+        ticket = admission.acquire(
+            requester_id(request.headers), _estimated_cost(validated_requests)
+        )
+    except AdmissionRejected as e:
+        return _overloaded_response(e)
     except Exception as e:
+        print(f"Error in generate_questions_stream endpoint: {e}")
         return jsonify({
-            "status": "unhealthy",
-            "service": "question-generation",
-            "error": str(e)
-        }), 503
+            "status": "failed",
+            "generatedQuestionIds": [],
+            "errors": [{"subchapterId": "", "errorType": "server_error", "message": str(e)}]
+        }), 500
+
+    def _events():
+        try:
+            for event in generator.stream_for_subchapters(validated_requests):
+                if event["type"] == "summary":
+                    all_errors = validation_errors + event.get("errors", [])
+                    generated_ids = event.get("generated_question_ids", [])
+                    event = {
+                        "type": "summary",
+                        "status": _overall_status(generated_ids, all_errors),
+                        "generatedQuestionIds": generated_ids,
+                        "errors": all_errors,
+                        "metrics": event.get("metrics", []),
+                    }
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            print(f"Error in generate_questions_stream endpoint: {e}")
+            yield json.dumps({
+                "type": "summary",
+                "status": "failed",
+                "generatedQuestionIds": [],
+                "errors": [{"subchapterId": "", "errorType": "server_error", "message": str(e)}]
+            }) + "\n"
+
+    response = Response(stream_with_context(_events()), mimetype="application/x-ndjson")
+    # Runs even if the client disconnects before the body is iterated
+    response.call_on_close(lambda: admission.release(ticket))
+    return response
+
+
+def _use_pool(data: Optional[Dict[str, Any]]) -> bool:
+    """Serve from the question pool when requested, falling back to the environment default."""
+    from src.core.question_pool import pool_enabled
+
+    return bool((data or {}).get("use_pool", pool_enabled()))
+
+
+def _async_generation_enabled() -> bool:
+    """Whether /generate-questions runs on the shared asyncio generator (GENERATION_ASYNC)."""
+    return os.getenv("GENERATION_ASYNC", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def _estimated_cost(validated_requests: List[Dict[str, Any]]) -> int:
+    """Admission cost of a generation request: the number of questions it asks for."""
+    return sum(req["questions_to_generate"] for req in validated_requests)
+
+
+def _overloaded_response(exc: AdmissionRejected) -> Tuple[Response, int, Dict[str, str]]:
+    """429 response for a request the generation pool cannot take now."""
+    return jsonify({
+        "status": "failed",
+        "generatedQuestionIds": [],
+        "errors": [{
+            "subchapterId": "",
+            "errorType": "overloaded",
+            "message": f"Too many generation requests ({exc.reason}); retry after {exc.retry_after}s",
+        }]
+    }), 429, {"Retry-After": str(exc.retry_after)}
+
+
+def _overall_status(generated_ids: List[str], errors: List[Dict[str, str]]) -> str:
+    """Determine the overall status of a generation request."""
+    if not generated_ids and errors:
+        return "failed"
+    if errors:
+        return "partial"
+    return "success"
+
+
+def _parse_generation_request(
+    data: Optional[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]], Optional[Tuple[Response, int]]]:
+    """
+    Validate a generation payload.
+
+    Returns:
+        Tuple of (validated requests, validation errors, error response); the
+        error response is set when nothing in the payload can be processed.
+    """
+    if not data:
+        return [], [], (jsonify({
+            "status": "failed",
+            "generatedQuestionIds": [],
+            "errors": [{"subchapterId": "", "errorType": "invalid_request", "message": "No JSON data provided"}]
+        }), 400)
+    
+    subchapter_requests = data.get("subchapter_requests", [])
+    
+    if not subchapter_requests:
+        return [], [], (jsonify({
+            "status": "failed",
+            "generatedQuestionIds": [],
+            "errors": [{"subchapterId": "", "errorType": "invalid_request", "message": "No subchapter requests provided"}]
+        }), 400)
+    
+    # Validate each request
+    validated_requests: List[Dict[str, Any]] = []
+    validation_errors: List[Dict[str, str]] = []
+    
+    for req in subchapter_requests:
+        subchapter_id = req.get("subchapter_id")
+        
+        if not subchapter_id:
+            validation_errors.append({
+                "subchapterId": "",
+                "errorType": "validation_error",
+                "message": "Missing subchapter_id"
+            })
+            continue
+        
+        questions_to_generate = req.get("questions_to_generate", 0)
+        if questions_to_generate <= 0:
+            # Skip subchapters with no questions needed
+            continue
+        
+        difficulty_distribution = req.get("difficulty_distribution", {})
+        if not difficulty_distribution:
+            validation_errors.append({
+                "subchapterId": subchapter_id,
+                "errorType": "validation_error",
+                "message": "Missing difficulty_distribution"
+            })
+            continue
+        
+        validated_requests.append({
+            "subchapter_id": subchapter_id,
+            "book_id": req.get("book_id", ""),
+            "chapter_id": req.get("chapter_id", ""),
+            "subchapter_title": req.get("subchapter_title", ""),
+            "book_title": req.get("book_title", ""),
+            "chapter_title": req.get("chapter_title", ""),
+            "questions_to_generate": questions_to_generate,
+            "difficulty_distribution": {
+                "easy": difficulty_distribution.get("easy", 0),
+                "medium": difficulty_distribution.get("medium", 0),
+                "hard": difficulty_distribution.get("hard", 0),
+            },
+            "exclude_hashes": req.get("exclude_hashes", []),
+            "bypass_cache": bool(req.get("bypass_cache", False)),
+        })
+    
+    if not validated_requests:
+        return [], validation_errors, (jsonify({
+            "status": "failed",
+            "generatedQuestionIds": [],
+            "errors": validation_errors if validation_errors else [
+                {"subchapterId": "", "errorType": "invalid_request", "message": "No valid requests to process"}
+            ]
+        }), 400)
+
+    return validated_requests, validation_errors, None
+
+
+@exam_bp.route("/generation-health", methods=["GET"])
+def generation_health():
+    """Health check for the question generation service, from cached probe results."""
+    body, status_code = get_health_monitor().status(GENERATION_CHECKS)
+    return jsonify({
+        "status": "healthy" if status_code == 200 else "unhealthy",
+        "service": "question-generation",
+        "checks": body["checks"]
+    }), status_code
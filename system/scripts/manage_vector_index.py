@@ -0,0 +1,55 @@
+"""Create, rebuild and inspect the vector search index on chunkEmbeddings.
+
+Usage:
+    python scripts/manage_vector_index.py status
+    python scripts/manage_vector_index.py ensure --dimensions 1024 --similarity cosine
+    python scripts/manage_vector_index.py ensure --similarity dotProduct --keep-previous
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Ensure we can import from src/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.database_funcs import get_mongo_client
+from src.utils.vector_index import DEFAULT_INDEX_NAME, VectorIndexManager
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "ensure"])
+    parser.add_argument("--name", default=DEFAULT_INDEX_NAME, help="base index name")
+    parser.add_argument("--dimensions", type=int, default=1024)
+    parser.add_argument("--similarity", default="cosine", choices=["cosine", "euclidean", "dotProduct"])
+    parser.add_argument("--timeout", type=float, default=VectorIndexManager.DEFAULT_TIMEOUT_SECONDS)
+    parser.add_argument("--keep-previous", action="store_true", help="do not drop the replaced index")
+    args = parser.parse_args()
+
+    collection = get_mongo_client()["bookTestMaker"]["chunkEmbeddings"]
+    manager = VectorIndexManager(
+        collection,
+        base_name=args.name,
+        dimensions=args.dimensions,
+        similarity=args.similarity,
+    )
+
+    if args.command == "ensure":
+        report = manager.ensure(timeout=args.timeout, keep_previous=args.keep_previous)
+    else:
+        active = manager.active() or {}
+        name = active.get("activeIndex", args.name)
+        report = {
+            "index": name,
+            "version": active.get("version"),
+            "build_seconds": active.get("buildSeconds"),
+            "definition_matches": active.get("definitionHash") == manager.definition_hash(),
+            "stats": manager.stats(name),
+        }
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
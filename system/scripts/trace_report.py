@@ -0,0 +1,151 @@
+"""Latency breakdown of traced pipeline runs.
+
+Reads the span file written with TRACING_ENABLED=true (TRACE_EXPORT_PATH,
+default traces/spans.jsonl) and reports, per root operation
+(generate_for_subchapter, process_existing_book, embed_book, ...), how the
+wall time splits over its stages: download, extract, embed, vector_search,
+generate, evaluate, insert and so on. Self time is a span's duration minus
+the time covered by its children, so the shares add up to the root duration
+for sequential work.
+
+Usage:
+    python scripts/trace_report.py
+    python scripts/trace_report.py --path traces/spans.jsonl --root generate_for_subchapter
+    python scripts/trace_report.py --trace <traceId>
+"""
+
+import argparse
+import json
+import os
+import statistics
+from collections import defaultdict
+from typing import Any, Dict, List
+
+# Same default as src.utils.tracing.Tracer; the report runs without the pipeline's dependencies
+DEFAULT_EXPORT_PATH = "traces/spans.jsonl"
+
+
+def _load_spans(path: str) -> List[Dict[str, Any]]:
+    spans: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as source:
+        for line in source:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+    return spans
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _self_times(spans: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Return each span's duration minus the union of its children's intervals."""
+    children: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for span in spans:
+        if span.get("parentSpanId"):
+            children[span["parentSpanId"]].append(span)
+
+    self_times: Dict[str, float] = {}
+    for span in spans:
+        covered = 0
+        cursor = span["startTimeUnixNano"]
+        # Children may run concurrently (prefetching, thread pools); count overlap once
+        for child in sorted(children.get(span["spanId"], []), key=lambda c: c["startTimeUnixNano"]):
+            start = max(child["startTimeUnixNano"], cursor)
+            end = min(child["endTimeUnixNano"], span["endTimeUnixNano"])
+            if end > start:
+                covered += end - start
+                cursor = end
+        self_times[span["spanId"]] = max(span["durationMs"] - covered / 1e6, 0.0)
+    return self_times
+
+
+def _print_tree(spans: List[Dict[str, Any]]) -> None:
+    children: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    roots = []
+    for span in spans:
+        if span.get("parentSpanId"):
+            children[span["parentSpanId"]].append(span)
+        else:
+            roots.append(span)
+
+    def _walk(span: Dict[str, Any], depth: int, origin: int) -> None:
+        offset = (span["startTimeUnixNano"] - origin) / 1e6
+        status = "" if span["status"]["code"] == "OK" else f"  [{span['status']['message']}]"
+        print(f"{offset:>10.1f} ms {span['durationMs']:>10.1f} ms  {'  ' * depth}{span['name']}{status}")
+        for child in sorted(children.get(span["spanId"], []), key=lambda c: c["startTimeUnixNano"]):
+            _walk(child, depth + 1, origin)
+
+    for root in roots:
+        print(f"{'start':>13} {'duration':>13}  span")
+        _walk(root, 0, root["startTimeUnixNano"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.getenv("TRACE_EXPORT_PATH") or DEFAULT_EXPORT_PATH)
+    parser.add_argument("--root", help="only report traces whose root span has this name")
+    parser.add_argument("--trace", help="print the span tree of one trace")
+    args = parser.parse_args()
+
+    spans = _load_spans(args.path)
+    if not spans:
+        raise SystemExit(f"No spans in {args.path}")
+
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for span in spans:
+        traces[span["traceId"]].append(span)
+
+    if args.trace:
+        if args.trace not in traces:
+            raise SystemExit(f"Trace {args.trace} not found")
+        _print_tree(traces[args.trace])
+        return
+
+    by_root: Dict[str, List[List[Dict[str, Any]]]] = defaultdict(list)
+    for trace_spans in traces.values():
+        roots = [span for span in trace_spans if not span.get("parentSpanId")]
+        # Traces still missing their root (e.g. a crashed process) are skipped
+        if len(roots) == 1 and (not args.root or roots[0]["name"] == args.root):
+            by_root[roots[0]["name"]].append(trace_spans)
+
+    for root_name, root_traces in sorted(by_root.items()):
+        durations = [
+            next(span["durationMs"] for span in trace_spans if not span.get("parentSpanId"))
+            for trace_spans in root_traces
+        ]
+        errors = sum(
+            1 for trace_spans in root_traces
+            for span in trace_spans
+            if not span.get("parentSpanId") and span["status"]["code"] != "OK"
+        )
+        print(
+            f"\n{root_name}: {len(root_traces)} traces, {errors} errors, "
+            f"p50 {_percentile(durations, 0.5):.1f} ms, p95 {_percentile(durations, 0.95):.1f} ms"
+        )
+
+        stage_self: Dict[str, List[float]] = defaultdict(list)
+        stage_calls: Dict[str, int] = defaultdict(int)
+        for trace_spans in root_traces:
+            self_times = _self_times(trace_spans)
+            per_trace: Dict[str, float] = defaultdict(float)
+            for span in trace_spans:
+                per_trace[span["name"]] += self_times[span["spanId"]]
+                stage_calls[span["name"]] += 1
+            for name, value in per_trace.items():
+                stage_self[name].append(value)
+
+        total = sum(durations)
+        print(f"{'span':<32}{'calls':>8}{'self ms/trace':>16}{'p95 ms':>10}{'share':>9}")
+        for name, values in sorted(stage_self.items(), key=lambda item: -sum(item[1])):
+            share = sum(values) / total if total else 0.0
+            print(
+                f"{name:<32}{stage_calls[name]:>8}{statistics.mean(values):>16.1f}"
+                f"{_percentile(values, 0.95):>10.1f}{share:>9.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
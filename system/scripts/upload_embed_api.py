@@ -2,49 +2,154 @@ from flask import Blueprint, jsonify, request
 from bson import ObjectId
 from bson.errors import InvalidId
 
-from src.core.pdf_processor import PDFProcessor
-from src.core.text_embedder import TextEmbedder
-from threading import Thread
+from src.utils.admission import AdmissionRejected, get_admission_controller, requester_id
+from src.utils.jobs import get_job_registry
+from src.utils.profiler import profile_job, profiling_requested
+from src.utils.usage import usage_scope
 
 upload_bp = Blueprint("upload_pipeline", __name__)
 _ALLOWED_VISIBILITY = {"public", "private"}
 
 
+def _submit_job(kind: str, book_id: ObjectId, worker, *args):
+    """Queue a pipeline job for book_id and build the endpoint's response."""
+    # Jobs share the ingestion pool's per-user and global limits (src/utils/admission.py)
+    admission = get_admission_controller("ingest")
+    try:
+        ticket = admission.enqueue(requester_id(request.headers), 1)
+    except AdmissionRejected as exc:
+        return (
+            jsonify(error=f"too many pipeline jobs queued ({exc.reason})"),
+            429,
+            {"Retry-After": str(exc.retry_after)},
+        )
+
+    def _admitted_worker(bid: ObjectId, *job_args):
+        # The job thread, not the request, waits for an ingestion slot
+        admission.wait(ticket)
+        try:
+            worker(bid, *job_args)
+        finally:
+            admission.release(ticket)
+
+    registry = get_job_registry()
+    if not registry.submit(f"{kind}:{book_id}", _admitted_worker, book_id, *args):
+        admission.release(ticket)
+        if registry.draining:
+            # Worker is shutting down; the client should retry on another one
+            return jsonify(error="server is shutting down"), 503, {"Retry-After": "5"}
+        return jsonify(error=f"a {kind} job for this book is already running"), 409
+    return jsonify(status="accepted", book_id=str(book_id)), 202
+
+
+def mark_interrupted_jobs(job_ids) -> None:
+    """Mark the books of jobs cut off by a shutdown, so they can be resubmitted."""
+    from src.core.app_context import get_app_context
+
+    books = get_app_context().db["books"]
+    for job_id in job_ids:
+        kind, _, book_id = job_id.partition(":")
+        try:
+            books.update_one(
+                {"_id": ObjectId(book_id)}, {"$set": {"state": "interrupted", "interruptedJob": kind}}
+            )
+        except Exception as exc:
+            print(f"Marking {job_id} as interrupted failed: {exc}")
+
+
+def _record_profile(books_collection, book_id: ObjectId, profile_meta: dict) -> None:
+    """Store where a job's profile was saved on the book document."""
+    if not profile_meta:
+        return
+    try:
+        books_collection.update_one({"_id": book_id}, {"$set": {"lastProfile": profile_meta}})
+    except Exception as exc:
+        print(f"Recording profile for {book_id} failed: {exc}")
+
+
 @upload_bp.post("/upload-embed")
 def upload_and_embed():
     """
     JSON body:
     {
       "book_id": "...",      // required string ObjectId of an existing book document
-      "use_ocr": false        // optional
+      "use_ocr": false,       // optional
+      "profile": false        // optional, sample the pipeline's CPU time (see src/utils/profiler.py)
     }
+
+    The job is queued per user (X-User-Id header; without it only the pool-wide
+    limits apply) behind the ingestion pool's concurrency limits; a full queue
+    is answered with 429 and Retry-After.
     """
     data = request.get_json(silent=True) or {}
     book_id_raw = data.get("book_id")
     use_ocr = bool(data.get("use_ocr", False))
+    profile = bool(data.get("profile", False))
 
     try:
         book_id = ObjectId(book_id_raw)
     except (InvalidId, TypeError):
         return jsonify(error="book_id must be a valid ObjectId string"), 400
 
-    # Run in background thread and return immediately
-    def _worker(bid: ObjectId, use_ocr_flag: bool):
+    # Run in a registered background thread and return immediately
+    def _worker(bid: ObjectId, use_ocr_flag: bool, profile_flag: bool):
+        # Imported here: the pipeline pulls in PyMuPDF, PyPDF2, boto3 and the model SDKs
+        from src.core.pdf_processor import PDFProcessor
+        from src.core.text_embedder import TextEmbedder
+
         processor = PDFProcessor()
         embedder = TextEmbedder()
-        try:
-            # Process the existing book (chapters/subchapters, s3 uploads, ids)
-            processor.process_existing_book(book_id=bid)
-            # Create embeddings
-            embedder.process_book(book_id=bid, use_ocr=use_ocr_flag)
-            # Mark as finished
-            processor.books_collection.update_one(
-                {"_id": bid}, {"$set": {"state": "finished"}}
-            )
-        except Exception as exc:  # noqa: BLE001
-            # Best-effort error logging – don't crash the server thread
-            print(f"Pipeline failed for {bid}: {exc}")
+        with usage_scope("ingest", bookId=str(bid)), \
+                profile_job(bid, "ingest", profiling_requested(bid, profile_flag)) as profile_meta:
+            try:
+                # Process the existing book (chapters/subchapters, s3 uploads, ids)
+                result = processor.process_existing_book(book_id=bid, use_ocr=use_ocr_flag)
+                # Create embeddings, unless they were cloned from an identical upload
+                if not result.get("duplicate_of"):
+                    embedder.process_book(book_id=bid, use_ocr=use_ocr_flag)
+                # Mark as finished
+                processor.books_collection.update_one(
+                    {"_id": bid}, {"$set": {"state": "finished"}}
+                )
+            except Exception as exc:  # noqa: BLE001
+                # Best-effort error logging – don't crash the server thread
+                print(f"Pipeline failed for {bid}: {exc}")
+        _record_profile(processor.books_collection, bid, profile_meta)
+
+    return _submit_job("ingest", book_id, _worker, use_ocr, profile)
 
-    Thread(target=_worker, args=(book_id, use_ocr), daemon=True).start()
+@upload_bp.post("/reembed")
+def reembed():
+    """
+    Re-embed an already processed book incrementally: only chunks whose text
+    changed are embedded, and stale chunkEmbeddings are removed.
+
+    JSON body:
+    {
+      "book_id": "...",      // required string ObjectId of a processed book
+      "use_ocr": false,       // optional
+      "profile": false        // optional, sample the pipeline's CPU time
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    use_ocr = bool(data.get("use_ocr", False))
+    profile = bool(data.get("profile", False))
+
+    try:
+        book_id = ObjectId(data.get("book_id"))
+    except (InvalidId, TypeError):
+        return jsonify(error="book_id must be a valid ObjectId string"), 400
+
+    def _worker(bid: ObjectId, use_ocr_flag: bool, profile_flag: bool):
+        from src.core.text_embedder import TextEmbedder
+
+        embedder = TextEmbedder()
+        with usage_scope("reembed", bookId=str(bid)), \
+                profile_job(bid, "reembed", profiling_requested(bid, profile_flag)) as profile_meta:
+            try:
+                embedder.process_book(book_id=bid, use_ocr=use_ocr_flag, incremental=True)
+            except Exception as exc:
+                print(f"Re-embedding failed for {bid}: {exc}")
+        _record_profile(embedder.books_collection, bid, profile_meta)
 
-    return jsonify(status="accepted", book_id=str(book_id)), 202
\ No newline at end of file
+    return _submit_job("reembed", book_id, _worker, use_ocr, profile)
@@ -0,0 +1,80 @@
+"""Flask blueprint for model usage and cost reports (see src/utils/usage.py)."""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from flask import Blueprint, jsonify, request
+
+from src.utils.usage import get_usage_tracker
+
+usage_bp = Blueprint("usage", __name__)
+_SORT_FIELDS = {"costUsd", "tokens", "calls", "latencyMs", "cacheHits", "savedCostUsd"}
+
+
+def _since() -> Optional[datetime]:
+    """Start of the report window from ?days= (all retained records when absent)."""
+    days = request.args.get("days", type=float)
+    return datetime.now(timezone.utc) - timedelta(days=days) if days else None
+
+
+def _limit() -> int:
+    return min(max(request.args.get("limit", default=20, type=int), 1), 200)
+
+
+@usage_bp.get("/books")
+def books():
+    """
+    Books ranked by model usage.
+
+    Query parameters:
+        days: only count the last N days (default: all retained records)
+        limit: number of books (default 20, at most 200)
+        sort: costUsd (default), tokens, calls, latencyMs, cacheHits or savedCostUsd
+
+    Returns:
+    {
+        "books": [
+            {
+                "bookId": "string",
+                "runs": int,  // pipeline runs and generated subchapters
+                "calls": int, "errors": int, "tokens": int, "promptTokens": int,
+                "completionTokens": int, "pages": int, "latencyMs": float,
+                "cacheHits": int, "savedLatencyMs": float, "costUsd": float, "savedCostUsd": float
+            },
+            ...
+        ]
+    }
+    """
+    tracker = get_usage_tracker()
+    if tracker is None:
+        return jsonify(error="usage tracking is disabled"), 404
+    sort = request.args.get("sort", "costUsd")
+    if sort not in _SORT_FIELDS:
+        return jsonify(error=f"sort must be one of {', '.join(sorted(_SORT_FIELDS))}"), 400
+    return jsonify(books=tracker.books(_since(), _limit(), sort)), 200
+
+
+@usage_bp.get("/books/<book_id>")
+def book(book_id: str):
+    """
+    One book's usage by pipeline scope, stage and model, with its most expensive subchapters.
+
+    Query parameters: days, limit (subchapters), as for /books.
+    """
+    tracker = get_usage_tracker()
+    if tracker is None:
+        return jsonify(error="usage tracking is disabled"), 404
+    return jsonify(tracker.book(book_id, _since(), _limit())), 200
+
+
+@usage_bp.get("/requests")
+def generation_requests():
+    """
+    The most expensive generation requests, with their usage by stage and model.
+
+    Query parameters: days, limit, as for /books.
+    """
+    tracker = get_usage_tracker()
+    if tracker is None:
+        return jsonify(error="usage tracking is disabled"), 404
+    return jsonify(requests=tracker.requests(_since(), _limit())), 200
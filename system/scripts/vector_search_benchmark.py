@@ -0,0 +1,134 @@
+"""Recall-vs-latency benchmark of approximate $vectorSearch against exact search.
+
+Samples chunks from ingested books and uses each chunk's embedding as a query,
+filtered the way the generators filter (same book, other subchapters). Every
+query is run once in exact (ENN) mode as ground truth and once per ANN
+candidate ratio, and the script reports latency percentiles and recall@limit
+per configuration, plus the cheapest ratio that meets the recall target.
+
+Usage:
+    python scripts/vector_search_benchmark.py --books 3 --queries 50 --ratios 5,10,20,50
+    python scripts/vector_search_benchmark.py --book-id 65f0... --limit 20
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Ensure we can import from src/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bson import ObjectId
+
+from src.utils.database_funcs import get_mongo_client
+from src.utils.vector_search import VectorSearchConfig
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _run_query(collection: Any, config: VectorSearchConfig, query: Dict[str, Any], limit: int) -> tuple:
+    pipeline = [
+        config.stage(
+            query["embedding"],
+            limit,
+            filter={"bookID": query["bookID"], "subchapterID": {"$ne": query["subchapterID"]}},
+        ),
+        {"$project": {"_id": 1}},
+    ]
+    start = time.perf_counter()
+    ids = [doc["_id"] for doc in collection.aggregate(pipeline)]
+    return ids, (time.perf_counter() - start) * 1000
+
+
+def _sample_queries(collection: Any, book_ids: List[ObjectId], per_book: int) -> List[Dict[str, Any]]:
+    queries: List[Dict[str, Any]] = []
+    for book_id in book_ids:
+        queries.extend(
+            collection.aggregate([
+                {"$match": {"bookID": book_id}},
+                {"$sample": {"size": per_book}},
+                {"$project": {"embedding": 1, "bookID": 1, "subchapterID": 1}},
+            ])
+        )
+    return queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--book-id", action="append", default=[], help="book to sample (repeatable)")
+    parser.add_argument("--books", type=int, default=3, help="finished books to sample when no --book-id")
+    parser.add_argument("--queries", type=int, default=50, help="queries per book")
+    parser.add_argument("--limit", type=int, default=20, help="results per query (rag_depth x candidate multiplier)")
+    parser.add_argument("--ratios", default="5,10,20,50,100", help="ANN numCandidates/limit ratios to test")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--index", default=VectorSearchConfig.DEFAULT_INDEX_NAME)
+    args = parser.parse_args()
+
+    db = get_mongo_client()["bookTestMaker"]
+    collection = db["chunkEmbeddings"]
+
+    book_ids = [ObjectId(book_id) for book_id in args.book_id]
+    if not book_ids:
+        book_ids = [
+            doc["_id"]
+            for doc in db["books"].find({"state": "finished"}, {"_id": 1}).limit(args.books)
+        ]
+    if not book_ids:
+        raise SystemExit("No books to benchmark")
+
+    queries = _sample_queries(collection, book_ids, args.queries)
+    print(f"{len(queries)} queries over {len(book_ids)} books, limit {args.limit}\n")
+
+    exact = VectorSearchConfig(mode="exact", index_name=args.index)
+    configs = [exact] + [
+        VectorSearchConfig(mode="ann", candidate_ratio=ratio, index_name=args.index)
+        for ratio in sorted(int(ratio) for ratio in args.ratios.split(","))
+    ]
+
+    truth: List[set] = []
+    results: Dict[str, Dict[str, List[float]]] = {}
+    for config in configs:
+        latencies: List[float] = []
+        recalls: List[float] = []
+        # Warm the index and connection before timing
+        _run_query(collection, config, queries[0], args.limit)
+        for index, query in enumerate(queries):
+            ids, elapsed = _run_query(collection, config, query, args.limit)
+            latencies.append(elapsed)
+            if config is exact:
+                truth.append(set(ids))
+            elif truth[index]:
+                recalls.append(len(truth[index] & set(ids)) / len(truth[index]))
+        results[config.describe()] = {"latency": latencies, "recall": recalls or [1.0]}
+
+    print(f"{'mode':<12}{'candidates':>12}{'p50 ms':>10}{'p95 ms':>10}{'recall':>10}")
+    recommended = None
+    for config in configs:
+        stats = results[config.describe()]
+        candidates = "-" if config.mode == "exact" else str(config.num_candidates(args.limit))
+        recall = statistics.mean(stats["recall"])
+        print(
+            f"{config.describe():<12}{candidates:>12}"
+            f"{_percentile(stats['latency'], 0.5):>10.1f}{_percentile(stats['latency'], 0.95):>10.1f}"
+            f"{recall:>10.3f}"
+        )
+        if config.mode == "ann" and recall >= args.target_recall and recommended is None:
+            recommended = config
+
+    if recommended is not None:
+        print(
+            f"\nLowest ratio with recall >= {args.target_recall}: "
+            f"VECTOR_SEARCH_MODE=ann VECTOR_SEARCH_CANDIDATE_RATIO={recommended.candidate_ratio}"
+        )
+    else:
+        print(f"\nNo ANN setting reached recall {args.target_recall}; keep VECTOR_SEARCH_MODE=exact")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+WSGI entry point for production servers.
+
+Usage (from system/, with gunicorn.conf.py picked up automatically):
+    gunicorn scripts.wsgi:app
+"""
+
+import sys
+from pathlib import Path
+
+# Ensure we can import from src/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scripts.api_server import app
+
+__all__ = ["app"]
@@ -1,10 +1,28 @@
-"""Main source package for the book processing system."""
+"""Main source package for the book processing system.
+
+Subpackages are imported on first access (PEP 562), so "import src" or
+"from src.utils.metrics import ..." does not load every dependency.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
 
 __version__ = "1.0.0"
 
-from . import core
-from . import data
-from . import models
-from . import utils
+if TYPE_CHECKING:
+    from . import core
+    from . import data
+    from . import models
+    from . import utils
+
+__all__ = ["core", "data", "models", "utils"]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return importlib.import_module(f".{name}", __name__)
+
 
-__all__ = ["core", "data", "models", "utils"]
\ No newline at end of file
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,11 +1,40 @@
-"""Core processing modules for PDF, embedding, and question generation."""
+"""Core processing modules for PDF, embedding, and question generation.
 
-from .pdf_processor import PDFProcessor
-from .text_embedder import TextEmbedder
-from .question_generator import QuestionGenerator
+Classes are imported on first access, so importing a light submodule
+(e.g. src.core.question_pool) does not load PyMuPDF, PyPDF2, boto3 or the
+model SDKs.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+_EXPORTS = {
+    "PDFProcessor": ".pdf_processor",
+    "TextEmbedder": ".text_embedder",
+    "QuestionGenerator": ".question_generator",
+}
+
+if TYPE_CHECKING:
+    from .pdf_processor import PDFProcessor
+    from .text_embedder import TextEmbedder
+    from .question_generator import QuestionGenerator
 
 __all__ = [
     "PDFProcessor",
     "TextEmbedder",
     "QuestionGenerator"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562: import the defining module on first access, then cache the attribute
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
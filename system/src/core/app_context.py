@@ -0,0 +1,145 @@
+"""Process-wide shared resources for the pipelines.
+
+AppContext holds what every PDFProcessor, TextEmbedder and
+NewQuestionGenerator used to rebuild per request: the tokenizer (decoded
+from its embedded base64 vocabulary and merges), the Mistral model
+wrappers and their SDK clients, the MongoClient and the S3 client. Each
+resource is created on first use and then shared; all of them are
+thread-safe. The model wrappers are frozen (AIModel.freeze) so that no call
+can leave per-request state on them for another request to read.
+
+A server builds the context once per worker at startup (warm()), so the
+first request does not pay for it. Under a pre-forking server the master
+can warm only the tokenizer (warm(clients=False)): it is plain data and
+is inherited copy-on-write by the workers. Network clients are never
+inherited: after a fork the context notices the new pid and each worker
+creates its own connection pools on first use.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import boto3
+from pymongo import MongoClient
+
+from ..models.ai_models import MistralEmbed, MistralModel, MistralOCR, MistralSmall
+from ..utils.database_funcs import get_mongo_client
+from ..utils.env import load_env
+from ..utils.tokenizer import Tokenizer
+
+# Resources that hold no sockets or threads and may be inherited across fork()
+_FORK_SAFE = frozenset({"tokenizer"})
+_CLIENTS = ("mongo_client", "s3_client", "embed_model", "ocr_model", "generation_model", "evaluation_model")
+
+
+class AppContext:
+    """Lazily built, shared tokenizer, model wrappers and database/storage clients."""
+
+    def __init__(self):
+        load_env()
+        self._resources: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        if self._pid != os.getpid():
+            self._after_fork()
+        value = self._resources.get(name)
+        if value is None:
+            with self._lock:
+                value = self._resources.get(name)
+                if value is None:
+                    value = factory()
+                    self._resources[name] = value
+        return value
+
+    def _after_fork(self) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connection pools and SDK clients belong to the parent process
+                self._resources = {
+                    name: value for name, value in self._resources.items() if name in _FORK_SAFE
+                }
+                self._pid = os.getpid()
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return self._get("tokenizer", Tokenizer)
+
+    @property
+    def mongo_client(self) -> MongoClient:
+        return self._get("mongo_client", get_mongo_client)
+
+    @property
+    def db(self) -> Any:
+        return self.mongo_client["bookTestMaker"]
+
+    @property
+    def s3_client(self) -> Any:
+        return self._get(
+            "s3_client",
+            lambda: boto3.client("s3", endpoint_url=os.getenv("AWS_ENDPOINT_URL_S3") or None),
+        )
+
+    @property
+    def embed_model(self) -> MistralEmbed:
+        return self._get("embed_model", lambda: MistralEmbed().freeze())
+
+    @property
+    def ocr_model(self) -> MistralOCR:
+        return self._get("ocr_model", lambda: MistralOCR().freeze())
+
+    @property
+    def generation_model(self) -> MistralModel:
+        return self._get("generation_model", lambda: MistralModel().freeze())
+
+    @property
+    def evaluation_model(self) -> MistralSmall:
+        return self._get("evaluation_model", lambda: MistralSmall().freeze())
+
+    def warm(self, clients: bool = True) -> Dict[str, float]:
+        """
+        Build the resources now instead of on first use.
+
+        Args:
+            clients: Also create the network clients; pass False in a
+                pre-fork master, where only the tokenizer should be built
+
+        Returns:
+            Seconds spent building each resource that was not built yet
+        """
+        timings: Dict[str, float] = {}
+        for name in ("tokenizer",) + (_CLIENTS if clients else ()):
+            if name in self._resources and self._pid == os.getpid():
+                continue
+            start = time.perf_counter()
+            getattr(self, name)
+            timings[name] = round(time.perf_counter() - start, 4)
+        return timings
+
+
+_context: Optional[AppContext] = None
+_context_lock = threading.Lock()
+
+
+def get_app_context() -> AppContext:
+    """
+    Get the process-wide application context.
+
+    Returns:
+        Shared AppContext instance
+    """
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = AppContext()
+    return _context
+
+
+def set_app_context(context: AppContext) -> None:
+    """Replace the process-wide context, e.g. with a fresh one to measure cold starts."""
+    global _context
+    _context = context
@@ -0,0 +1,501 @@
+"""Asyncio variant of on-demand question generation.
+
+AsyncNewQuestionGenerator keeps the request/response contract of
+NewQuestionGenerator but performs all I/O without blocking: PDFs are fetched
+with a pooled httpx client, MongoDB is accessed through PyMongo's async client
+and the Mistral SDK's async methods are used for embeddings and chat. One event
+loop can therefore keep many subchapter generations in flight at once.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+import numpy as np
+from bson import ObjectId
+from PyPDF2 import PdfReader
+
+from ..utils.database_funcs import get_async_mongo_client
+from ..utils.metrics import stage_timer
+from ..utils.prompt_budget import PromptBudgeter
+from ..utils.single_flight import AsyncSingleFlight
+from ..utils.tracing import span
+from ..utils.usage import usage_scope
+from ..utils.env import load_env
+from .app_context import AppContext, get_app_context
+from .local_retrieval import get_local_retriever
+from .new_question_generation import QuestionGenerationMixin
+
+load_env()
+
+_SUBCHAPTER_TEXT_FLIGHTS = AsyncSingleFlight("subchapter_text")
+_EMBEDDING_FLIGHTS = AsyncSingleFlight("input_embedding")
+_CONTEXT_FLIGHTS = AsyncSingleFlight("context_retrieval")
+
+
+class AsyncNewQuestionGenerator(QuestionGenerationMixin):
+    """Generates questions on-demand using asyncio for all network and database I/O.
+
+    Prompt construction, hashing and result shapes come from
+    QuestionGenerationMixin, as for NewQuestionGenerator; the I/O methods are
+    "a"-prefixed coroutines (agenerate_for_subchapters for
+    generate_for_subchapters) and there are no synchronous entry points. The
+    question pool is not used on this path.
+
+    One generator is shared by the process (see AsyncGenerationRunner), so its
+    semaphores bound the subchapters in flight (GENERATION_MAX_CONCURRENCY) and
+    the concurrent embedding calls (EMBED_MAX_CONCURRENCY) across all requests.
+    """
+
+    DEFAULT_MAX_CONCURRENCY = 16
+    DEFAULT_EMBED_CONCURRENCY = 4
+    DEFAULT_HTTP_CONNECTIONS = 64
+
+    def __init__(
+        self,
+        rag_depth: int = QuestionGenerationMixin.DEFAULT_RAG_DEPTH,
+        prompt_token_budget: Optional[int] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        embed_concurrency: int = DEFAULT_EMBED_CONCURRENCY,
+        http_client: Optional[httpx.AsyncClient] = None,
+        context: Optional[AppContext] = None,
+    ):
+        # The Mongo client stays per generator: it is an AsyncMongoClient bound to this event loop
+        context = context or get_app_context()
+        self.rag_depth = rag_depth
+        self.prompt_budgeter = PromptBudgeter.from_env(context.tokenizer, prompt_token_budget)
+        self.max_concurrency = max_concurrency
+        self._generation_slots = asyncio.Semaphore(max(max_concurrency, 1))
+        # Each embedding call holds a slot through the model's rate-limit pause
+        self._embed_slots = asyncio.Semaphore(max(embed_concurrency, 1))
+        self._configure_retrieval()
+
+        self.mongo_client = get_async_mongo_client()
+        self.db = self.mongo_client["bookTestMaker"]
+        self.subchapter_collection = self.db["subchapters"]
+        self.chapter_collection = self.db["chapters"]
+        self.question_collection = self.db["questions"]
+        self.books_collection = self.db["books"]
+        self.chunk_embedding_collection = self.db["chunkEmbeddings"]
+
+        self.http_client = http_client or httpx.AsyncClient(
+            timeout=60,
+            limits=httpx.Limits(
+                max_connections=self.DEFAULT_HTTP_CONNECTIONS,
+                max_keepalive_connections=self.DEFAULT_HTTP_CONNECTIONS,
+            ),
+        )
+
+        self.embed_model = context.embed_model
+        self.generation_model = context.generation_model
+        self.evaluation_model = context.evaluation_model
+
+    async def __aenter__(self) -> "AsyncNewQuestionGenerator":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client and the MongoDB client."""
+        await self.http_client.aclose()
+        await self.mongo_client.close()
+
+    async def _afetch_subchapter_text(self, subchapter_id: ObjectId) -> Optional[str]:
+        """Fetch and extract text from a subchapter's PDF."""
+        text, _ = await _SUBCHAPTER_TEXT_FLIGHTS.do(
+            str(subchapter_id), lambda: self._aload_subchapter_text(subchapter_id)
+        )
+        return text
+
+    async def _aload_subchapter_text(self, subchapter_id: ObjectId) -> Optional[str]:
+        """Download a subchapter's PDF and extract its text."""
+        sub_doc = await self.subchapter_collection.find_one({"_id": subchapter_id})
+        if not sub_doc:
+            return None
+
+        pdf_url = sub_doc.get("s3Link")
+        if not pdf_url:
+            return None
+
+        try:
+            with stage_timer("download"):
+                response = await self.http_client.get(pdf_url)
+                response.raise_for_status()
+            # PDF parsing is CPU bound; keep it off the event loop
+            text = await asyncio.to_thread(self._extract_pdf_text, response.content)
+            return text if text.strip() else None
+        except Exception as e:
+            print(f"Error fetching PDF for subchapter {subchapter_id}: {e}")
+            return None
+
+    @staticmethod
+    def _extract_pdf_text(content: bytes) -> str:
+        with stage_timer("extract"):
+            reader = PdfReader(BytesIO(content))
+            return "".join(page.extract_text() or "" for page in reader.pages)
+
+    async def _aembed_input(
+        self,
+        text: str,
+        overlap: int = 50,
+        max_chunk_size: int = 3064,
+    ) -> List[float]:
+        """Create embedding for input text by averaging chunk embeddings."""
+        embedding, _ = await _EMBEDDING_FLIGHTS.do(
+            (self._text_key(text), overlap, max_chunk_size),
+            lambda: self._acompute_input_embedding(text, overlap, max_chunk_size),
+        )
+        return embedding
+
+    async def _acompute_input_embedding(
+        self,
+        text: str,
+        overlap: int,
+        max_chunk_size: int,
+    ) -> List[float]:
+        """Embed the chunks of text, at most embed_concurrency at once, and average the embeddings."""
+        chunks = []
+        for i in range(0, len(text), max_chunk_size - overlap):
+            chunks.append(text[i : i + max_chunk_size])
+            if i + max_chunk_size >= len(text):
+                break
+
+        async def _embed_chunk(chunk: str) -> List[float]:
+            async with self._embed_slots:
+                return await self.embed_model.agenerate_response(chunk)
+
+        embeddings = await asyncio.gather(*(_embed_chunk(chunk) for chunk in chunks))
+        return np.mean(np.array(embeddings), axis=0).tolist()
+
+    async def _aretrieve_context(
+        self,
+        book_id: ObjectId,
+        subchapter_id: ObjectId,
+        subchapter_text: str,
+    ) -> List[Dict]:
+        """Retrieve relevant context using vector search."""
+        entries, _ = await _CONTEXT_FLIGHTS.do(
+            (str(book_id), str(subchapter_id), self._text_key(subchapter_text), self.rag_depth),
+            lambda: self._asearch_context(book_id, subchapter_id, subchapter_text),
+        )
+        return [dict(entry) for entry in entries]
+
+    async def _asearch_context(
+        self,
+        book_id: ObjectId,
+        subchapter_id: ObjectId,
+        subchapter_text: str,
+    ) -> List[Dict]:
+        """Find chunks related to the subchapter text with $vectorSearch or the local engine."""
+        try:
+            query_embedding = await self._aembed_input(subchapter_text)
+            with stage_timer("vector_search"):
+                if self.retrieval_backend == "local":
+                    # Exports and the first load read from MongoDB and disk
+                    candidates = await asyncio.to_thread(
+                        get_local_retriever().search,
+                        book_id,
+                        query_embedding,
+                        self.rag_depth * self.candidate_multiplier,
+                        subchapter_id,
+                        True,
+                    )
+                else:
+                    pipeline = self._vector_search_pipeline(book_id, subchapter_id, query_embedding)
+                    cursor = await self.chunk_embedding_collection.aggregate(pipeline)
+                    candidates = await cursor.to_list(length=None)
+                return self._select_context(query_embedding, candidates)
+        except Exception as exc:
+            print(f"Error retrieving context: {exc}")
+            return []
+
+    async def _abuild_prompt(
+        self,
+        subchapter_data: Dict[str, Any],
+        subchapter_text: str,
+        difficulty_distribution: Dict[str, int],
+        exclude_hashes: List[str],
+    ) -> tuple[str, Dict[str, int]]:
+        """Build prompt for question generation with difficulty and exclusion support."""
+        book_id = self._ensure_object_id(subchapter_data["book_id"])
+        subchapter_id = self._ensure_object_id(subchapter_data["subchapter_id"])
+
+        existing_questions: List[Dict] = []
+        if exclude_hashes:
+            cursor = self.question_collection.find(
+                {"contentHash": {"$in": exclude_hashes}},
+                {"question": 1, "_id": 0},
+            ).limit(10)
+            existing_questions = await cursor.to_list(length=None)
+
+        context_entries = await self._aretrieve_context(
+            book_id=book_id,
+            subchapter_id=subchapter_id,
+            subchapter_text=subchapter_text,
+        )
+
+        # Token counting is CPU bound; keep it off the event loop
+        return await asyncio.to_thread(
+            self._compose_prompt,
+            subchapter_data,
+            subchapter_text,
+            difficulty_distribution,
+            existing_questions,
+            context_entries,
+        )
+
+    async def _aevaluate_response(self, response: str) -> List[Dict]:
+        """Evaluate generated questions using quality control model."""
+        evaluation_prompt = self._evaluation_prompt(response)
+
+        try:
+            questions = json.loads(response)["questions"]
+            evaluated_response = await self.evaluation_model.agenerate_response(evaluation_prompt)
+            scores = json.loads(evaluated_response)["scores"]
+
+            for index, score in enumerate(scores):
+                if index < len(questions):
+                    questions[index]["confidence"] = score
+            return questions
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Error parsing questions or scores: {e}")
+            try:
+                return json.loads(response)["questions"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                return []
+
+    async def _ainsert_questions(
+        self,
+        questions: List[Dict],
+        subchapter_data: Dict[str, Any],
+        source: str = "realtime",
+        reuse_existing: bool = False,
+    ) -> List[str]:
+        """Insert generated questions into MongoDB and return their IDs."""
+        inserted_ids: List[str] = []
+
+        for key in ("book_id", "chapter_id", "subchapter_id"):
+            self._ensure_object_id(subchapter_data[key])
+
+        with stage_timer("insert"):
+            for question in questions:
+                try:
+                    content_hash = self._hash_question(question.get("text", ""))
+
+                    existing = await self.question_collection.find_one({"contentHash": content_hash})
+                    if existing:
+                        if reuse_existing:
+                            inserted_ids.append(str(existing["_id"]))
+                            continue
+                        print(f"Skipping duplicate question with hash {content_hash}")
+                        continue
+
+                    result = await self.question_collection.insert_one(
+                        self._question_document(question, subchapter_data, content_hash, source)
+                    )
+                    inserted_ids.append(str(result.inserted_id))
+                except Exception as exc:
+                    print(f"Error inserting question: {exc}")
+
+        return inserted_ids
+
+    async def _aprepare_subchapter(
+        self,
+        subchapter_request: Dict[str, Any],
+    ) -> tuple[Optional[Dict[str, Any]], Optional[str], Dict[str, int]]:
+        """Fetch the subchapter text and build its prompt."""
+        subchapter_id = subchapter_request["subchapter_id"]
+        sub_oid = self._ensure_object_id(subchapter_id)
+
+        with span("fetch_subchapter_text"):
+            subchapter_text = await self._afetch_subchapter_text(sub_oid)
+        if not subchapter_text:
+            return None, None, {}
+
+        subchapter_data = {
+            "subchapter_id": subchapter_id,
+            "book_id": subchapter_request["book_id"],
+            "chapter_id": subchapter_request["chapter_id"],
+            "subchapter_title": subchapter_request.get("subchapter_title", ""),
+            "book_title": subchapter_request.get("book_title", ""),
+            "chapter_title": subchapter_request.get("chapter_title", ""),
+        }
+
+        with span("build_prompt"):
+            prompt, prompt_tokens = await self._abuild_prompt(
+                subchapter_data,
+                subchapter_text,
+                subchapter_request.get("difficulty_distribution", {}),
+                subchapter_request.get("exclude_hashes", []),
+            )
+        return subchapter_data, prompt, prompt_tokens
+
+    async def agenerate_for_subchapter(
+        self,
+        subchapter_request: Dict[str, Any],
+        source: str = "realtime",
+    ) -> Dict[str, Any]:
+        """Generate questions for a single subchapter.
+
+        Takes and returns the same dicts as NewQuestionGenerator.generate_for_subchapter.
+        """
+        subchapter_id = subchapter_request["subchapter_id"]
+        with usage_scope("generation_subchapter", **self._usage_attributes(subchapter_request, source)), \
+                span("generate_for_subchapter", subchapter_id=str(subchapter_id), source=source) as root:
+            result = await self._agenerate_live(subchapter_request, source)
+            self._annotate_span(root, result)
+            return result
+
+    async def _agenerate_live(
+        self,
+        subchapter_request: Dict[str, Any],
+        source: str,
+    ) -> Dict[str, Any]:
+        """Generate questions for a subchapter with the LLM and insert them."""
+        subchapter_id = subchapter_request["subchapter_id"]
+
+        try:
+            subchapter_data, prompt, prompt_tokens = await self._aprepare_subchapter(subchapter_request)
+            if subchapter_data is None:
+                return self._error_result(
+                    subchapter_id, "pdf_fetch_failed", "Could not fetch or parse subchapter PDF"
+                )
+
+            response, from_cache = await self.generation_model.agenerate_with_cache_info(
+                prompt,
+                bypass_cache=self._bypass_cache(subchapter_request, source),
+            )
+            questions = await self._aevaluate_response(response)
+
+            if not questions:
+                result = self._error_result(
+                    subchapter_id, "generation_failed", "LLM did not return valid questions"
+                )
+                result["metrics"] = {"prompt_tokens": prompt_tokens}
+                return result
+
+            inserted_ids = await self._ainsert_questions(
+                questions, subchapter_data, source=source, reuse_existing=from_cache
+            )
+            print(f"Generated {len(inserted_ids)} questions for {subchapter_data['subchapter_title']}")
+
+            return {
+                "generated_question_ids": inserted_ids,
+                "error": None,
+                "metrics": {"prompt_tokens": prompt_tokens},
+            }
+
+        except Exception as exc:
+            print(f"Error generating questions for subchapter {subchapter_id}: {exc}")
+            return self._error_result(subchapter_id, "generation_error", str(exc))
+
+    async def agenerate_for_subchapters(
+        self,
+        subchapter_requests: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Generate questions for multiple subchapters concurrently.
+
+        At most max_concurrency subchapters are in flight at once, across all
+        callers sharing this generator. Results keep
+        the order of subchapter_requests and have the same shape as
+        NewQuestionGenerator.generate_for_subchapters.
+        """
+        async def _bounded(request: Dict[str, Any]) -> Dict[str, Any]:
+            async with self._generation_slots:
+                return await self.agenerate_for_subchapter(request)
+
+        # Tasks copy the context, so each subchapter's usage also counts towards the request
+        with usage_scope("generation_request", requestId=uuid4().hex, subchapters=len(subchapter_requests)):
+            results = await asyncio.gather(*(_bounded(request) for request in subchapter_requests))
+
+        all_generated_ids: List[str] = []
+        all_errors: List[Dict[str, str]] = []
+        all_metrics: List[Dict[str, Any]] = []
+        for request, result in zip(subchapter_requests, results):
+            all_generated_ids.extend(result.get("generated_question_ids", []))
+            if result.get("error"):
+                all_errors.append(result["error"])
+            if result.get("metrics"):
+                all_metrics.append({"subchapterId": request["subchapter_id"], **result["metrics"]})
+
+        return {
+            "generated_question_ids": all_generated_ids,
+            "errors": all_errors,
+            "metrics": all_metrics,
+        }
+
+
+class AsyncGenerationRunner:
+    """Runs a shared AsyncNewQuestionGenerator on a background event loop.
+
+    Lets synchronous callers (Flask request threads) submit work to one
+    long-lived loop, so the pooled HTTP and MongoDB connections are reused and
+    concurrent requests are multiplexed instead of each blocking a thread on I/O.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = AsyncNewQuestionGenerator.DEFAULT_MAX_CONCURRENCY,
+        embed_concurrency: int = AsyncNewQuestionGenerator.DEFAULT_EMBED_CONCURRENCY,
+    ):
+        self.max_concurrency = max_concurrency
+        self.embed_concurrency = embed_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="async-generation", daemon=True
+        )
+        self._thread.start()
+        self._generator = self._submit(self._create_generator()).result()
+
+    async def _create_generator(self) -> AsyncNewQuestionGenerator:
+        # Created on the loop so its clients bind to it
+        return AsyncNewQuestionGenerator(
+            max_concurrency=self.max_concurrency, embed_concurrency=self.embed_concurrency
+        )
+
+    def _submit(self, coroutine: Any) -> Any:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def generate_for_subchapters(self, subchapter_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Blocking call with the contract of NewQuestionGenerator.generate_for_subchapters."""
+        return self._submit(self._generator.agenerate_for_subchapters(subchapter_requests)).result()
+
+    def close(self) -> None:
+        """Close the generator's clients and stop the loop."""
+        self._submit(self._generator.aclose()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_runner: Optional[AsyncGenerationRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_async_runner() -> AsyncGenerationRunner:
+    """
+    Get the process-wide async generation runner, starting it on first use.
+
+    GENERATION_MAX_CONCURRENCY and EMBED_MAX_CONCURRENCY set its limits. These
+    bound subchapters and embedding calls in flight across all requests, unlike
+    ADMISSION_GENERATION_MAX_CONCURRENT, which bounds the /generate-questions
+    requests admitted at once (see src/utils/admission.py).
+    """
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = AsyncGenerationRunner(
+                    max_concurrency=int(
+                        os.getenv("GENERATION_MAX_CONCURRENCY", AsyncNewQuestionGenerator.DEFAULT_MAX_CONCURRENCY)
+                    ),
+                    embed_concurrency=int(
+                        os.getenv("EMBED_MAX_CONCURRENCY", AsyncNewQuestionGenerator.DEFAULT_EMBED_CONCURRENCY)
+                    ),
+                )
+    return _runner
@@ -0,0 +1,277 @@
+"""In-process vector retrieval over memory-mapped per-book embedding matrices.
+
+An alternative to Atlas $vectorSearch. On first use, a book's chunkEmbeddings
+are exported to a local directory as a contiguous, L2-normalised float32 .npy
+matrix plus subchapter-id and chunk-index arrays and a text sidecar. The
+matrix is memory-mapped, and each top-k query is one matrix-vector product
+followed by argpartition, with the current subchapter masked out.
+
+Exports are keyed by the book's embeddingsUpdatedAt, which is bumped whenever
+its embeddings are written, so a re-embedded book is exported again.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from ..utils.database_funcs import get_mongo_client
+
+
+def retrieval_backend() -> str:
+    """Return the configured retrieval backend: "atlas" ($vectorSearch) or "local"."""
+    return os.getenv("RETRIEVAL_BACKEND", "atlas").strip().lower()
+
+
+def mark_embeddings_updated(books_collection: Any, book_id: ObjectId) -> None:
+    """Record that a book's chunkEmbeddings changed so local exports are refreshed."""
+    books_collection.update_one(
+        {"_id": book_id}, {"$set": {"embeddingsUpdatedAt": datetime.utcnow()}}
+    )
+
+
+class BookVectorIndex:
+    """Memory-mapped embedding matrix and metadata for one book."""
+
+    def __init__(self, directory: str, version: str):
+        self.directory = directory
+        self.version = version
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        self.subchapter_ids = np.load(os.path.join(directory, "subchapters.npy"))
+        self.chunk_indexes = np.load(os.path.join(directory, "chunk_indexes.npy"))
+        self.text_offsets = np.load(os.path.join(directory, "text_offsets.npy"))
+        self._texts_path = os.path.join(directory, "texts.jsonl")
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return int(self.embeddings.shape[0])
+
+    def _entry(self, row: int) -> Dict[str, Any]:
+        with open(self._texts_path, "rb") as texts:
+            texts.seek(int(self.text_offsets[row]))
+            return json.loads(texts.readline())
+
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        exclude_subchapter_id: Optional[ObjectId] = None,
+        include_embeddings: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the limit chunks most similar to the query.
+
+        Scores use Atlas' cosine scale, (1 + cosine) / 2, so they are
+        interchangeable with vectorSearchScore.
+
+        Returns:
+            List of dicts with text, subchapterTitle, chunkIndex and score,
+            plus embedding and subchapterID when include_embeddings is set,
+            best match first
+        """
+        if not len(self) or limit <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = self.embeddings @ query
+        if exclude_subchapter_id is not None:
+            scores[self.subchapter_ids == exclude_subchapter_id.binary] = -np.inf
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for row in top:
+            if not np.isfinite(scores[row]):
+                break
+            entry = self._entry(row)
+            entry["chunkIndex"] = int(self.chunk_indexes[row])
+            entry["score"] = float((1.0 + scores[row]) / 2.0)
+            if include_embeddings:
+                entry["embedding"] = self.embeddings[row].tolist()
+                # NumPy drops trailing NUL bytes from "S" values; missing ids are all NUL
+                raw_id = bytes(self.subchapter_ids[row]).ljust(12, b"\0")
+                entry["subchapterID"] = ObjectId(raw_id) if raw_id.strip(b"\0") else None
+            results.append(entry)
+        return results
+
+
+class LocalRetriever:
+    """Exports, caches and queries BookVectorIndex instances."""
+
+    DEFAULT_REFRESH_SECONDS = 60
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        refresh_seconds: int = DEFAULT_REFRESH_SECONDS,
+        db: Any = None,
+    ):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "booktestmaker-vectors")
+        self.refresh_seconds = refresh_seconds
+        self._db = db
+        self._indexes: Dict[ObjectId, BookVectorIndex] = {}
+        self._lock = threading.Lock()
+        self._book_locks: Dict[ObjectId, threading.Lock] = {}
+
+    @property
+    def db(self) -> Any:
+        if self._db is None:
+            self._db = get_mongo_client()["bookTestMaker"]
+        return self._db
+
+    def _book_lock(self, book_id: ObjectId) -> threading.Lock:
+        with self._lock:
+            return self._book_locks.setdefault(book_id, threading.Lock())
+
+    def _current_version(self, book_id: ObjectId) -> str:
+        book = self.db["books"].find_one({"_id": book_id}, {"embeddingsUpdatedAt": 1})
+        updated_at = (book or {}).get("embeddingsUpdatedAt")
+        return updated_at.strftime("%Y%m%dT%H%M%S%f") if updated_at else "initial"
+
+    def get_index(self, book_id: ObjectId) -> BookVectorIndex:
+        """Return the book's index, exporting it on first use or after its embeddings changed."""
+        index = self._indexes.get(book_id)
+        if index is not None and time.monotonic() - index.loaded_at < self.refresh_seconds:
+            return index
+
+        with self._book_lock(book_id):
+            index = self._indexes.get(book_id)
+            if index is not None and time.monotonic() - index.loaded_at < self.refresh_seconds:
+                return index
+
+            version = self._current_version(book_id)
+            if index is not None and index.version == version:
+                index.loaded_at = time.monotonic()
+                return index
+
+            directory = os.path.join(self.cache_dir, str(book_id), version)
+            if not os.path.exists(os.path.join(directory, "embeddings.npy")):
+                self.export_book(book_id, directory)
+            index = BookVectorIndex(directory, version)
+            self._indexes[book_id] = index
+            return index
+
+    def export_book(self, book_id: ObjectId, directory: str) -> int:
+        """
+        Export a book's chunkEmbeddings to directory.
+
+        Files are written to a temporary sibling and renamed into place, so
+        concurrent processes never read a partial export.
+
+        Returns:
+            Number of chunks exported
+        """
+        collection = self.db["chunkEmbeddings"]
+        query = {"bookID": book_id}
+        count = collection.count_documents(query)
+        first = collection.find_one(query, {"embedding": 1})
+        dimensions = len(first["embedding"]) if first else 0
+
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(directory))
+        try:
+            embeddings = np.lib.format.open_memmap(
+                os.path.join(staging, "embeddings.npy"),
+                mode="w+",
+                dtype=np.float32,
+                shape=(count, dimensions),
+            )
+            subchapter_ids = np.zeros(count, dtype="S12")
+            chunk_indexes = np.zeros(count, dtype=np.int32)
+            text_offsets = np.zeros(count, dtype=np.int64)
+
+            row = 0
+            cursor = collection.find(
+                query,
+                {"embedding": 1, "subchapterID": 1, "chunkIndex": 1, "text": 1, "subchapterTitle": 1},
+            ).sort("chunkIndex", 1)
+            with open(os.path.join(staging, "texts.jsonl"), "wb") as texts:
+                for doc in cursor:
+                    if row >= count:
+                        break
+                    vector = np.asarray(doc["embedding"], dtype=np.float32)
+                    norm = np.linalg.norm(vector)
+                    embeddings[row] = vector / norm if norm else vector
+                    subchapter_id = doc.get("subchapterID")
+                    subchapter_ids[row] = subchapter_id.binary if isinstance(subchapter_id, ObjectId) else b""
+                    chunk_indexes[row] = doc.get("chunkIndex", row + 1)
+                    text_offsets[row] = texts.tell()
+                    line = {"text": doc.get("text", ""), "subchapterTitle": doc.get("subchapterTitle", "")}
+                    texts.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+                    row += 1
+
+            embeddings.flush()
+            del embeddings
+            if row < count:
+                # Rows deleted during the export; shrink to what was written
+                exported = np.load(os.path.join(staging, "embeddings.npy"))[:row]
+                np.save(os.path.join(staging, "embeddings.npy"), exported)
+            np.save(os.path.join(staging, "subchapters.npy"), subchapter_ids[:row])
+            np.save(os.path.join(staging, "chunk_indexes.npy"), chunk_indexes[:row])
+            np.save(os.path.join(staging, "text_offsets.npy"), text_offsets[:row])
+
+            try:
+                os.rename(staging, directory)
+            except OSError:
+                # Another process finished the same export first
+                shutil.rmtree(staging, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        print(f"Exported {row} embeddings for book {book_id} to {directory}")
+        return row
+
+    def search(
+        self,
+        book_id: ObjectId,
+        query_embedding: List[float],
+        limit: int,
+        exclude_subchapter_id: Optional[ObjectId] = None,
+        include_embeddings: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Top-k chunks of a book for the query embedding, see BookVectorIndex.search."""
+        return self.get_index(book_id).search(
+            query_embedding, limit, exclude_subchapter_id, include_embeddings
+        )
+
+    def invalidate(self, book_id: ObjectId) -> None:
+        """Drop the loaded index for a book so the next query re-checks its version."""
+        with self._lock:
+            self._indexes.pop(book_id, None)
+
+
+_local_retriever: Optional[LocalRetriever] = None
+_local_retriever_lock = threading.Lock()
+
+
+def get_local_retriever() -> LocalRetriever:
+    """
+    Get the process-wide local retriever.
+
+    Configured with RETRIEVAL_CACHE_DIR and RETRIEVAL_REFRESH_SECONDS.
+    """
+    global _local_retriever
+    if _local_retriever is None:
+        with _local_retriever_lock:
+            if _local_retriever is None:
+                _local_retriever = LocalRetriever(
+                    cache_dir=os.getenv("RETRIEVAL_CACHE_DIR") or None,
+                    refresh_seconds=int(
+                        os.getenv("RETRIEVAL_REFRESH_SECONDS", LocalRetriever.DEFAULT_REFRESH_SECONDS)
+                    ),
+                )
+    return _local_retriever
@@ -6,44 +6,69 @@ configurable difficulty distributions and deduplication support.
 
 import hashlib
 import json
+import os
 import re
 from datetime import datetime
 from io import BytesIO
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import uuid4
 
 import numpy as np
-import requests
 from bson import ObjectId
 from bson.errors import InvalidId
-from dotenv import load_dotenv
 from PyPDF2 import PdfReader
 
-from ..models.ai_models import MistralEmbed, MistralModel, MistralSmall
-from ..utils.database_funcs import get_mongo_client
+from ..utils.http_client import download_bytes
+from ..utils.json_stream import IncrementalJSONArrayParser
+from ..utils.mmr import mmr_select
+from ..utils.prompt_budget import PromptBudgeter
+from ..utils.single_flight import SingleFlight
+from ..utils.vector_search import VectorSearchConfig
+from ..utils.metrics import record_prompt_tokens, stage_timer
 from ..utils.timing import function_timer
+from ..utils.tracing import Span, span
+from ..utils.usage import usage_scope
+from ..utils.env import load_env
+from .app_context import AppContext, get_app_context
+from .local_retrieval import get_local_retriever, retrieval_backend
+from .question_pool import QuestionPool
 
-load_dotenv()
+load_env()
 
+# Shared across generator instances so concurrent requests coalesce
+_SUBCHAPTER_TEXT_FLIGHTS = SingleFlight("subchapter_text")
+_EMBEDDING_FLIGHTS = SingleFlight("input_embedding")
+_CONTEXT_FLIGHTS = SingleFlight("context_retrieval")
 
-class NewQuestionGenerator:
-    """Generates questions on-demand with deduplication and difficulty control."""
 
-    DEFAULT_RAG_DEPTH = 5
+class QuestionGenerationMixin:
+    """Prompt construction, hashing and result shapes shared by the question generators.
 
-    def __init__(self, rag_depth: int = DEFAULT_RAG_DEPTH):
-        self.rag_depth = rag_depth
-
-        mongo_client = get_mongo_client()
-        self.db = mongo_client["bookTestMaker"]
-        self.subchapter_collection = self.db["subchapters"]
-        self.chapter_collection = self.db["chapters"]
-        self.question_collection = self.db["questions"]
-        self.books_collection = self.db["books"]
-        self.chunk_embedding_collection = self.db["chunkEmbeddings"]
+    Holds no I/O. Classes using it set rag_depth and prompt_budgeter and call
+    _configure_retrieval() from their __init__.
+    """
 
-        self.embed_model = MistralEmbed()
-        self.generation_model = MistralModel()
-        self.evaluation_model = MistralSmall()
+    DEFAULT_RAG_DEPTH = 5
+    DEFAULT_PROMPT_TOKEN_BUDGET = PromptBudgeter.DEFAULT_TOKEN_BUDGET
+    DEFAULT_MMR_LAMBDA = 0.7
+    DEFAULT_CANDIDATE_MULTIPLIER = 4
+
+    def _configure_retrieval(self) -> None:
+        """Read retrieval settings from the environment.
+
+        RETRIEVAL_BACKEND selects $vectorSearch ("atlas") or the local engine,
+        and VectorSearchConfig.from_env() exact or approximate $vectorSearch.
+        RAG_CANDIDATE_MULTIPLIER x rag_depth candidates are fetched and
+        re-ranked with MMR using RAG_MMR_LAMBDA (1.0 keeps plain similarity
+        order); RAG_MAX_PER_SUBCHAPTER caps chunks taken from one subchapter.
+        """
+        self.retrieval_backend = retrieval_backend()
+        self.vector_search = VectorSearchConfig.from_env()
+        self.mmr_lambda = float(os.getenv("RAG_MMR_LAMBDA", self.DEFAULT_MMR_LAMBDA))
+        self.candidate_multiplier = max(
+            int(os.getenv("RAG_CANDIDATE_MULTIPLIER", self.DEFAULT_CANDIDATE_MULTIPLIER)), 1
+        )
+        self.max_per_subchapter = int(os.getenv("RAG_MAX_PER_SUBCHAPTER", "0")) or None
 
     @staticmethod
     def _ensure_object_id(value: str | ObjectId) -> ObjectId:
@@ -66,11 +91,280 @@ class NewQuestionGenerator:
     @staticmethod
     def _hash_question(text: str) -> str:
         """Generate a content hash for a question."""
-        normalized = NewQuestionGenerator._normalize_question_text(text)
+        normalized = QuestionGenerationMixin._normalize_question_text(text)
         return hashlib.sha256(normalized.encode()).hexdigest()[:16]
 
+    @staticmethod
+    def _text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def _vector_search_pipeline(
+        self,
+        book_id: ObjectId,
+        subchapter_id: ObjectId,
+        query_embedding: List[float],
+    ) -> List[Dict[str, Any]]:
+        """Build the $vectorSearch aggregation for candidate chunks outside the subchapter."""
+        return [
+            self.vector_search.stage(
+                query_embedding,
+                self.rag_depth * self.candidate_multiplier,
+                filter={"bookID": book_id, "subchapterID": {"$ne": subchapter_id}},
+            ),
+            {
+                "$project": {
+                    "_id": 0,
+                    "text": 1,
+                    "subchapterTitle": 1,
+                    "subchapterID": 1,
+                    "embedding": 1,
+                    "score": {"$meta": "vectorSearchScore"},
+                }
+            },
+        ]
+
+    def _select_context(
+        self,
+        query_embedding: List[float],
+        candidates: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Pick rag_depth relevant but mutually diverse entries from the retrieval candidates.
+
+        Adjacent, overlapping chunks of one neighbouring subchapter are near
+        duplicates; MMR and the per-subchapter cap spend the prompt on
+        different material instead.
+        """
+        with_vectors = [entry for entry in candidates if entry.get("embedding")]
+        if len(with_vectors) == len(candidates):
+            order = mmr_select(
+                query_embedding,
+                [entry["embedding"] for entry in candidates],
+                self.rag_depth,
+                lambda_mult=self.mmr_lambda,
+                groups=[str(entry.get("subchapterID")) for entry in candidates],
+                max_per_group=self.max_per_subchapter,
+            )
+        else:
+            order = list(range(min(self.rag_depth, len(candidates))))
+
+        return [
+            {key: value for key, value in candidates[index].items() if key not in ("embedding", "subchapterID")}
+            for index in order
+        ]
+
+    @staticmethod
+    def _format_context_entry(entry: Dict[str, Any]) -> str:
+        """Render a retrieved context entry as it appears in the prompt."""
+        title = entry.get("subchapterTitle", "Unknown")
+        return f"--- From '{title}' ---\n{entry.get('text', '')}\n\n"
+
+    def _compose_prompt(
+        self,
+        subchapter_data: Dict[str, Any],
+        subchapter_text: str,
+        difficulty_distribution: Dict[str, int],
+        existing_questions: List[Dict],
+        context_entries: List[Dict],
+    ) -> tuple[str, Dict[str, int]]:
+        """Assemble the prompt from already fetched parts, fitted to the token budget."""
+        total_questions = sum(difficulty_distribution.values())
+        
+        instructions = (
+            "You are an exam maker responsible for creating exam questions for a chosen "
+            "subchapter in a textbook for students to practice with.\n\n"
+            f"Textbook: {subchapter_data.get('book_title', '')}\n"
+            f"Chapter title: {subchapter_data.get('chapter_title', '')}\n"
+            f"Subchapter title: {subchapter_data.get('subchapter_title', '')}\n"
+            f"Generate exactly {total_questions} questions with the following difficulty distribution:\n"
+        )
+
+        for difficulty, count in difficulty_distribution.items():
+            if count > 0:
+                instructions += f"- {difficulty.capitalize()}: {count} question(s)\n"
+
+        instructions += (
+            "\nThe output MUST be a valid JSON object with a key 'questions', containing a list "
+            "of question objects.\n"
+            "Each question object MUST have these exact fields:\n"
+            '- "text": the question text (string)\n'
+            '- "alternatives": array of 4 answer choices (array of strings)\n'
+            '- "correct_alternative": the correct answer (string, must match one of the alternatives exactly)\n'
+            '- "difficulty": one of "easy", "medium", or "hard" (string)\n\n'
+        )
+
+        # Add exclusion hints if we have questions to avoid
+        exclusions = ""
+        if existing_questions:
+            exclusions += (
+                "IMPORTANT: Generate NEW and UNIQUE questions. "
+                "Do NOT generate questions similar to these existing ones:\n"
+            )
+            for i, q in enumerate(existing_questions, 1):
+                exclusions += f'{i}. "{q.get("question", "")}"\n'
+            exclusions += "\n"
+
+        text_template = (
+            "Ensure that the questions can be understood without needing to read "
+            "the subchapter text by supplying the necessary context in the question itself.\n\n"
+            "<<<\nSubchapter Text:\n{}\n>>>\n\n"
+        )
+        context_header = "Additional context from related subchapters (use if relevant):\n"
+        fixed_sections = {
+            "instructions": instructions + text_template.format(""),
+            "exclusions": exclusions,
+        }
+
+        if context_entries:
+            fixed_sections["context_header"] = context_header
+
+        budget = self.prompt_budgeter.fit(
+            fixed_sections,
+            subchapter_text,
+            context_entries,
+            self._format_context_entry,
+        )
+        if budget["text_windowed"] or budget["dropped_context"]:
+            print(
+                f"Prompt trimmed to {budget['section_tokens']['total']} tokens "
+                f"(text windowed: {budget['text_windowed']}, "
+                f"context dropped: {budget['dropped_context']})"
+            )
+
+        prompt = instructions + exclusions + text_template.format(budget["subchapter_text"])
+        if budget["context_entries"]:
+            prompt += context_header
+            for entry in budget["context_entries"]:
+                prompt += self._format_context_entry(entry)
+
+        record_prompt_tokens(budget["section_tokens"])
+        return prompt, budget["section_tokens"]
+
+    @staticmethod
+    def _evaluation_prompt(response: str) -> str:
+        """Build the quality control prompt for a generation response."""
+        return (
+            "Evaluate the following questions based on these criteria:\n\n"
+            "- The question and the answer should be factually correct\n"
+            "- There should not be any spelling mistakes or grammatical errors\n"
+            "- The question should be self-contained and understandable without external context\n"
+            "- The alternatives should be plausible\n\n"
+            "Return a JSON object with a key 'scores': a list of numbers indicating "
+            "the confidence score of each question (same order as input).\n"
+            "Scores should be between 0 and 1, where 1 is highest confidence.\n\n"
+            f"<<<\nQuestions:\n{response}\n>>>"
+        )
+
+    def _question_document(
+        self,
+        question: Dict,
+        subchapter_data: Dict[str, Any],
+        content_hash: str,
+        source: str,
+    ) -> Dict[str, Any]:
+        """Build the MongoDB document for a generated question."""
+        return {
+            "bookID": self._ensure_object_id(subchapter_data["book_id"]),
+            "bookTitle": subchapter_data.get("book_title", ""),
+            "chapterID": self._ensure_object_id(subchapter_data["chapter_id"]),
+            "chapterTitle": subchapter_data.get("chapter_title", ""),
+            "subchapterID": self._ensure_object_id(subchapter_data["subchapter_id"]),
+            "subchapterTitle": subchapter_data.get("subchapter_title", ""),
+            "question": question.get("text", ""),
+            "alternatives": question.get("alternatives", []),
+            "correctAlternative": question.get("correct_alternative", ""),
+            "difficulty": question.get("difficulty", "medium"),
+            "confidence": question.get("confidence", 0.0),
+            "contentHash": content_hash,
+            "source": source,
+            "createdAt": datetime.utcnow(),
+            **({"poolState": QuestionPool.AVAILABLE} if source == "pregenerated" else {}),
+        }
+
+    @staticmethod
+    def _annotate_span(root: Optional[Span], result: Dict[str, Any]) -> None:
+        """Record the outcome of a subchapter generation on its trace span."""
+        if root is None:
+            return
+        root.set_attribute("questions", len(result["generated_question_ids"]))
+        if result.get("error"):
+            root.status = "ERROR"
+            root.error = result["error"].get("errorType")
+
+    @staticmethod
+    def _error_result(subchapter_id: str, error_type: str, message: str) -> Dict[str, Any]:
+        return {
+            "generated_question_ids": [],
+            "error": {
+                "subchapterId": subchapter_id,
+                "errorType": error_type,
+                "message": message,
+            },
+        }
+
+    @staticmethod
+    def _bypass_cache(subchapter_request: Dict[str, Any], source: str) -> bool:
+        """Pool top-up and callers asking for fresh variation skip the response cache."""
+        return source == "pregenerated" or bool(subchapter_request.get("bypass_cache", False))
+
+    @staticmethod
+    def _usage_attributes(subchapter_request: Dict[str, Any], source: str) -> Dict[str, Any]:
+        """Book and subchapter a subchapter's model usage is recorded against."""
+        return {
+            "bookId": str(subchapter_request.get("book_id") or "") or None,
+            "subchapterId": str(subchapter_request["subchapter_id"]),
+            "source": source,
+        }
+
+
+class NewQuestionGenerator(QuestionGenerationMixin):
+    """Generates questions on-demand with deduplication and difficulty control."""
+
+    def __init__(
+        self,
+        rag_depth: int = QuestionGenerationMixin.DEFAULT_RAG_DEPTH,
+        prompt_token_budget: Optional[int] = None,
+        use_pool: bool = False,
+        context: Optional[AppContext] = None,
+    ):
+        context = context or get_app_context()
+        self.rag_depth = rag_depth
+        # PROMPT_TOKEN_BUDGET unless a budget is passed
+        self.prompt_budgeter = PromptBudgeter.from_env(context.tokenizer, prompt_token_budget)
+        self._configure_retrieval()
+
+        self.db = context.db
+        self.subchapter_collection = self.db["subchapters"]
+        self.chapter_collection = self.db["chapters"]
+        self.question_collection = self.db["questions"]
+        self.books_collection = self.db["books"]
+        self.chunk_embedding_collection = self.db["chunkEmbeddings"]
+
+        self.question_pool: Optional[QuestionPool] = None
+        if use_pool:
+            self.question_pool = QuestionPool(
+                self.question_collection,
+                self.db["questionPoolDemand"],
+                target_per_difficulty=int(
+                    os.getenv("QUESTION_POOL_TARGET", QuestionPool.DEFAULT_TARGET_PER_DIFFICULTY)
+                ),
+            )
+
+        self.embed_model = context.embed_model
+        self.generation_model = context.generation_model
+        self.evaluation_model = context.evaluation_model
+
     def _fetch_subchapter_text(self, subchapter_id: ObjectId) -> Optional[str]:
-        """Fetch and extract text from a subchapter's PDF."""
+        """Fetch and extract text from a subchapter's PDF.
+
+        Concurrent requests for the same subchapter share one download and parse.
+        """
+        text, _ = _SUBCHAPTER_TEXT_FLIGHTS.do(
+            str(subchapter_id), lambda: self._load_subchapter_text(subchapter_id)
+        )
+        return text
+
+    def _load_subchapter_text(self, subchapter_id: ObjectId) -> Optional[str]:
+        """Download a subchapter's PDF and extract its text."""
         sub_doc = self.subchapter_collection.find_one({"_id": subchapter_id})
         if not sub_doc:
             return None
@@ -80,10 +374,10 @@ class NewQuestionGenerator:
             return None
 
         try:
-            response = requests.get(pdf_url, timeout=60)
-            response.raise_for_status()
-            reader = PdfReader(BytesIO(response.content))
-            text = "".join(page.extract_text() or "" for page in reader.pages)
+            content = download_bytes(pdf_url)
+            with stage_timer("extract"):
+                reader = PdfReader(BytesIO(content))
+                text = "".join(page.extract_text() or "" for page in reader.pages)
             return text if text.strip() else None
         except Exception as e:
             print(f"Error fetching PDF for subchapter {subchapter_id}: {e}")
@@ -95,7 +389,23 @@ class NewQuestionGenerator:
         overlap: int = 50,
         max_chunk_size: int = 3064,
     ) -> List[float]:
-        """Create embedding for input text by averaging chunk embeddings."""
+        """Create embedding for input text by averaging chunk embeddings.
+
+        Concurrent requests for the same text share one set of embedding calls.
+        """
+        embedding, _ = _EMBEDDING_FLIGHTS.do(
+            (self._text_key(text), overlap, max_chunk_size),
+            lambda: self._compute_input_embedding(text, overlap, max_chunk_size),
+        )
+        return embedding
+
+    def _compute_input_embedding(
+        self,
+        text: str,
+        overlap: int,
+        max_chunk_size: int,
+    ) -> List[float]:
+        """Embed text chunk by chunk and average the chunk embeddings."""
         embeddings = []
         for i in range(0, len(text), max_chunk_size - overlap):
             chunk = text[i : i + max_chunk_size]
@@ -110,27 +420,39 @@ class NewQuestionGenerator:
         subchapter_id: ObjectId,
         subchapter_text: str,
     ) -> List[Dict]:
-        """Retrieve relevant context using vector search."""
+        """Retrieve relevant context using vector search.
+
+        Concurrent requests for the same subchapter share one vector search.
+        """
+        entries, _ = _CONTEXT_FLIGHTS.do(
+            (str(book_id), str(subchapter_id), self._text_key(subchapter_text), self.rag_depth),
+            lambda: self._search_context(book_id, subchapter_id, subchapter_text),
+        )
+        # Callers get their own copies of the shared result
+        return [dict(entry) for entry in entries]
+
+    def _search_context(
+        self,
+        book_id: ObjectId,
+        subchapter_id: ObjectId,
+        subchapter_text: str,
+    ) -> List[Dict]:
+        """Find chunks related to the subchapter text with $vectorSearch or the local engine."""
         try:
             query_embedding = self._embed_input(subchapter_text)
-            pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",
-                        "queryVector": query_embedding,
-                        "path": "embedding",
-                        "filter": {
-                            "bookID": book_id,
-                            "subchapterID": {"$ne": subchapter_id},
-                        },
-                        "exact": True,
-                        "limit": self.rag_depth,
-                    }
-                },
-                {"$project": {"_id": 0, "text": 1, "subchapterTitle": 1}},
-            ]
-            results = self.chunk_embedding_collection.aggregate(pipeline)
-            return list(results)
+            with stage_timer("vector_search"):
+                if self.retrieval_backend == "local":
+                    candidates = get_local_retriever().search(
+                        book_id,
+                        query_embedding,
+                        self.rag_depth * self.candidate_multiplier,
+                        exclude_subchapter_id=subchapter_id,
+                        include_embeddings=True,
+                    )
+                else:
+                    pipeline = self._vector_search_pipeline(book_id, subchapter_id, query_embedding)
+                    candidates = list(self.chunk_embedding_collection.aggregate(pipeline))
+                return self._select_context(query_embedding, candidates)
         except Exception as exc:
             print(f"Error retrieving context: {exc}")
             return []
@@ -141,58 +463,22 @@ class NewQuestionGenerator:
         subchapter_text: str,
         difficulty_distribution: Dict[str, int],
         exclude_hashes: List[str],
-    ) -> str:
-        """Build prompt for question generation with difficulty and exclusion support."""
+    ) -> tuple[str, Dict[str, int]]:
+        """Build prompt for question generation with difficulty and exclusion support.
+
+        Returns:
+            Tuple of (prompt, token count per prompt section)
+        """
         book_id = self._ensure_object_id(subchapter_data["book_id"])
         subchapter_id = self._ensure_object_id(subchapter_data["subchapter_id"])
-        
-        total_questions = sum(difficulty_distribution.values())
-        
-        prompt = (
-            "You are an exam maker responsible for creating exam questions for a chosen "
-            "subchapter in a textbook for students to practice with.\n\n"
-            f"Textbook: {subchapter_data.get('book_title', '')}\n"
-            f"Chapter title: {subchapter_data.get('chapter_title', '')}\n"
-            f"Subchapter title: {subchapter_data.get('subchapter_title', '')}\n"
-            f"Generate exactly {total_questions} questions with the following difficulty distribution:\n"
-        )
-
-        for difficulty, count in difficulty_distribution.items():
-            if count > 0:
-                prompt += f"- {difficulty.capitalize()}: {count} question(s)\n"
 
-        prompt += (
-            "\nThe output MUST be a valid JSON object with a key 'questions', containing a list "
-            "of question objects.\n"
-            "Each question object MUST have these exact fields:\n"
-            '- "text": the question text (string)\n'
-            '- "alternatives": array of 4 answer choices (array of strings)\n'
-            '- "correct_alternative": the correct answer (string, must match one of the alternatives exactly)\n'
-            '- "difficulty": one of "easy", "medium", or "hard" (string)\n\n'
-        )
-
-        # Add exclusion hints if we have hashes to avoid
+        existing_questions: List[Dict] = []
         if exclude_hashes:
             # Fetch the actual question texts for these hashes to give the LLM context
             existing_questions = list(self.question_collection.find(
                 {"contentHash": {"$in": exclude_hashes}},
                 {"question": 1, "_id": 0}
             ).limit(10))  # Limit to avoid prompt bloat
-            
-            if existing_questions:
-                prompt += (
-                    "IMPORTANT: Generate NEW and UNIQUE questions. "
-                    "Do NOT generate questions similar to these existing ones:\n"
-                )
-                for i, q in enumerate(existing_questions, 1):
-                    prompt += f'{i}. "{q.get("question", "")}"\n'
-                prompt += "\n"
-
-        prompt += (
-            "Ensure that the questions can be understood without needing to read "
-            "the subchapter text by supplying the necessary context in the question itself.\n\n"
-            f"<<<\nSubchapter Text:\n{subchapter_text}\n>>>\n\n"
-        )
 
         # Add RAG context
         context_entries = self._retrieve_context(
@@ -200,27 +486,18 @@ class NewQuestionGenerator:
             subchapter_id=subchapter_id,
             subchapter_text=subchapter_text,
         )
-        if context_entries:
-            prompt += "Additional context from related subchapters (use if relevant):\n"
-            for entry in context_entries:
-                title = entry.get("subchapterTitle", "Unknown")
-                prompt += f"--- From '{title}' ---\n{entry.get('text', '')}\n\n"
 
-        return prompt
+        return self._compose_prompt(
+            subchapter_data,
+            subchapter_text,
+            difficulty_distribution,
+            existing_questions,
+            context_entries,
+        )
 
     def _evaluate_response(self, response: str) -> List[Dict]:
         """Evaluate generated questions using quality control model."""
-        evaluation_prompt = (
-            "Evaluate the following questions based on these criteria:\n\n"
-            "- The question and the answer should be factually correct\n"
-            "- There should not be any spelling mistakes or grammatical errors\n"
-            "- The question should be self-contained and understandable without external context\n"
-            "- The alternatives should be plausible\n\n"
-            "Return a JSON object with a key 'scores': a list of numbers indicating "
-            "the confidence score of each question (same order as input).\n"
-            "Scores should be between 0 and 1, where 1 is highest confidence.\n\n"
-            f"<<<\nQuestions:\n{response}\n>>>"
-        )
+        evaluation_prompt = self._evaluation_prompt(response)
 
         try:
             questions = json.loads(response)["questions"]
@@ -244,55 +521,130 @@ class NewQuestionGenerator:
         questions: List[Dict],
         subchapter_data: Dict[str, Any],
         source: str = "realtime",
+        reuse_existing: bool = False,
     ) -> List[str]:
-        """Insert generated questions into MongoDB and return their IDs."""
+        """Insert generated questions into MongoDB and return their IDs.
+
+        Duplicates are skipped, or returned by their existing ID when
+        reuse_existing is set (used when the response came from the cache and
+        its questions were therefore inserted by an earlier request).
+        """
         inserted_ids: List[str] = []
-        
-        book_id = self._ensure_object_id(subchapter_data["book_id"])
-        chapter_id = self._ensure_object_id(subchapter_data["chapter_id"])
-        subchapter_id = self._ensure_object_id(subchapter_data["subchapter_id"])
 
-        for question in questions:
-            try:
-                question_text = question.get("text", "")
-                content_hash = self._hash_question(question_text)
+        # Validate IDs up front so a malformed request fails as a whole
+        for key in ("book_id", "chapter_id", "subchapter_id"):
+            self._ensure_object_id(subchapter_data[key])
+
+        with stage_timer("insert"):
+            for question in questions:
+                try:
+                    question_text = question.get("text", "")
+                    content_hash = self._hash_question(question_text)
                 
-                # Check for duplicate by hash
-                existing = self.question_collection.find_one({"contentHash": content_hash})
-                if existing:
-                    print(f"Skipping duplicate question with hash {content_hash}")
-                    continue
-
-                result = self.question_collection.insert_one({
-                    "bookID": book_id,
-                    "bookTitle": subchapter_data.get("book_title", ""),
-                    "chapterID": chapter_id,
-                    "chapterTitle": subchapter_data.get("chapter_title", ""),
-                    "subchapterID": subchapter_id,
-                    "subchapterTitle": subchapter_data.get("subchapter_title", ""),
-                    "question": question_text,
-                    "alternatives": question.get("alternatives", []),
-                    "correctAlternative": question.get("correct_alternative", ""),
-                    "difficulty": question.get("difficulty", "medium"),
-                    "confidence": question.get("confidence", 0.0),
-                    "contentHash": content_hash,
-                    "source": source,
-                    "createdAt": datetime.utcnow(),
-                })
-                inserted_ids.append(str(result.inserted_id))
-                print(f"Inserted question: {result.inserted_id}")
-            except Exception as exc:
-                print(f"Error inserting question: {exc}")
+                    # Check for duplicate by hash
+                    existing = self.question_collection.find_one({"contentHash": content_hash})
+                    if existing:
+                        if reuse_existing:
+                            inserted_ids.append(str(existing["_id"]))
+                            continue
+                        print(f"Skipping duplicate question with hash {content_hash}")
+                        continue
+
+                    result = self.question_collection.insert_one(
+                        self._question_document(question, subchapter_data, content_hash, source)
+                    )
+                    inserted_ids.append(str(result.inserted_id))
+                    print(f"Inserted question: {result.inserted_id}")
+                except Exception as exc:
+                    print(f"Error inserting question: {exc}")
 
         return inserted_ids
 
+    def _claim_from_pool(
+        self,
+        subchapter_request: Dict[str, Any],
+    ) -> tuple[List[str], Dict[str, Any]]:
+        """Serve as much of a request as possible from the question pool.
+
+        Returns:
+            Tuple of (claimed question IDs, request reduced to the shortfall)
+        """
+        if self.question_pool is None:
+            return [], subchapter_request
+
+        sub_oid = self._ensure_object_id(subchapter_request["subchapter_id"])
+        self.question_pool.record_demand(subchapter_request, sub_oid)
+
+        exclude_hashes = subchapter_request.get("exclude_hashes", [])
+        remaining = dict(subchapter_request.get("difficulty_distribution", {}))
+        claimed_ids: List[str] = []
+        for difficulty, count in remaining.items():
+            if count <= 0:
+                continue
+            ids = self.question_pool.claim(sub_oid, difficulty, count, exclude_hashes)
+            claimed_ids.extend(ids)
+            remaining[difficulty] = count - len(ids)
+
+        if claimed_ids:
+            print(f"Served {len(claimed_ids)} questions from the pool for {sub_oid}")
+        return claimed_ids, {
+            **subchapter_request,
+            "difficulty_distribution": remaining,
+            "questions_to_generate": sum(remaining.values()),
+        }
+
+    def _prepare_subchapter(
+        self,
+        subchapter_request: Dict[str, Any],
+    ) -> tuple[Optional[Dict[str, Any]], Optional[str], Dict[str, int]]:
+        """Fetch the subchapter text and build its prompt.
+
+        Returns:
+            Tuple of (subchapter data, prompt, prompt tokens per section); the
+            data and prompt are None when the subchapter PDF could not be read.
+        """
+        subchapter_id = subchapter_request["subchapter_id"]
+        sub_oid = self._ensure_object_id(subchapter_id)
+
+        # Fetch subchapter text
+        with span("fetch_subchapter_text"):
+            subchapter_text = self._fetch_subchapter_text(sub_oid)
+        if not subchapter_text:
+            return None, None, {}
+
+        # Build subchapter data for prompt and insertion
+        subchapter_data = {
+            "subchapter_id": subchapter_id,
+            "book_id": subchapter_request["book_id"],
+            "chapter_id": subchapter_request["chapter_id"],
+            "subchapter_title": subchapter_request.get("subchapter_title", ""),
+            "book_title": subchapter_request.get("book_title", ""),
+            "chapter_title": subchapter_request.get("chapter_title", ""),
+        }
+
+        difficulty_distribution = subchapter_request.get("difficulty_distribution", {})
+        exclude_hashes = subchapter_request.get("exclude_hashes", [])
+
+        with span("build_prompt"):
+            prompt, prompt_tokens = self._build_prompt(
+                subchapter_data,
+                subchapter_text,
+                difficulty_distribution,
+                exclude_hashes,
+            )
+        return subchapter_data, prompt, prompt_tokens
+
     @function_timer
     def generate_for_subchapter(
         self,
         subchapter_request: Dict[str, Any],
+        source: str = "realtime",
     ) -> Dict[str, Any]:
         """
         Generate questions for a single subchapter.
+
+        When the question pool is enabled, realtime requests are served from
+        the pool first and only the shortfall is generated live.
         
         Args:
             subchapter_request: Dict containing:
@@ -305,86 +657,211 @@ class NewQuestionGenerator:
                 - questions_to_generate: int
                 - difficulty_distribution: Dict[str, int]
                 - exclude_hashes: List[str]
+                - bypass_cache: bool (optional) - always call the LLM
+            source: "realtime" for user requests, "pregenerated" for pool top-up
         
         Returns:
             Dict with:
                 - generated_question_ids: List[str]
                 - error: Optional[Dict] with errorType and message
+                - metrics: Dict with prompt_tokens per prompt section, when a
+                  prompt was built, and pool_hits when the pool is enabled
         """
         subchapter_id = subchapter_request["subchapter_id"]
-        
-        try:
-            sub_oid = self._ensure_object_id(subchapter_id)
-            
-            # Fetch subchapter text
-            subchapter_text = self._fetch_subchapter_text(sub_oid)
-            if not subchapter_text:
-                return {
-                    "generated_question_ids": [],
-                    "error": {
-                        "subchapterId": subchapter_id,
-                        "errorType": "pdf_fetch_failed",
-                        "message": "Could not fetch or parse subchapter PDF",
-                    },
-                }
 
-            # Build subchapter data for prompt and insertion
-            subchapter_data = {
-                "subchapter_id": subchapter_id,
-                "book_id": subchapter_request["book_id"],
-                "chapter_id": subchapter_request["chapter_id"],
-                "subchapter_title": subchapter_request.get("subchapter_title", ""),
-                "book_title": subchapter_request.get("book_title", ""),
-                "chapter_title": subchapter_request.get("chapter_title", ""),
-            }
+        with usage_scope("generation_subchapter", **self._usage_attributes(subchapter_request, source)), \
+                span("generate_for_subchapter", subchapter_id=str(subchapter_id), source=source) as root:
+            claimed_ids: List[str] = []
+            if source == "realtime" and self.question_pool is not None:
+                with span("pool_claim"):
+                    try:
+                        claimed_ids, subchapter_request = self._claim_from_pool(subchapter_request)
+                    except Exception as exc:
+                        print(f"Question pool unavailable for subchapter {subchapter_id}: {exc}")
+
+                if claimed_ids and subchapter_request["questions_to_generate"] <= 0:
+                    return {
+                        "generated_question_ids": claimed_ids,
+                        "error": None,
+                        "metrics": {"pool_hits": len(claimed_ids)},
+                    }
 
-            difficulty_distribution = subchapter_request.get("difficulty_distribution", {})
-            exclude_hashes = subchapter_request.get("exclude_hashes", [])
+            result = self._generate_live(subchapter_request, source)
+            if self.question_pool is not None and source == "realtime":
+                result["generated_question_ids"] = claimed_ids + result["generated_question_ids"]
+                result.setdefault("metrics", {})["pool_hits"] = len(claimed_ids)
+            self._annotate_span(root, result)
+            return result
 
-            # Build and execute prompt
-            prompt = self._build_prompt(
-                subchapter_data,
-                subchapter_text,
-                difficulty_distribution,
-                exclude_hashes,
-            )
+    def _generate_live(
+        self,
+        subchapter_request: Dict[str, Any],
+        source: str,
+    ) -> Dict[str, Any]:
+        """Generate questions for a subchapter with the LLM and insert them."""
+        subchapter_id = subchapter_request["subchapter_id"]
+        
+        try:
+            subchapter_data, prompt, prompt_tokens = self._prepare_subchapter(subchapter_request)
+            if subchapter_data is None:
+                return self._error_result(
+                    subchapter_id, "pdf_fetch_failed", "Could not fetch or parse subchapter PDF"
+                )
 
             print(f"Generating questions for subchapter: {subchapter_data['subchapter_title']}")
-            response = self.generation_model.generate_response(prompt)
+            response, from_cache = self.generation_model.generate_with_cache_info(
+                prompt,
+                bypass_cache=self._bypass_cache(subchapter_request, source),
+            )
 
             # Evaluate and insert questions
             questions = self._evaluate_response(response)
             
             if not questions:
-                return {
-                    "generated_question_ids": [],
-                    "error": {
-                        "subchapterId": subchapter_id,
-                        "errorType": "generation_failed",
-                        "message": "LLM did not return valid questions",
-                    },
-                }
+                result = self._error_result(
+                    subchapter_id, "generation_failed", "LLM did not return valid questions"
+                )
+                result["metrics"] = {"prompt_tokens": prompt_tokens}
+                return result
 
-            inserted_ids = self._insert_questions(questions, subchapter_data, source="realtime")
+            inserted_ids = self._insert_questions(
+                questions, subchapter_data, source=source, reuse_existing=from_cache
+            )
             
             print(f"Generated {len(inserted_ids)} questions for {subchapter_data['subchapter_title']}")
             
             return {
                 "generated_question_ids": inserted_ids,
                 "error": None,
+                "metrics": {"prompt_tokens": prompt_tokens},
             }
 
         except Exception as exc:
             print(f"Error generating questions for subchapter {subchapter_id}: {exc}")
-            return {
-                "generated_question_ids": [],
-                "error": {
-                    "subchapterId": subchapter_id,
-                    "errorType": "generation_error",
-                    "message": str(exc),
-                },
+            return self._error_result(subchapter_id, "generation_error", str(exc))
+
+    def stream_for_subchapter(
+        self,
+        subchapter_request: Dict[str, Any],
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Generate questions for a single subchapter, inserting each one as soon as
+        the model has finished writing it.
+
+        Questions are inserted with confidence 0.0 while streaming; once the full
+        response is in, it is scored by the evaluation model in one call and the
+        inserted questions are updated with their confidence.
+
+        Args:
+            subchapter_request: Same shape as for generate_for_subchapter
+
+        Yields:
+            {"type": "question", "subchapterId": str, "questionId": str} per
+            inserted question, then {"type": "result", ...} carrying the same
+            fields generate_for_subchapter returns.
+        """
+        subchapter_id = subchapter_request["subchapter_id"]
+
+        with usage_scope("generation_subchapter", **self._usage_attributes(subchapter_request, "realtime")):
+            claimed_ids: List[str] = []
+            if self.question_pool is not None:
+                try:
+                    claimed_ids, subchapter_request = self._claim_from_pool(subchapter_request)
+                except Exception as exc:
+                    print(f"Question pool unavailable for subchapter {subchapter_id}: {exc}")
+                for question_id in claimed_ids:
+                    yield {"type": "question", "subchapterId": subchapter_id, "questionId": question_id}
+                if claimed_ids and subchapter_request["questions_to_generate"] <= 0:
+                    yield {
+                        "type": "result",
+                        "generated_question_ids": claimed_ids,
+                        "error": None,
+                        "metrics": {"pool_hits": len(claimed_ids)},
+                    }
+                    return
+
+            for event in self._stream_live(subchapter_request):
+                if event["type"] == "result" and self.question_pool is not None:
+                    event["generated_question_ids"] = claimed_ids + event["generated_question_ids"]
+                    event.setdefault("metrics", {})["pool_hits"] = len(claimed_ids)
+                yield event
+
+    def _stream_live(
+        self,
+        subchapter_request: Dict[str, Any],
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream LLM generation for a subchapter, inserting questions as they complete."""
+        subchapter_id = subchapter_request["subchapter_id"]
+
+        try:
+            subchapter_data, prompt, prompt_tokens = self._prepare_subchapter(subchapter_request)
+            if subchapter_data is None:
+                yield {
+                    "type": "result",
+                    **self._error_result(
+                        subchapter_id, "pdf_fetch_failed", "Could not fetch or parse subchapter PDF"
+                    ),
+                }
+                return
+
+            print(f"Streaming questions for subchapter: {subchapter_data['subchapter_title']}")
+            parser = IncrementalJSONArrayParser("questions")
+            # Inserted id (or None for skipped duplicates) per streamed question, in order
+            streamed_ids: List[Optional[str]] = []
+
+            fragments, from_cache = self.generation_model.stream_with_cache_info(
+                prompt,
+                bypass_cache=self._bypass_cache(subchapter_request, "realtime"),
+            )
+            for fragment in fragments:
+                for question in parser.feed(fragment):
+                    inserted = self._insert_questions(
+                        [question],
+                        subchapter_data,
+                        source="realtime",
+                        reuse_existing=from_cache,
+                    )
+                    streamed_ids.append(inserted[0] if inserted else None)
+                    if inserted:
+                        yield {
+                            "type": "question",
+                            "subchapterId": subchapter_id,
+                            "questionId": inserted[0],
+                        }
+
+            inserted_ids = [qid for qid in streamed_ids if qid]
+            if not streamed_ids:
+                result = self._error_result(
+                    subchapter_id, "generation_failed", "LLM did not return valid questions"
+                )
+            else:
+                self._update_confidences(streamed_ids, self._evaluate_response(parser.text))
+                result = {"generated_question_ids": inserted_ids, "error": None}
+
+            print(f"Generated {len(inserted_ids)} questions for {subchapter_data['subchapter_title']}")
+            result["metrics"] = {"prompt_tokens": prompt_tokens}
+            yield {"type": "result", **result}
+
+        except Exception as exc:
+            print(f"Error streaming questions for subchapter {subchapter_id}: {exc}")
+            yield {
+                "type": "result",
+                **self._error_result(subchapter_id, "generation_error", str(exc)),
             }
 
+    def _update_confidences(
+        self,
+        question_ids: List[Optional[str]],
+        evaluated_questions: List[Dict],
+    ) -> None:
+        """Set confidence on already inserted questions from positional evaluation results."""
+        for question_id, question in zip(question_ids, evaluated_questions):
+            if question_id and "confidence" in question:
+                self.question_collection.update_one(
+                    {"_id": ObjectId(question_id)},
+                    {"$set": {"confidence": question["confidence"]}},
+                )
+
     def generate_for_subchapters(
         self,
         subchapter_requests: List[Dict[str, Any]],
@@ -399,20 +876,61 @@ class NewQuestionGenerator:
             Dict with:
                 - generated_question_ids: List[str] - all generated question IDs
                 - errors: List[Dict] - errors for failed subchapters
+                - metrics: List[Dict] - prompt token counts per subchapter
         """
         all_generated_ids: List[str] = []
         all_errors: List[Dict[str, str]] = []
+        all_metrics: List[Dict[str, Any]] = []
 
-        for request in subchapter_requests:
-            result = self.generate_for_subchapter(request)
-            all_generated_ids.extend(result.get("generated_question_ids", []))
+        with usage_scope("generation_request", requestId=uuid4().hex, subchapters=len(subchapter_requests)):
+            for request in subchapter_requests:
+                result = self.generate_for_subchapter(request)
+                all_generated_ids.extend(result.get("generated_question_ids", []))
             
-            if result.get("error"):
-                all_errors.append(result["error"])
+                if result.get("error"):
+                    all_errors.append(result["error"])
+                if result.get("metrics"):
+                    all_metrics.append({"subchapterId": request["subchapter_id"], **result["metrics"]})
 
         return {
             "generated_question_ids": all_generated_ids,
             "errors": all_errors,
+            "metrics": all_metrics,
+        }
+
+    def stream_for_subchapters(
+        self,
+        subchapter_requests: List[Dict[str, Any]],
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream questions for multiple subchapters.
+
+        Yields the "question" events of stream_for_subchapter as they happen,
+        followed by one {"type": "summary", ...} event with the same fields as
+        generate_for_subchapters returns.
+        """
+        all_generated_ids: List[str] = []
+        all_errors: List[Dict[str, str]] = []
+        all_metrics: List[Dict[str, Any]] = []
+
+        with usage_scope("generation_request", requestId=uuid4().hex, subchapters=len(subchapter_requests)):
+            for request in subchapter_requests:
+                for event in self.stream_for_subchapter(request):
+                    if event["type"] != "result":
+                        yield event
+                        continue
+
+                    all_generated_ids.extend(event.get("generated_question_ids", []))
+                    if event.get("error"):
+                        all_errors.append(event["error"])
+                    if event.get("metrics"):
+                        all_metrics.append({"subchapterId": request["subchapter_id"], **event["metrics"]})
+
+        yield {
+            "type": "summary",
+            "generated_question_ids": all_generated_ids,
+            "errors": all_errors,
+            "metrics": all_metrics,
         }
 
 
@@ -1,19 +1,43 @@
 """PDF processing module for extracting, splitting, and uploading textbook chapters."""
 
+import contextvars
+import hashlib
+import json
 import os
 import tempfile
-from typing import Any, Dict, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
 
-import boto3
 import fitz
 import PyPDF2
-import requests
 from bson import ObjectId
-from dotenv import load_dotenv
 
-from ..utils.database_funcs import get_mongo_client
+from ..utils.http_client import download_bytes, download_to_file
+from ..utils.metrics import progress, stage_timer
+from ..utils.tracing import span
+from ..utils.env import load_env
+from .app_context import AppContext, get_app_context
+from .local_retrieval import mark_embeddings_updated
 
-load_dotenv()
+load_env()
+
+_fingerprint_indexes_ready = False
+_fingerprint_indexes_lock = threading.Lock()
+
+
+def _ensure_fingerprint_indexes(books_collection) -> None:
+    """Create the contentFingerprint indexes duplicate lookups use, once per process."""
+    global _fingerprint_indexes_ready
+    if _fingerprint_indexes_ready:
+        return
+    with _fingerprint_indexes_lock:
+        if not _fingerprint_indexes_ready:
+            books_collection.create_index("contentFingerprint.sha256", sparse=True)
+            books_collection.create_index("contentFingerprint.pagesSha256", sparse=True)
+            _fingerprint_indexes_ready = True
 
 
 class PDFProcessor:
@@ -38,29 +62,50 @@ class PDFProcessor:
         "copyright",
     }
 
-    def __init__(self) -> None:
-        """Initialize PDF processor with S3 and MongoDB clients."""
+    INGEST_MODES = {"memory", "file"}
+    CLONE_WORKERS = 16
+    EMBEDDING_CLONE_BATCH = 500
+
+    def __init__(self, context: Optional[AppContext] = None) -> None:
+        """
+        Initialize PDF processor with S3 and MongoDB clients.
+
+        Args:
+            context: Shared clients; defaults to the process-wide AppContext
+        """
+        context = context or get_app_context()
         self.bucket_name = os.getenv("AWS_BUCKET_NAME")
         if not self.bucket_name:
             raise ValueError("AWS_BUCKET_NAME environment variable is required")
 
-        self.s3_client = boto3.client("s3")
+        self.ingest_mode = os.getenv("PDF_INGEST_MODE", "memory").strip().lower()
+        if self.ingest_mode not in self.INGEST_MODES:
+            raise ValueError(f"PDF_INGEST_MODE must be one of {sorted(self.INGEST_MODES)}")
+
+        # S3-compatible endpoint (MinIO, a local test server); objects are then addressed path-style
+        self.s3_endpoint_url = os.getenv("AWS_ENDPOINT_URL_S3") or None
+        self.s3_client = context.s3_client
 
-        mongo_client = get_mongo_client()
-        self.db = mongo_client["bookTestMaker"]
+        self.db = context.db
         self.books_collection = self.db["books"]
         self.chapter_collection = self.db["chapters"]
         self.subchapter_collection = self.db["subchapters"]
+        self.embedding_collection = self.db["chunkEmbeddings"]
+        # Cloned embeddings are only reusable when made by the same model
+        self.embed_model_name = os.getenv("MISTRAL_EMBED_NAME")
 
     def create_chapter_structure(
         self,
-        pdf_path: str,
+        pdf: str | fitz.Document,
         book_title: str,
         max_level: int = 2,
     ) -> List[Dict[str, Any]]:
-        """Extract table of contents and build a chapter/subchapter structure."""
+        """Extract table of contents and build a chapter/subchapter structure.
+
+        pdf is either a path or an already open document, which is left open.
+        """
         print("Extracting TOC...")
-        doc = fitz.open(pdf_path)
+        doc = fitz.open(pdf) if isinstance(pdf, str) else pdf
         toc = doc.get_toc()
         page_count = doc.page_count
 
@@ -68,11 +113,8 @@ class PDFProcessor:
         current_chapter: Dict[str, Any] | None = None
         parent_invalid = False
 
-        total_toc_entries = len(toc)
-        for idx, (level, title, start_page) in enumerate(toc, start=1):
+        for level, title, start_page in toc:
             if level > max_level or not title:
-                # Still report progress over total TOC entries
-                print(f"{idx} / {total_toc_entries}", end="\r")
                 continue
 
             title_lower = title.lower().strip()
@@ -88,7 +130,6 @@ class PDFProcessor:
                 parent_invalid = any(term in title_lower for term in self.EXCLUDE_TERMS)
                 if parent_invalid:
                     current_chapter = None
-                    print(f"{idx} / {total_toc_entries}", end="\r")
                     continue
 
                 current_chapter = {
@@ -100,14 +141,12 @@ class PDFProcessor:
                 chapters.append(current_chapter)
             elif level == 2:
                 if parent_invalid or current_chapter is None:
-                    print(f"{idx} / {total_toc_entries}", end="\r")
                     continue
                 if any(term in title_lower for term in self.EXCLUDE_TERMS):
                     if current_chapter["subchapters"]:
                         last_sub = current_chapter["subchapters"][-1]
                         if last_sub["end_page"] is None:
                             last_sub["end_page"] = max(last_sub["start_page"], start_page)
-                    print(f"{idx} / {total_toc_entries}", end="\r")
                     continue
 
                 if current_chapter["subchapters"]:
@@ -123,9 +162,6 @@ class PDFProcessor:
                     }
                 )
 
-            # Progress update for each processed TOC entry
-            print(f"{idx} / {total_toc_entries}", end="\r")
-
         # Finalize end pages
         for chapter in chapters:
             if chapter["end_page"] is None:
@@ -153,17 +189,42 @@ class PDFProcessor:
                 if last_sub["end_page"] is None:
                     last_sub["end_page"] = chapter["end_page"]
 
-        doc.close()
-        if total_toc_entries:
-            print()  # newline after carriage return updates
+        if doc is not pdf:
+            doc.close()
         print(f"TOC extraction complete. Total chapters: {len(chapters)}")
         return chapters
 
     def upload_to_s3(self, file_path: str, object_name: str) -> str:
         """Upload a local file to S3 and return its public URL."""
-        self.s3_client.upload_file(file_path, self.bucket_name, object_name)
+        with span("s3_upload", key=object_name):
+            self.s3_client.upload_file(file_path, self.bucket_name, object_name)
+        return self.object_url(object_name)
+
+    def upload_bytes_to_s3(self, data: bytes, object_name: str) -> str:
+        """Upload an in-memory PDF to S3 and return its public URL."""
+        with span("s3_upload", key=object_name, bytes=len(data)):
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=object_name,
+                Body=data,
+                ContentType="application/pdf",
+            )
+        return self.object_url(object_name)
+
+    def object_url(self, object_name: str) -> str:
+        """Return the public URL of object_name in the bucket."""
+        if self.s3_endpoint_url:
+            return f"{self.s3_endpoint_url.rstrip('/')}/{self.bucket_name}/{object_name}"
         return f"https://{self.bucket_name}.s3.amazonaws.com/{object_name}"
 
+    def _parse_object_url(self, url: str) -> tuple[str, str]:
+        """Split an object URL produced by object_url into (bucket, key)."""
+        parsed = urlparse(url)
+        if self.s3_endpoint_url and url.startswith(self.s3_endpoint_url.rstrip("/") + "/"):
+            bucket, _, key = parsed.path.lstrip("/").partition("/")
+            return bucket, key
+        return parsed.netloc.split(".s3", 1)[0], parsed.path.lstrip("/")
+
     @staticmethod
     def _sanitize_filename(filename: str) -> str:
         """Remove characters that are invalid for filenames."""
@@ -177,23 +238,25 @@ class PDFProcessor:
         book_id: ObjectId,
         book_title: str,
         chapters: List[Dict[str, Any]],
-        pdf_path: str,
+        pdf: str | fitz.Document,
     ) -> tuple[list[ObjectId], list[ObjectId]]:
-        """Split the source PDF into subchapters and upload artefacts to S3/MongoDB."""
+        """Split the source PDF into subchapters and upload artefacts to S3/MongoDB.
+
+        pdf is either a path or the document already opened for TOC extraction,
+        which is left open. Subchapter PDFs are built and uploaded in memory.
+        """
         chapter_ids: list[ObjectId] = []
         subchapter_ids: list[ObjectId] = []
 
         total_chapters = len(chapters)
         total_subchapters = sum(len(ch["subchapters"]) for ch in chapters)
-        # We'll count MongoDB operations: chapter inserts + subchapter inserts + chapter updates
-        subchapter_count = 0
 
         if total_subchapters > 0:
             print("Uploading to S3 and MongoDB...")
         
-        with open(pdf_path, "rb") as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            with tempfile.TemporaryDirectory() as working_dir:
+        source = fitz.open(pdf) if isinstance(pdf, str) else pdf
+        try:
+            with progress("split", total_subchapters) as advance:
                 for chapter in chapters:
                     chapter_doc = {
                         "bookID": book_id,
@@ -208,25 +271,12 @@ class PDFProcessor:
 
                     chapter_sub_ids: list[ObjectId] = []
                     for idx, sub in enumerate(chapter["subchapters"], start=1):
-                        writer = PyPDF2.PdfWriter()
-                        start_index = max(sub["start_page"] - 1, 0)
-                        end_index = min(sub["end_page"], len(reader.pages))
-
-                        for page_index in range(start_index, end_index):
-                            writer.add_page(reader.pages[page_index])
-
-                        safe_chapter = self._sanitize_filename(chapter["title"])
-                        safe_sub = self._sanitize_filename(sub["title"])
-                        filename = f"{safe_chapter}_{safe_sub}.pdf"
-                        local_path = os.path.join(working_dir, filename)
-
-                        with open(local_path, "wb") as output_pdf:
-                            writer.write(output_pdf)
+                        pdf_bytes = self._extract_pages(source, sub["start_page"], sub["end_page"])
 
                         # Pre-generate a stable subchapter ObjectId so the S3 key can include it
                         sub_id = ObjectId()
                         object_name = f"books/{book_id}/subchapters/{idx:03d}-{sub_id}.pdf"
-                        s3_link = self.upload_to_s3(local_path, object_name)
+                        s3_link = self.upload_bytes_to_s3(pdf_bytes, object_name)
 
                         sub_doc = {
                             "bookID": book_id,
@@ -237,37 +287,308 @@ class PDFProcessor:
                             "s3Link": s3_link,
                         }
                         # insert with pre-generated _id for consistency with S3 key
-                        sub_result = self.subchapter_collection.insert_one({"_id": sub_id, **sub_doc})
+                        self.subchapter_collection.insert_one({"_id": sub_id, **sub_doc})
 
                         subchapter_ids.append(sub_id)
                         chapter_sub_ids.append(sub_id)
-
-                        subchapter_count += 1
-                        if total_subchapters:
-                            print(f"{subchapter_count} / {total_subchapters}", end="\r")
+                        advance()
 
                     self.chapter_collection.update_one(
                         {"_id": chapter_id},
                         {"$set": {"subchapterIds": chapter_sub_ids}},
                     )
+        finally:
+            if source is not pdf:
+                source.close()
 
-        # Finish lines for progress sections
         if total_subchapters:
-            print() 
             print("Uploads complete")
 
         return chapter_ids, subchapter_ids
 
+    @staticmethod
+    def _extract_pages(source: fitz.Document, start_page: int, end_page: int) -> bytes:
+        """Copy 1-based pages start_page..end_page of source into a new PDF and return its bytes.
+
+        A range with no pages in the source (end_page before start_page, or
+        past the last page) yields a PDF without pages.
+        """
+        start_index = max(start_page - 1, 0)
+        end_index = min(end_page, source.page_count) - 1
+
+        with stage_timer("extract"):
+            if end_index < start_index:
+                # PyMuPDF refuses to save a document with zero pages
+                buffer = BytesIO()
+                PyPDF2.PdfWriter().write(buffer)
+                return buffer.getvalue()
+
+            part = fitz.open()
+            try:
+                part.insert_pdf(source, from_page=start_index, to_page=end_index)
+                return part.tobytes(garbage=3, deflate=True)
+            finally:
+                part.close()
+
+    def _open_source_pdf(self, pdf_s3_url: str) -> tuple[fitz.Document, Optional[str], str]:
+        """Download the source PDF and open it once for TOC extraction and splitting.
+
+        In "memory" mode (PDF_INGEST_MODE) the PDF is downloaded into a buffer
+        and opened from it; in "file" mode it is downloaded to a temporary file
+        that MuPDF reads on demand, which suits books too large to hold in memory.
+
+        Returns:
+            Tuple of (open document, temporary file path or None, SHA-256 of the file)
+        """
+        if self.ingest_mode == "memory":
+            data = download_bytes(pdf_s3_url)
+            return fitz.open(stream=data, filetype="pdf"), None, hashlib.sha256(data).hexdigest()
+
+        tmp_path = self._download_pdf(pdf_s3_url)
+        try:
+            digest = hashlib.sha256()
+            with open(tmp_path, "rb") as pdf_file:
+                for block in iter(lambda: pdf_file.read(1024 * 1024), b""):
+                    digest.update(block)
+            return fitz.open(tmp_path), tmp_path, digest.hexdigest()
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _content_fingerprint(doc: fitz.Document, file_sha256: str) -> Dict[str, Any]:
+        """Fingerprint a PDF by its bytes, the content of each page and its outline.
+
+        Page hashes cover the page's content stream, the streams of the Form
+        XObjects it draws (nested ones included, since a page may be nothing
+        but "/fzFrm0 Do") and the raw, still encoded streams of its images and
+        their soft masks, so re-saved copies of a book that differ only in
+        metadata still share pagesSha256 without decoding any image. Chapters
+        are split along the outline, so tocSha256 must match as well before a
+        book's content is reused.
+        """
+        page_hashes: List[str] = []
+        for page in doc:
+            digest = hashlib.sha256(page.read_contents())
+            for xref, name, _invoker, _bbox in page.get_xobjects():
+                digest.update(name.encode("utf-8", "surrogatepass"))
+                digest.update(doc.xref_stream(xref) or b"")
+            for xref, smask, *_rest in page.get_images(full=True):
+                digest.update(doc.xref_stream_raw(xref) or b"")
+                if smask:
+                    digest.update(doc.xref_stream_raw(smask) or b"")
+            page_hashes.append(digest.hexdigest())
+
+        toc = json.dumps(doc.get_toc(simple=True), ensure_ascii=False)
+        return {
+            "sha256": file_sha256,
+            "pageCount": doc.page_count,
+            "pageHashes": page_hashes,
+            "pagesSha256": hashlib.sha256("".join(page_hashes).encode("ascii")).hexdigest(),
+            "tocSha256": hashlib.sha256(toc.encode("utf-8", "surrogatepass")).hexdigest(),
+        }
+
+    def _find_ingested_duplicate(
+        self,
+        fingerprint: Dict[str, Any],
+        book_id: ObjectId,
+    ) -> Optional[Dict[str, Any]]:
+        """Return another fully ingested book with the same content and embedding settings, if any."""
+        _ensure_fingerprint_indexes(self.books_collection)
+        return self.books_collection.find_one(
+            {
+                "_id": {"$ne": book_id},
+                "state": "finished",
+                "subchapterIds.0": {"$exists": True},
+                "contentFingerprint.useOcr": fingerprint["useOcr"],
+                "contentFingerprint.embedModel": fingerprint["embedModel"],
+                "$or": [
+                    {"contentFingerprint.sha256": fingerprint["sha256"]},
+                    {
+                        "contentFingerprint.pageCount": fingerprint["pageCount"],
+                        "contentFingerprint.pagesSha256": fingerprint["pagesSha256"],
+                        "contentFingerprint.tocSha256": fingerprint["tocSha256"],
+                    },
+                ],
+            },
+            {"contentFingerprint.pageHashes": 0},
+        )
+
+    def _copy_s3_object(self, s3_link: str, object_name: str) -> str:
+        """Copy an uploaded PDF to object_name within S3 and return the new public URL."""
+        source_bucket, source_key = self._parse_object_url(s3_link)
+        with span("s3_copy", key=object_name):
+            self.s3_client.copy_object(
+                Bucket=self.bucket_name,
+                Key=object_name,
+                CopySource={"Bucket": source_bucket, "Key": source_key},
+            )
+        return self.object_url(object_name)
+
+    def clone_book_content(
+        self,
+        source_book: Dict[str, Any],
+        book_id: ObjectId,
+    ) -> tuple[list[ObjectId], list[ObjectId]]:
+        """Copy chapters, subchapters and chunk embeddings of an ingested book to book_id.
+
+        Subchapter PDFs are copied within S3 under the new book's prefix, so
+        deleting either book leaves the other intact. No PDF parsing or
+        embedding calls are made.
+        """
+        source_id = source_book["_id"]
+        print(f"Cloning content of book {source_id}...")
+
+        chapter_order = {cid: i for i, cid in enumerate(source_book.get("chapterIds", []))}
+        source_chapters = sorted(
+            self.chapter_collection.find({"_id": {"$in": list(chapter_order)}}),
+            key=lambda doc: chapter_order[doc["_id"]],
+        )
+        source_subs = {
+            doc["_id"]: doc
+            for doc in self.subchapter_collection.find({"bookID": source_id})
+        }
+
+        chapter_map: Dict[ObjectId, ObjectId] = {}
+        sub_map: Dict[ObjectId, ObjectId] = {}
+        chapter_docs: List[Dict[str, Any]] = []
+        sub_docs: List[Dict[str, Any]] = []
+        copies: List[tuple[str, str]] = []
+
+        for chapter in source_chapters:
+            chapter_id = ObjectId()
+            chapter_map[chapter["_id"]] = chapter_id
+            chapter_sub_ids: list[ObjectId] = []
+
+            subs = [source_subs[sid] for sid in chapter.get("subchapterIds", []) if sid in source_subs]
+            for idx, sub in enumerate(subs, start=1):
+                sub_id = ObjectId()
+                sub_map[sub["_id"]] = sub_id
+                chapter_sub_ids.append(sub_id)
+
+                object_name = f"books/{book_id}/subchapters/{idx:03d}-{sub_id}.pdf"
+                copies.append((sub["s3Link"], object_name))
+                sub_docs.append(
+                    {
+                        "_id": sub_id,
+                        "bookID": book_id,
+                        "chapterID": chapter_id,
+                        "subchapterTitle": sub.get("subchapterTitle"),
+                        "pageStart": sub.get("pageStart"),
+                        "pageEnd": sub.get("pageEnd"),
+                        "s3Link": self.object_url(object_name),
+                    }
+                )
+
+            chapter_docs.append(
+                {
+                    "_id": chapter_id,
+                    "bookID": book_id,
+                    "chapterTitle": chapter.get("chapterTitle"),
+                    "subchapterIds": chapter_sub_ids,
+                    "pageStart": chapter.get("pageStart"),
+                    "pageEnd": chapter.get("pageEnd"),
+                }
+            )
+
+        with ThreadPoolExecutor(max_workers=self.CLONE_WORKERS) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._copy_s3_object, *copy)
+                for copy in copies
+            ]
+            for future in futures:
+                future.result()
+
+        if chapter_docs:
+            self.chapter_collection.insert_many(chapter_docs)
+        if sub_docs:
+            self.subchapter_collection.insert_many(sub_docs)
+
+        cloned_embeddings = 0
+        batch: List[Dict[str, Any]] = []
+        for doc in self.embedding_collection.find({"bookID": source_id}, {"_id": 0}):
+            if doc.get("subchapterID") not in sub_map:
+                continue
+            doc["bookID"] = book_id
+            doc["chapterID"] = chapter_map.get(doc.get("chapterID"), doc.get("chapterID"))
+            doc["subchapterID"] = sub_map[doc["subchapterID"]]
+            batch.append(doc)
+            if len(batch) >= self.EMBEDDING_CLONE_BATCH:
+                self.embedding_collection.insert_many(batch)
+                cloned_embeddings += len(batch)
+                batch = []
+        if batch:
+            self.embedding_collection.insert_many(batch)
+            cloned_embeddings += len(batch)
+        if cloned_embeddings:
+            mark_embeddings_updated(self.books_collection, book_id)
+
+        print(
+            f"Cloned {len(chapter_docs)} chapters, {len(sub_docs)} subchapters "
+            f"and {cloned_embeddings} embeddings"
+        )
+        chapter_ids = [doc["_id"] for doc in chapter_docs]
+        subchapter_ids = [sub_map[sid] for sid in source_book.get("subchapterIds", []) if sid in sub_map]
+        return chapter_ids, subchapter_ids
+
+    def _ingest(
+        self,
+        source: fitz.Document,
+        file_sha256: str,
+        book_id: ObjectId,
+        book_title: str,
+        use_ocr: bool,
+    ) -> Dict[str, str]:
+        """Split and upload a book, or clone an already ingested copy of the same PDF.
+
+        Only a copy whose embeddings were made the same way (use_ocr and
+        embedding model) is cloned.
+        """
+        with span("fingerprint", pages=source.page_count):
+            fingerprint = {
+                **self._content_fingerprint(source, file_sha256),
+                "useOcr": use_ocr,
+                "embedModel": self.embed_model_name,
+            }
+            self.books_collection.update_one(
+                {"_id": book_id}, {"$set": {"contentFingerprint": fingerprint}}
+            )
+            duplicate = self._find_ingested_duplicate(fingerprint, book_id)
+
+        if duplicate:
+            with span("clone_book_content", source_book_id=str(duplicate["_id"])):
+                chapter_ids, subchapter_ids = self.clone_book_content(duplicate, book_id)
+        else:
+            with span("create_chapter_structure"):
+                chapters = self.create_chapter_structure(source, book_title)
+            with span("split_and_upload_subchapters", chapters=len(chapters)):
+                chapter_ids, subchapter_ids = self.split_and_upload_subchapters(
+                    book_id=book_id,
+                    book_title=book_title,
+                    chapters=chapters,
+                    pdf=source,
+                )
+
+        self.books_collection.update_one(
+            {"_id": book_id},
+            {"$set": {"chapterIds": chapter_ids, "subchapterIds": subchapter_ids}},
+        )
+
+        result = {"book_id": str(book_id), "book_title": book_title}
+        if duplicate:
+            result["duplicate_of"] = str(duplicate["_id"])
+        return result
+
     @staticmethod
     def _download_pdf(pdf_s3_url: str) -> str:
         """Download the PDF from S3 to a temporary path."""
-        response = requests.get(pdf_s3_url, stream=True, timeout=60)
-        response.raise_for_status()
-
         fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
-        with os.fdopen(fd, "wb") as tmp_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                tmp_file.write(chunk)
+        os.close(fd)
+        try:
+            download_to_file(pdf_s3_url, tmp_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
         return tmp_path
 
     def process_book(
@@ -276,8 +597,14 @@ class PDFProcessor:
         pdf_s3_url: str,
         visibility: str,
         uploader: ObjectId,
+        use_ocr: bool = False,
     ) -> Dict[str, str]:
-        """Run the PDF ingestion pipeline for a user-uploaded book."""
+        """Run the PDF ingestion pipeline for a user-uploaded book.
+
+        The result contains duplicate_of when the content was cloned from an
+        already ingested copy of the same PDF, including its embeddings;
+        use_ocr is how the book will be embedded otherwise.
+        """
         if not pdf_s3_url:
             raise ValueError("pdf_s3_url must be provided")
         if not book_title:
@@ -290,42 +617,34 @@ class PDFProcessor:
             raise ValueError("visibility must be 'Public' or 'Private'")
         visibility_value = normalized_visibility.capitalize()
 
-        tmp_file_path = self._download_pdf(pdf_s3_url)
-        try:
-            chapters = self.create_chapter_structure(tmp_file_path, book_title)
-
-            book_doc = {
-                "bookTitle": book_title,
-                "subchapterIds": [],
-                "chapterIds": [],
-                "visibility": visibility_value,
-                "uploader": uploader,
-                "s3Link": pdf_s3_url,
-            }
-            book_result = self.books_collection.insert_one(book_doc)
-            book_id = book_result.inserted_id
-
-            chapter_ids, subchapter_ids = self.split_and_upload_subchapters(
-                book_id=book_id,
-                book_title=book_title,
-                chapters=chapters,
-                pdf_path=tmp_file_path,
-            )
-
-            self.books_collection.update_one(
-                {"_id": book_id},
-                {"$set": {"chapterIds": chapter_ids, "subchapterIds": subchapter_ids}},
-            )
-
-            return {"book_id": str(book_id), "book_title": book_title}
-        finally:
-            if tmp_file_path and os.path.exists(tmp_file_path):
-                os.remove(tmp_file_path)
-
-    def process_existing_book(self, book_id: ObjectId) -> Dict[str, str]:
+        with span("process_book", ingest_mode=self.ingest_mode) as root:
+            with span("open_source_pdf"):
+                source, tmp_file_path, file_sha256 = self._open_source_pdf(pdf_s3_url)
+            try:
+                book_doc = {
+                    "bookTitle": book_title,
+                    "subchapterIds": [],
+                    "chapterIds": [],
+                    "visibility": visibility_value,
+                    "uploader": uploader,
+                    "s3Link": pdf_s3_url,
+                }
+                book_result = self.books_collection.insert_one(book_doc)
+                if root is not None:
+                    root.set_attribute("book_id", str(book_result.inserted_id))
+                return self._ingest(source, file_sha256, book_result.inserted_id, book_title, use_ocr)
+            finally:
+                source.close()
+                if tmp_file_path and os.path.exists(tmp_file_path):
+                    os.remove(tmp_file_path)
+
+    def process_existing_book(self, book_id: ObjectId, use_ocr: bool = False) -> Dict[str, str]:
         """Process an existing book document: split into chapters/subchapters and update references.
 
         Expects the book doc to already contain: bookTitle, s3Link, visibility, uploader.
+        The result contains duplicate_of when the content was cloned from an
+        already ingested copy of the same PDF, including its embeddings;
+        use_ocr is how the book will be embedded otherwise.
         """
         if not isinstance(book_id, ObjectId):
             raise TypeError("book_id must be a valid ObjectId")
@@ -339,26 +658,15 @@ class PDFProcessor:
         if not book_title or not pdf_s3_url:
             raise ValueError("Existing book is missing title or s3Link")
 
-        tmp_file_path = self._download_pdf(pdf_s3_url)
-        try:
-            chapters = self.create_chapter_structure(tmp_file_path, book_title)
-
-            chapter_ids, subchapter_ids = self.split_and_upload_subchapters(
-                book_id=book_id,
-                book_title=book_title,
-                chapters=chapters,
-                pdf_path=tmp_file_path,
-            )
-
-            self.books_collection.update_one(
-                {"_id": book_id},
-                {"$set": {"chapterIds": chapter_ids, "subchapterIds": subchapter_ids}},
-            )
-
-            return {"book_id": str(book_id), "book_title": book_title}
-        finally:
-            if tmp_file_path and os.path.exists(tmp_file_path):
-                os.remove(tmp_file_path)
+        with span("process_existing_book", book_id=str(book_id), ingest_mode=self.ingest_mode):
+            with span("open_source_pdf"):
+                source, tmp_file_path, file_sha256 = self._open_source_pdf(pdf_s3_url)
+            try:
+                return self._ingest(source, file_sha256, book_id, book_title, use_ocr)
+            finally:
+                source.close()
+                if tmp_file_path and os.path.exists(tmp_file_path):
+                    os.remove(tmp_file_path)
 
 
 if __name__ == "__main__":
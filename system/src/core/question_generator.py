@@ -4,18 +4,19 @@ import json
 from typing import Dict, List, Optional
 
 import numpy as np
-import requests
 from bson import ObjectId
 from bson.errors import InvalidId
-from dotenv import load_dotenv
 from io import BytesIO
 from PyPDF2 import PdfReader
 
-from ..models.ai_models import MistralEmbed, MistralModel, MistralSmall
+from ..utils.metrics import stage_timer
 from ..utils.timing import function_timer
-from ..utils.database_funcs import get_mongo_client
+from ..utils.vector_search import VectorSearchConfig
+from ..utils.http_client import download_many
+from ..utils.env import load_env
+from .app_context import AppContext, get_app_context
 
-load_dotenv()
+load_env()
 
 
 class QuestionGenerator:
@@ -34,24 +35,26 @@ class QuestionGenerator:
         rag_depth: int = DEFAULT_RAG_DEPTH,
         questions_per_chapter: int = DEFAULT_QUESTIONS_PER_CHAPTER,
         difficulty_distribution: Optional[Dict[str, int]] = None,
+        context: Optional[AppContext] = None,
     ):
+        context = context or get_app_context()
         self.rag_depth = rag_depth
         self.questions_per_chapter = questions_per_chapter
         self.difficulty_distribution = (
             difficulty_distribution or self.DEFAULT_DIFFICULTY_DISTRIBUTION
         )
 
-        mongo_client = get_mongo_client()
-        self.db = mongo_client["bookTestMaker"]
+        self.db = context.db
         self.subchapter_collection = self.db["subchapters"]
         self.chapter_collection = self.db["chapters"]
         self.question_collection = self.db["questions"]
         self.books_collection = self.db["books"]
         self.chunk_embedding_collection = self.db["chunkEmbeddings"]
+        self.vector_search = VectorSearchConfig.from_env()
 
-        self.embed_model = MistralEmbed()
-        self.generation_model = MistralModel()
-        self.evaluation_model = MistralSmall()
+        self.embed_model = context.embed_model
+        self.generation_model = context.generation_model
+        self.evaluation_model = context.evaluation_model
 
     @staticmethod
     def _ensure_object_id(value: ObjectId | str) -> ObjectId:
@@ -100,15 +103,15 @@ class QuestionGenerator:
         subchapters: List[Dict] = []
         print("Getting subchapters...")
 
-        for sub_doc in sub_docs:
-            pdf_url = sub_doc.get("s3Link")
-            if not pdf_url:
-                raise ValueError("Subchapter missing s3Link")
+        if any(not sub_doc.get("s3Link") for sub_doc in sub_docs):
+            raise ValueError("Subchapter missing s3Link")
 
-            response = requests.get(pdf_url, timeout=60)
-            response.raise_for_status()
-            reader = PdfReader(BytesIO(response.content))
-            text = "".join(page.extract_text() or "" for page in reader.pages)
+        # Later PDFs download while earlier ones are parsed
+        pdf_contents = download_many([sub_doc["s3Link"] for sub_doc in sub_docs])
+        for sub_doc, content in zip(sub_docs, pdf_contents):
+            with stage_timer("extract"):
+                reader = PdfReader(BytesIO(content))
+                text = "".join(page.extract_text() or "" for page in reader.pages)
 
             chapter_id = sub_doc.get("chapterID")
             chapter_title = ""
@@ -155,23 +158,15 @@ class QuestionGenerator:
         try:
             query_embedding = self.embed_input(subchapter_text)
             pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",
-                        "queryVector": query_embedding,
-                        "path": "embedding",
-                        "filter": {
-                            "bookID": book_id,
-                            "subchapterID": {"$ne": subchapter_id},
-                        },
-                        "exact": True,
-                        "limit": self.rag_depth,
-                    }
-                },
+                self.vector_search.stage(
+                    query_embedding,
+                    self.rag_depth,
+                    filter={"bookID": book_id, "subchapterID": {"$ne": subchapter_id}},
+                ),
                 {"$project": {"_id": 0, "text": 1, "subchapterTitle": 1}},
             ]
-            results = self.chunk_embedding_collection.aggregate(pipeline)
-            return list(results)
+            with stage_timer("vector_search"):
+                return list(self.chunk_embedding_collection.aggregate(pipeline))
         except Exception as exc:  # noqa: BLE001
             print(f"Error retrieving context: {exc}")
             return []
@@ -238,6 +233,7 @@ class QuestionGenerator:
             questions[index]["confidence"] = score
         return questions
 
+    @stage_timer("insert")
     def insert_questions(self, questions: List[Dict], subchapter: Dict) -> None:
         """Insert generated questions into MongoDB."""
         for question in questions:
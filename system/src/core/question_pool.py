@@ -0,0 +1,284 @@
+"""Pregenerated question pool with background top-up.
+
+Questions generated ahead of time are stored in the regular questions
+collection with ``source: "pregenerated"`` and ``poolState: "available"``.
+Serving a request claims them atomically (``poolState: "claimed"``) so no two
+requests receive the same pooled question.
+
+Every server process may run a QuestionPoolScheduler; a lease in MongoDB
+makes sure only one of them, across workers and hosts, tops up at a time.
+"""
+
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
+
+
+class QuestionPool:
+    """Tracks and serves the inventory of unused questions per (subchapter, difficulty)."""
+
+    DIFFICULTIES = ("easy", "medium", "hard")
+    DEFAULT_TARGET_PER_DIFFICULTY = 10
+    AVAILABLE = "available"
+    CLAIMED = "claimed"
+
+    def __init__(
+        self,
+        question_collection: Collection,
+        demand_collection: Collection,
+        target_per_difficulty: int = DEFAULT_TARGET_PER_DIFFICULTY,
+    ):
+        self.question_collection = question_collection
+        self.demand_collection = demand_collection
+        self.target_per_difficulty = target_per_difficulty
+
+    def ensure_indexes(self) -> None:
+        """Create the indexes used by claims and top-up scans."""
+        self.question_collection.create_index(
+            [("subchapterID", ASCENDING), ("difficulty", ASCENDING), ("poolState", ASCENDING)],
+            name="question_pool_lookup",
+        )
+        self.demand_collection.create_index(
+            [("requests", DESCENDING)], name="question_pool_demand"
+        )
+
+    def claim(
+        self,
+        subchapter_id: ObjectId,
+        difficulty: str,
+        count: int,
+        exclude_hashes: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Claim up to count available questions and return their IDs."""
+        claimed: List[str] = []
+        query: Dict[str, Any] = {
+            "subchapterID": subchapter_id,
+            "difficulty": difficulty,
+            "poolState": self.AVAILABLE,
+        }
+        if exclude_hashes:
+            query["contentHash"] = {"$nin": exclude_hashes}
+
+        for _ in range(count):
+            doc = self.question_collection.find_one_and_update(
+                query,
+                {"$set": {"poolState": self.CLAIMED, "claimedAt": datetime.utcnow()}},
+                projection={"_id": 1},
+                sort=[("createdAt", ASCENDING)],
+            )
+            if not doc:
+                break
+            claimed.append(str(doc["_id"]))
+        return claimed
+
+    def record_demand(self, subchapter_request: Dict[str, Any], subchapter_id: ObjectId) -> None:
+        """Remember that a subchapter was requested so top-up can prioritise it."""
+        self.demand_collection.update_one(
+            {"_id": subchapter_id},
+            {
+                "$inc": {"requests": 1},
+                "$set": {
+                    "bookID": subchapter_request.get("book_id", ""),
+                    "chapterID": subchapter_request.get("chapter_id", ""),
+                    "subchapterTitle": subchapter_request.get("subchapter_title", ""),
+                    "bookTitle": subchapter_request.get("book_title", ""),
+                    "chapterTitle": subchapter_request.get("chapter_title", ""),
+                    "lastRequestedAt": datetime.utcnow(),
+                },
+            },
+            upsert=True,
+        )
+
+    def inventory(self, subchapter_id: ObjectId) -> Dict[str, int]:
+        """Return the number of available questions per difficulty."""
+        counts = {difficulty: 0 for difficulty in self.DIFFICULTIES}
+        pipeline = [
+            {"$match": {"subchapterID": subchapter_id, "poolState": self.AVAILABLE}},
+            {"$group": {"_id": "$difficulty", "count": {"$sum": 1}}},
+        ]
+        for row in self.question_collection.aggregate(pipeline):
+            if row["_id"] in counts:
+                counts[row["_id"]] = row["count"]
+        return counts
+
+    def shortfall(self, subchapter_id: ObjectId) -> Dict[str, int]:
+        """Return how many questions per difficulty are missing to reach the target."""
+        inventory = self.inventory(subchapter_id)
+        return {
+            difficulty: max(self.target_per_difficulty - count, 0)
+            for difficulty, count in inventory.items()
+        }
+
+    def top_up(self, generator: Any, max_subchapters: int = 20) -> Dict[str, int]:
+        """Generate questions for the most requested subchapters that are below target.
+
+        Args:
+            generator: NewQuestionGenerator used to produce the questions
+            max_subchapters: Maximum number of subchapters to top up in this run
+
+        Returns:
+            Dict with the number of subchapters topped up and questions generated
+        """
+        topped_up = 0
+        generated = 0
+        demand = self.demand_collection.find().sort("requests", DESCENDING)
+
+        for entry in demand:
+            if topped_up >= max_subchapters:
+                break
+
+            missing = self.shortfall(entry["_id"])
+            if not sum(missing.values()):
+                continue
+
+            result = generator.generate_for_subchapter(
+                {
+                    "subchapter_id": str(entry["_id"]),
+                    "book_id": entry.get("bookID", ""),
+                    "chapter_id": entry.get("chapterID", ""),
+                    "subchapter_title": entry.get("subchapterTitle", ""),
+                    "book_title": entry.get("bookTitle", ""),
+                    "chapter_title": entry.get("chapterTitle", ""),
+                    "questions_to_generate": sum(missing.values()),
+                    "difficulty_distribution": missing,
+                    "exclude_hashes": [],
+                },
+                source="pregenerated",
+            )
+            if result.get("error"):
+                print(f"Question pool top-up failed for {entry['_id']}: {result['error']['message']}")
+            topped_up += 1
+            generated += len(result.get("generated_question_ids", []))
+
+        return {"subchapters": topped_up, "questions": generated}
+
+
+class QuestionPoolScheduler:
+    """Periodically tops up the question pool during off-peak hours.
+
+    Before each pass the scheduler takes or renews the "questionPool" lease in
+    the schedulerLeases collection, valid for two intervals. Schedulers in
+    other processes skip their pass while it is held, and take over once the
+    holder has stopped renewing it.
+    """
+
+    LEASE_COLLECTION = "schedulerLeases"
+    LEASE_ID = "questionPool"
+    DEFAULT_INTERVAL_SECONDS = 600
+    DEFAULT_OFFPEAK_START_HOUR = 1
+    DEFAULT_OFFPEAK_END_HOUR = 6
+
+    def __init__(
+        self,
+        interval_seconds: int = DEFAULT_INTERVAL_SECONDS,
+        offpeak_start_hour: int = DEFAULT_OFFPEAK_START_HOUR,
+        offpeak_end_hour: int = DEFAULT_OFFPEAK_END_HOUR,
+        max_subchapters_per_run: int = 20,
+    ):
+        self.interval_seconds = interval_seconds
+        self.offpeak_start_hour = offpeak_start_hour
+        self.offpeak_end_hour = offpeak_end_hour
+        self.max_subchapters_per_run = max_subchapters_per_run
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "QuestionPoolScheduler":
+        """Build a scheduler from QUESTION_POOL_* environment variables."""
+        return cls(
+            interval_seconds=int(
+                os.getenv("QUESTION_POOL_INTERVAL_SECONDS", cls.DEFAULT_INTERVAL_SECONDS)
+            ),
+            offpeak_start_hour=int(
+                os.getenv("QUESTION_POOL_OFFPEAK_START", cls.DEFAULT_OFFPEAK_START_HOUR)
+            ),
+            offpeak_end_hour=int(
+                os.getenv("QUESTION_POOL_OFFPEAK_END", cls.DEFAULT_OFFPEAK_END_HOUR)
+            ),
+        )
+
+    def is_offpeak(self, now: Optional[datetime] = None) -> bool:
+        """Return True when the (UTC) hour falls inside the off-peak window."""
+        hour = (now or datetime.utcnow()).hour
+        if self.offpeak_start_hour <= self.offpeak_end_hour:
+            return self.offpeak_start_hour <= hour < self.offpeak_end_hour
+        # Window wraps around midnight, e.g. 22-5
+        return hour >= self.offpeak_start_hour or hour < self.offpeak_end_hour
+
+    def acquire_lease(self) -> bool:
+        """
+        Take the top-up lease, or renew it when this process already holds it.
+
+        Returns:
+            True when this process may run a top-up pass
+        """
+        # Imported here to avoid a circular import with new_question_generation
+        from .app_context import get_app_context
+
+        now = datetime.utcnow()
+        holder = f"{socket.gethostname()}:{os.getpid()}"
+        try:
+            # No match means another live holder; the upsert then collides on _id
+            get_app_context().db[self.LEASE_COLLECTION].update_one(
+                {"_id": self.LEASE_ID, "$or": [{"holder": holder}, {"expiresAt": {"$lte": now}}]},
+                {
+                    "$set": {
+                        "holder": holder,
+                        "expiresAt": now + timedelta(seconds=2 * self.interval_seconds),
+                    }
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def run_once(self) -> Dict[str, int]:
+        """Run a single top-up pass."""
+        # Imported here to avoid a circular import with new_question_generation
+        from .new_question_generation import NewQuestionGenerator
+
+        generator = NewQuestionGenerator(use_pool=True)
+        generator.question_pool.ensure_indexes()
+        stats = generator.question_pool.top_up(generator, self.max_subchapters_per_run)
+        print(
+            f"Question pool top-up: {stats['questions']} questions "
+            f"across {stats['subchapters']} subchapters"
+        )
+        return stats
+
+    def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            if self.is_offpeak():
+                try:
+                    if self.acquire_lease():
+                        self.run_once()
+                except Exception as exc:
+                    print(f"Question pool top-up failed: {exc}")
+            self._stop_event.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start the background top-up thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="question-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background top-up thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def pool_enabled() -> bool:
+    """Return True when QUESTION_POOL_ENABLED is set to a truthy value."""
+    return os.getenv("QUESTION_POOL_ENABLED", "").strip().lower() in {"1", "true", "yes"}
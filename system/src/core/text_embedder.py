@@ -1,20 +1,27 @@
 """Text embedding module for creating and storing vector embeddings of textbook content."""
 
-from typing import Dict, List, Tuple
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
 from io import BytesIO
 
-import requests
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
 from PyPDF2 import PdfReader
 from bson import ObjectId
 from bson.errors import InvalidId
-from dotenv import load_dotenv
 
-from ..models.ai_models import MistralEmbed, MistralOCR
+from ..utils.metrics import progress, stage_timer
 from ..utils.timing import function_timer
-from ..utils.tokenizer import Tokenizer
-from ..utils.database_funcs import get_mongo_client
+from ..utils.tracing import span
+from ..utils.usage import record_cache_hit
+from ..utils.embedding_cache import EmbeddingCache, get_embedding_cache
+from ..utils.vector_index import VectorIndexManager
+from .app_context import AppContext, get_app_context
+from .local_retrieval import mark_embeddings_updated, retrieval_backend
+from ..utils.http_client import download_many
+from ..utils.env import load_env
 
-load_dotenv()
+load_env()
 
 
 class TextEmbedder:
@@ -22,25 +29,27 @@ class TextEmbedder:
 
     DEFAULT_CHUNK_SIZE = 3064
     DEFAULT_OVERLAP = 50
+    BULK_WRITE_BATCH = 500
 
     def __init__(
         self,
         max_chunk_size: int = DEFAULT_CHUNK_SIZE,
         overlap: int = DEFAULT_OVERLAP,
+        context: Optional[AppContext] = None,
     ):
         self.max_chunk_size = max_chunk_size
         self.overlap = overlap
+        context = context or get_app_context()
 
-        mongo_client = get_mongo_client()
-        self.db = mongo_client["bookTestMaker"]
+        self.db = context.db
         self.embedding_collection = self.db["chunkEmbeddings"]
         self.subchapter_collection = self.db["subchapters"]
         self.chapter_collection = self.db["chapters"]
         self.books_collection = self.db["books"]
 
-        self.tokenizer = Tokenizer()
-        self.embed_model = MistralEmbed()
-        self.ocr_model = MistralOCR()
+        self.tokenizer = context.tokenizer
+        self.embed_model = context.embed_model
+        self.ocr_model = context.ocr_model
 
     @staticmethod
     def _ensure_object_id(value: ObjectId | str) -> ObjectId:
@@ -51,16 +60,22 @@ class TextEmbedder:
         except (InvalidId, TypeError) as exc:
             raise ValueError("book_id must be a valid ObjectId") from exc
 
+    @staticmethod
+    def hash_chunk(text: str) -> str:
+        """Return the content hash stored as textHash on chunkEmbeddings."""
+        return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
     def chunk_text(self, text: str) -> List[str]:
         """Split text into overlapping chunks."""
         chunks: List[str] = []
         step = self.max_chunk_size - self.overlap
 
-        for i in range(0, len(text), step):
-            chunk = text[i : i + self.max_chunk_size]
-            chunks.append(chunk)
-            if i + self.max_chunk_size >= len(text):
-                break
+        with stage_timer("chunk"):
+            for i in range(0, len(text), step):
+                chunk = text[i : i + self.max_chunk_size]
+                chunks.append(chunk)
+                if i + self.max_chunk_size >= len(text):
+                    break
 
         return chunks
 
@@ -99,50 +114,85 @@ class TextEmbedder:
         metadata: List[Dict[str, ObjectId | str]] = []
 
         print("Creating chunks...")
-        for idx, sub_doc in enumerate(sub_docs, start=1):
-            s3_link = sub_doc.get("s3Link")
-            if not s3_link:
+        for sub_doc in sub_docs:
+            if not sub_doc.get("s3Link"):
                 raise ValueError(
                     f"Subchapter {sub_doc.get('subchapterTitle')} missing s3Link"
                 )
-
-            if use_ocr:
-                text = self.ocr_model.generate_response(s3_link)
-            else:
-                response = requests.get(s3_link, timeout=60)
-                response.raise_for_status()
-                pdf_file = BytesIO(response.content)
-                reader = PdfReader(pdf_file)
-                text = "".join(page.extract_text() or "" for page in reader.pages)
-
-            current_chunks = self.chunk_text(text)
-            for chunk in current_chunks:
-                chunks.append(chunk)
-                metadata.append(
-                    {
-                        "subchapter_id": sub_doc["_id"],
-                        "chapter_id": sub_doc.get("chapterID"),
-                        "subchapter_title": sub_doc.get("subchapterTitle", ""),
-                    }
-                )
-            print(f"{idx} / {len(sub_docs)}", end="\r")
-
-        print("\nChunks created")
+        s3_links = [sub_doc["s3Link"] for sub_doc in sub_docs]
+
+        # Later PDFs download while earlier ones are parsed
+        pdf_contents = iter(()) if use_ocr else download_many(s3_links)
+        with progress("chunk", len(sub_docs)) as advance:
+            for sub_doc in sub_docs:
+                if use_ocr:
+                    text = self.ocr_model.generate_response(sub_doc["s3Link"])
+                else:
+                    content = next(pdf_contents)
+                    with stage_timer("extract"):
+                        reader = PdfReader(BytesIO(content))
+                        text = "".join(page.extract_text() or "" for page in reader.pages)
+
+                current_chunks = self.chunk_text(text)
+                for chunk in current_chunks:
+                    chunks.append(chunk)
+                    metadata.append(
+                        {
+                            "subchapter_id": sub_doc["_id"],
+                            "chapter_id": sub_doc.get("chapterID"),
+                            "subchapter_title": sub_doc.get("subchapterTitle", ""),
+                        }
+                    )
+                advance()
+
+        print("Chunks created")
         return chunks, metadata
 
     @function_timer
     def embed_all_chunks(self, chunks: List[str]) -> List[List[float]]:
-        """Generate embeddings for all chunks."""
-        embeddings_list: List[List[float]] = []
-        total = len(chunks)
-
-        print("Embedding chunks...")
-        for i, chunk in enumerate(chunks, start=1):
-            embedding = self.embed_model.generate_response(chunk)
-            embeddings_list.append(embedding)
-            print(f"{i} / {total}", end="\r")
+        """Generate embeddings for all chunks.
+
+        Chunks already in the embedding cache, from this or any other book,
+        are not sent to the embedding model; repeated chunks are embedded once.
+        """
+        embeddings_list: List[Optional[List[float]]] = [None] * len(chunks)
+        cache = get_embedding_cache()
+        keys = [EmbeddingCache.make_key(self.embed_model.name, chunk) for chunk in chunks]
+        if cache is not None:
+            embeddings_list = cache.get_many(keys)
+
+        pending: Dict[str, List[int]] = {}
+        for index, embedding in enumerate(embeddings_list):
+            if embedding is None:
+                pending.setdefault(keys[index], []).append(index)
+        total = len(pending)
+        cached = len(chunks) - sum(map(len, pending.values()))
+        print(f"Embedding chunks ({cached} cached)...")
+        # Cached chunks and repeats of a pending chunk are not sent to the model
+        saved = [index for index, embedding in enumerate(embeddings_list) if embedding is not None]
+        saved += [index for indices in pending.values() for index in indices[1:]]
+        record_cache_hit(
+            self.embed_model.STAGE,
+            self.embed_model.name,
+            count=len(saved),
+            prompt_chars=sum(len(chunks[index]) for index in saved),
+        )
 
-        print("\nChunks embedded")
+        new_keys: List[str] = []
+        new_embeddings: List[List[float]] = []
+        with progress("embed", total) as advance:
+            for key, indices in pending.items():
+                embedding = self.embed_model.generate_response(chunks[indices[0]], bypass_cache=True)
+                for index in indices:
+                    embeddings_list[index] = embedding
+                new_keys.append(key)
+                new_embeddings.append(embedding)
+                advance()
+
+        if cache is not None and new_keys:
+            cache.put_many(new_keys, new_embeddings, self.embed_model.name)
+
+        print("Chunks embedded")
         return embeddings_list
 
     @function_timer
@@ -168,24 +218,143 @@ class TextEmbedder:
                     "subchapterTitle": meta.get("subchapter_title"),
                     "chunkIndex": index,
                     "text": chunk,
+                    "textHash": self.hash_chunk(chunk),
                     "embedding": embedding,
                 }
             )
 
         if documents:
-            self.embedding_collection.insert_many(documents)
+            with stage_timer("insert"):
+                self.embedding_collection.insert_many(documents)
+            mark_embeddings_updated(self.books_collection, book_id)
         print("Embeddings inserted")
 
+    @function_timer
+    def sync_embeddings(
+        self,
+        book_id: ObjectId,
+        chunks: List[str],
+        metadata: List[Dict[str, ObjectId | str]],
+    ) -> Dict[str, int]:
+        """Bring a book's stored chunkEmbeddings in line with chunks, embedding only new text.
+
+        Stored chunks are matched to the new ones by textHash. Matches keep their
+        embedding and only have position and subchapter fields updated, unmatched
+        new chunks are embedded and inserted, and stored chunks with no match are
+        deleted, all in bulk writes.
+
+        Returns:
+            Dict with counts of unchanged, updated, inserted and deleted chunks
+        """
+        print("Diffing chunks against stored embeddings...")
+        stored: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in self.embedding_collection.find(
+            {"bookID": book_id},
+            {"textHash": 1, "text": 1, "chapterID": 1, "subchapterID": 1, "subchapterTitle": 1, "chunkIndex": 1},
+        ):
+            # Rows written before textHash existed are hashed from their text
+            text_hash = doc.get("textHash") or self.hash_chunk(doc.get("text", ""))
+            doc["textHash"] = text_hash
+            stored.setdefault(text_hash, []).append(doc)
+
+        operations: List[Any] = []
+        to_embed: List[Tuple[int, str, Dict[str, ObjectId | str]]] = []
+        counts = {"unchanged": 0, "updated": 0, "inserted": 0, "deleted": 0}
+
+        for index, (chunk, meta) in enumerate(zip(chunks, metadata), start=1):
+            text_hash = self.hash_chunk(chunk)
+            fields = {
+                "chapterID": meta.get("chapter_id"),
+                "subchapterID": meta.get("subchapter_id"),
+                "subchapterTitle": meta.get("subchapter_title"),
+                "chunkIndex": index,
+                "textHash": text_hash,
+            }
+            matches = stored.get(text_hash)
+            if not matches:
+                to_embed.append((index, chunk, fields))
+                continue
+
+            existing = matches.pop(0)
+            if all(existing.get(key) == value for key, value in fields.items()):
+                counts["unchanged"] += 1
+            else:
+                operations.append(UpdateOne({"_id": existing["_id"]}, {"$set": fields}))
+                counts["updated"] += 1
+
+        stale_ids = [doc["_id"] for docs in stored.values() for doc in docs]
+        if stale_ids:
+            operations.append(DeleteMany({"_id": {"$in": stale_ids}}))
+            counts["deleted"] = len(stale_ids)
+
+        embeddings = self.embed_all_chunks([chunk for _, chunk, _ in to_embed])
+        for (_, chunk, fields), embedding in zip(to_embed, embeddings):
+            operations.append(
+                InsertOne({"bookID": book_id, **fields, "text": chunk, "embedding": embedding})
+            )
+        counts["inserted"] = len(to_embed)
+
+        with stage_timer("insert"):
+            for start in range(0, len(operations), self.BULK_WRITE_BATCH):
+                self.embedding_collection.bulk_write(
+                    operations[start : start + self.BULK_WRITE_BATCH], ordered=False
+                )
+        if operations:
+            mark_embeddings_updated(self.books_collection, book_id)
+
+        print(
+            f"Embeddings synced: {counts['unchanged']} unchanged, {counts['updated']} updated, "
+            f"{counts['inserted']} inserted, {counts['deleted']} deleted"
+        )
+        return counts
+
     def process_book(
         self,
         book_id: ObjectId | str,
         use_ocr: bool = False,
+        incremental: bool = False,
     ) -> None:
-        """Complete pipeline to embed a book."""
+        """Complete pipeline to embed a book.
+
+        With incremental set, stored embeddings for the book are diffed and
+        only new or changed chunks are embedded (see sync_embeddings), so the
+        book can be re-processed without duplicating rows.
+        """
         book_id = self._ensure_object_id(book_id)
-        chunks, metadata = self.get_chunks(book_id, use_ocr)
-        embeddings = self.embed_all_chunks(chunks)
-        self.insert_embeddings(book_id, chunks, embeddings, metadata)
+        with span("embed_book", book_id=str(book_id), use_ocr=use_ocr, incremental=incremental) as root:
+            with span("get_chunks"):
+                chunks, metadata = self.get_chunks(book_id, use_ocr)
+            if root is not None:
+                root.set_attribute("chunks", len(chunks))
+            if incremental:
+                with span("sync_embeddings"):
+                    self.sync_embeddings(book_id, chunks, metadata)
+            else:
+                with span("embed_all_chunks"):
+                    embeddings = self.embed_all_chunks(chunks)
+                self.insert_embeddings(book_id, chunks, embeddings, metadata)
+            # Duplicate uploads only clone these embeddings when made the same way
+            self.books_collection.update_one(
+                {"_id": book_id, "contentFingerprint": {"$exists": True}},
+                {
+                    "$set": {
+                        "contentFingerprint.useOcr": use_ocr,
+                        "contentFingerprint.embedModel": self.embed_model.name,
+                    }
+                },
+            )
+            with span("wait_until_searchable"):
+                self.wait_until_searchable(book_id)
+
+    def wait_until_searchable(self, book_id: ObjectId) -> None:
+        """Block until $vectorSearch returns the book's chunks, so a finished book is usable at once."""
+        if retrieval_backend() != "atlas":
+            return
+        try:
+            waited = VectorIndexManager(self.embedding_collection).wait_until_searchable(book_id)
+            print(f"Book {book_id} searchable after {waited:.1f}s")
+        except Exception as exc:
+            print(f"Could not confirm book {book_id} is searchable: {exc}")
 
 
 if __name__ == "__main__":
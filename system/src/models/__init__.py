@@ -1,13 +1,29 @@
-"""AI model interfaces."""
+"""AI model interfaces.
 
-from .ai_models import (
-    AIModel,
-    DeepseekModel,
-    MistralModel,
-    MistralEmbed,
-    MistralOCR,
-    MistralSmall
-)
+Loaded on first access: ai_models imports the openai and mistralai SDKs.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+_EXPORTS = {
+    "AIModel": ".ai_models",
+    "DeepseekModel": ".ai_models",
+    "MistralModel": ".ai_models",
+    "MistralEmbed": ".ai_models",
+    "MistralOCR": ".ai_models",
+    "MistralSmall": ".ai_models",
+}
+
+if TYPE_CHECKING:
+    from .ai_models import (
+        AIModel,
+        DeepseekModel,
+        MistralModel,
+        MistralEmbed,
+        MistralOCR,
+        MistralSmall
+    )
 
 __all__ = [
     "AIModel",
@@ -16,4 +32,18 @@ __all__ = [
     "MistralEmbed",
     "MistralOCR",
     "MistralSmall"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562: import the defining module on first access, then cache the attribute
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,16 +1,51 @@
+import asyncio
 import os
-from openai import OpenAI
+from typing import Any, Iterator, Tuple
+from openai import AsyncOpenAI, OpenAI
 from mistralai import Mistral
+from mistralai.models import OCRResponse
 from dotenv import load_dotenv
 import time
 
+from ..utils.embedding_cache import EmbeddingCache, get_embedding_cache
+from ..utils.metrics import observe_stage, record_llm_call, record_llm_tokens, stage_timer
+from ..utils.response_cache import ResponseCache, get_response_cache
+from ..utils.tracing import get_tracer
+from ..utils.usage import record_cache_hit, record_model_call, record_model_usage
+
+def _mistral_client(key: str) -> Mistral:
+  """Create a Mistral client; MISTRAL_SERVER_URL points it at a compatible server, e.g. a local stub."""
+  return Mistral(api_key=key, server_url=os.getenv("MISTRAL_SERVER_URL") or None)
+
 class AIModel:
+  """
+  Base class for model wrappers.
+  One instance serves every concurrent request of a process (see AppContext), so calls must
+  not keep state on it: per-call results are returned and per-request accounting goes through
+  the usage and tracing context variables. freeze() turns attribute writes into errors.
+  """
+  SYSTEM_MESSAGE = ""
+  # Pipeline stage the model's calls are timed under in booktestmaker_stage_seconds
+  STAGE = "generate"
+
   def __init__(self):
     load_dotenv()
     self.name
     self.key
     self.client
 
+  def __setattr__(self, name: str, value: Any) -> None:
+    if getattr(self, "_frozen", False):
+      raise AttributeError(
+        f"{type(self).__name__} is shared across requests; return {name} from the call instead of storing it"
+      )
+    super().__setattr__(name, value)
+
+  def freeze(self) -> "AIModel":
+    """Reject attribute writes from now on; called once the wrapper is shared."""
+    object.__setattr__(self, "_frozen", True)
+    return self
+
   def generate_client(self):
     """
     Create and return a client object based on the model name.
@@ -18,70 +53,360 @@ class AIModel:
     """
     raise NotImplementedError("This method should be overridden to generate a client based on the model name.")
 
-  def generate_response(self, prompt: str):
+  def generate_response(self, prompt: str, bypass_cache: bool = False):
     """
     Generate and return a response for the provided prompt.
+    Identical calls (same model, system message and prompt) are served from the shared
+    response cache when it is enabled, unless bypass_cache is set, e.g. when a caller
+    needs fresh variation.
+    """
+    response, _ = self.generate_with_cache_info(prompt, bypass_cache)
+    return response
+
+  def generate_with_cache_info(self, prompt: str, bypass_cache: bool = False) -> Tuple[Any, bool]:
+    """
+    Generate a response and report whether it came from the response cache.
+    Returned rather than stored on the instance because one model serves many concurrent requests.
+
+    Returns:
+      Tuple of (response, cache_hit)
+    """
+    if bypass_cache:
+      return self._call_model(prompt), False
+
+    cache = self._cache()
+    key = self._cache_key(prompt)
+    if cache is not None:
+      cached = cache.get(key)
+      if cached is not None:
+        response = self._decode_cached(cached)
+        self._record_cache_hit(prompt, response)
+        return response, True
+
+    response = self._call_model(prompt)
+    if cache is not None:
+      cache.put(key, self._encode_cached(response), self.name)
+    return response, False
+
+  def stream_response(self, prompt: str, bypass_cache: bool = False) -> Iterator[str]:
+    """
+    Generate a response for the provided prompt and yield it in text fragments as they arrive.
+    A cached response is yielded as a single fragment; a streamed response is cached once complete.
+    """
+    fragments, _ = self.stream_with_cache_info(prompt, bypass_cache)
+    yield from fragments
+
+  def stream_with_cache_info(self, prompt: str, bypass_cache: bool = False) -> Tuple[Iterator[str], bool]:
+    """
+    Look the prompt up in the response cache and return the fragments to consume.
+
+    Returns:
+      Tuple of (fragment iterator, cache_hit); on a hit the iterator yields the cached response
+    """
+    cache = self._cache()
+    if cache is None or bypass_cache:
+      return self._stream_model(prompt), False
+
+    key = self._cache_key(prompt)
+    cached = cache.get(key)
+    if cached is not None:
+      self._record_cache_hit(prompt, cached)
+      return iter([cached]), True
+    return self._stream_and_cache(prompt, cache, key), False
+
+  def _stream_and_cache(self, prompt: str, cache: Any, key: str) -> Iterator[str]:
+    """Yield a streamed response and cache it once complete."""
+    fragments = []
+    for fragment in self._stream_model(prompt):
+      fragments.append(fragment)
+      yield fragment
+    cache.put(key, "".join(fragments), self.name)
+
+  async def agenerate_response(self, prompt: str, bypass_cache: bool = False):
+    """
+    Async counterpart of generate_response, sharing the same response cache.
+    """
+    response, _ = await self.agenerate_with_cache_info(prompt, bypass_cache)
+    return response
+
+  async def agenerate_with_cache_info(self, prompt: str, bypass_cache: bool = False) -> Tuple[Any, bool]:
+    """
+    Generate a response asynchronously and report whether it came from the response cache.
+    Returned rather than stored on the instance because one model serves many concurrent coroutines.
+
+    Returns:
+      Tuple of (response, cache_hit)
+    """
+    if bypass_cache:
+      return await self._acall_model(prompt), False
+
+    cache = self._cache()
+    key = self._cache_key(prompt)
+    if cache is not None:
+      cached = await asyncio.to_thread(cache.get, key)
+      if cached is not None:
+        response = self._decode_cached(cached)
+        self._record_cache_hit(prompt, response)
+        return response, True
+
+    response = await self._acall_model(prompt)
+    if cache is not None:
+      await asyncio.to_thread(cache.put, key, self._encode_cached(response), self.name)
+    return response, False
+
+  def _call_model(self, prompt: str):
+    """Call _generate, recording its duration under STAGE and its outcome, traced as a span."""
+    start = time.perf_counter()
+    try:
+      with stage_timer(self.STAGE, model=self.name):
+        response = self._generate(prompt)
+    except Exception:
+      record_llm_call(self.name, "error")
+      record_model_call(self.STAGE, self.name, time.perf_counter() - start, error=True)
+      raise
+    record_llm_call(self.name)
+    record_model_call(self.STAGE, self.name, time.perf_counter() - start)
+    return response
+
+  async def _acall_model(self, prompt: str):
+    """Async counterpart of _call_model."""
+    start = time.perf_counter()
+    try:
+      with stage_timer(self.STAGE, model=self.name):
+        response = await self._agenerate(prompt)
+    except Exception:
+      record_llm_call(self.name, "error")
+      record_model_call(self.STAGE, self.name, time.perf_counter() - start, error=True)
+      raise
+    record_llm_call(self.name)
+    record_model_call(self.STAGE, self.name, time.perf_counter() - start)
+    return response
+
+  def _stream_model(self, prompt: str) -> Iterator[str]:
+    """Yield from _stream, recording the duration of the whole stream under STAGE."""
+    # Not made the current span: the consumer's work between fragments is not part of the call
+    span = get_tracer().start_span(self.STAGE, {"model": self.name, "streamed": True})
+    start = time.perf_counter()
+    try:
+      yield from self._stream(prompt)
+    except Exception as exc:
+      record_llm_call(self.name, "error")
+      record_model_call(self.STAGE, self.name, time.perf_counter() - start, error=True)
+      if span is not None:
+        span.record_exception(exc)
+      raise
+    finally:
+      observe_stage(self.STAGE, time.perf_counter() - start)
+      if span is not None:
+        span.end()
+    record_llm_call(self.name)
+    record_model_call(self.STAGE, self.name, time.perf_counter() - start)
+
+  def _record_usage(self, usage: Any, pages: int = 0) -> None:
+    """Add the token usage (or OCR pages) reported with a response to the token counters and usage scope."""
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    record_llm_tokens(self.name, prompt_tokens, completion_tokens)
+    record_model_usage(self.STAGE, self.name, prompt_tokens, completion_tokens, pages)
+
+  def _record_cache_hit(self, prompt: Any, response: Any) -> None:
+    """Count a response that was served without a call of its own, with the usage it saved."""
+    record_cache_hit(
+      self.STAGE,
+      self.name,
+      prompt_chars=len(self.SYSTEM_MESSAGE) + len(prompt) if isinstance(prompt, str) else 0,
+      completion_chars=len(response) if isinstance(response, str) else 0,
+      pages=self._pages(response),
+    )
+
+  def _pages(self, response: Any) -> int:
+    """Return the number of pages a response was billed for (OCR only)."""
+    return 0
+
+  def _generate(self, prompt: str):
+    """
+    Call the model for the provided prompt.
     Override this method in a subclass with the specific response generation implementation.
     """
     raise NotImplementedError("This method should be overridden to generate a response.")
 
+  async def _agenerate(self, prompt: str):
+    """
+    Call the model asynchronously. Runs _generate in a worker thread unless a subclass
+    overrides this with the SDK's native async method.
+    """
+    return await asyncio.to_thread(self._generate, prompt)
+
+  def _stream(self, prompt: str) -> Iterator[str]:
+    """
+    Call the model for the provided prompt and yield text fragments.
+    Override this method in a subclass for models that support streaming.
+    """
+    raise NotImplementedError("This model does not support streaming responses.")
+
+  def _cache(self):
+    """
+    Return the cache consulted for this model's responses, or None when caching is disabled.
+    The cache must provide get(key) and put(key, value, model_name).
+    """
+    return get_response_cache()
+
+  def _cache_key(self, prompt: str) -> str:
+    """Return the cache key for a call with the provided prompt."""
+    return ResponseCache.make_key(self.name, self.SYSTEM_MESSAGE, prompt)
+
+  def _encode_cached(self, response: Any) -> Any:
+    """Convert a response into a value that can be stored in MongoDB."""
+    return response
+
+  def _decode_cached(self, value: Any) -> Any:
+    """Rebuild a response from its cached value."""
+    return value
+
 class DeepseekModel(AIModel):
+  SYSTEM_MESSAGE = "You are a helpful educational assistant."
+
   def __init__(self):
     self.name = os.getenv("DEEPSEEK_NAME")
     self.key =  os.getenv("DEEPSEEK_KEY")
     self.client = OpenAI(api_key=self.key, base_url="https://api.deepseek.com")
+    self.async_client = AsyncOpenAI(api_key=self.key, base_url="https://api.deepseek.com")
+
+  def _messages(self, prompt: str):
+    return [
+      {"role": "system", "content": self.SYSTEM_MESSAGE},
+      {"role": "user", "content": prompt},
+    ]
 
-  def generate_response(self, prompt: str):
+  def _generate(self, prompt: str):
     response = self.client.chat.completions.create(
         model=self.name,
-        messages=[
-          {"role": "system", "content": "You are a helpful educational assistant."},
-          {"role": "user", "content": prompt},
-        ],
+        messages=self._messages(prompt),
         stream=False
       )
+    self._record_usage(response.usage)
     return response.choices[0].message.content
 
+  async def _agenerate(self, prompt: str):
+    response = await self.async_client.chat.completions.create(
+        model=self.name,
+        messages=self._messages(prompt),
+        stream=False
+      )
+    self._record_usage(response.usage)
+    return response.choices[0].message.content
+
+  def _stream(self, prompt: str) -> Iterator[str]:
+    stream = self.client.chat.completions.create(
+        model=self.name,
+        messages=self._messages(prompt),
+        stream=True,
+        stream_options={"include_usage": True}
+      )
+    for chunk in stream:
+      if chunk.usage:
+        self._record_usage(chunk.usage)
+      if chunk.choices and chunk.choices[0].delta.content:
+        yield chunk.choices[0].delta.content
+
 class MistralModel(AIModel):
+  SYSTEM_MESSAGE = "You are an exam maker responsible for creating exam questions for a chosen subchapter in a textbook for students to practice with."
+
   def __init__(self):
     self.name = os.getenv("MISTRAL_NAME")
     self.key =  os.getenv("MISTRAL_KEY")
-    self.client = Mistral(api_key=self.key)
+    self.client = _mistral_client(self.key)
 
-  def generate_response(self, prompt: str):
+  def _messages(self, prompt: str):
+    return [
+      {"role": "system", "content": self.SYSTEM_MESSAGE},
+      {"role": "user", "content": prompt},
+    ]
+
+  def _generate(self, prompt: str):
     response = self.client.chat.complete(
       model= self.name,
-      messages = [
-          {"role": "system", "content": "You are an exam maker responsible for creating exam questions for a chosen subchapter in a textbook for students to practice with."},
-          {"role": "user", "content": prompt},
-        ],
+      messages = self._messages(prompt),
       response_format = {
         "type": "json_object",
         }
     )
+    self._record_usage(response.usage)
     return response.choices[0].message.content
 
+  async def _agenerate(self, prompt: str):
+    response = await self.client.chat.complete_async(
+      model= self.name,
+      messages = self._messages(prompt),
+      response_format = {
+        "type": "json_object",
+        }
+    )
+    self._record_usage(response.usage)
+    return response.choices[0].message.content
+
+  def _stream(self, prompt: str) -> Iterator[str]:
+    stream = self.client.chat.stream(
+      model= self.name,
+      messages = self._messages(prompt),
+      response_format = {
+        "type": "json_object",
+        }
+    )
+    with stream as events:
+      for event in events:
+        if event.data.usage:
+          self._record_usage(event.data.usage)
+        choices = event.data.choices
+        content = choices[0].delta.content if choices else None
+        if isinstance(content, str) and content:
+          yield content
+
 class MistralEmbed(AIModel):
+  STAGE = "embed"
+  # Pause after each call to stay under the embeddings rate limit
+  DEFAULT_PAUSE_SECONDS = 0.17
+
   def __init__(self):
+    self.pause_seconds = float(os.getenv("MISTRAL_EMBED_PAUSE_SECONDS", self.DEFAULT_PAUSE_SECONDS))
     self.name = os.getenv("MISTRAL_EMBED_NAME")
     self.key =  os.getenv("MISTRAL_KEY")
-    self.client = Mistral(api_key=self.key)
+    self.client = _mistral_client(self.key)
 
-  def generate_response(self, prompt: str):
+  def _generate(self, prompt: str):
     response = self.client.embeddings.create(
       model=self.name,
       inputs=prompt
     )
-    time.sleep(0.17)
+    self._record_usage(response.usage)
+    time.sleep(self.pause_seconds)
     return response.data[0].embedding
 
+  async def _agenerate(self, prompt: str):
+    response = await self.client.embeddings.create_async(
+      model=self.name,
+      inputs=prompt
+    )
+    self._record_usage(response.usage)
+    await asyncio.sleep(self.pause_seconds)
+    return response.data[0].embedding
+
+  def _cache(self):
+    # Embeddings live in their own compact cache, shared across books
+    return get_embedding_cache()
+
+  def _cache_key(self, prompt: str) -> str:
+    return EmbeddingCache.make_key(self.name, prompt)
+
 class MistralOCR(AIModel):
+  STAGE = "ocr"
+
   def __init__(self):
     self.name = os.getenv("MISTRAL_OCR_NAME")
     self.key =  os.getenv("MISTRAL_KEY")
-    self.client = Mistral(api_key=self.key)
+    self.client = _mistral_client(self.key)
 
-  def generate_response(self, url: str):
+  def _generate(self, url: str):
     response = self.client.ocr.process(
       model=self.name,
       document={
@@ -90,24 +415,52 @@ class MistralOCR(AIModel):
       },
       include_image_base64=True
     )
-
+    self._record_usage(None, pages=self._pages(response))
     return response
 
+  def _pages(self, response: OCRResponse) -> int:
+    usage_info = getattr(response, "usage_info", None)
+    return getattr(usage_info, "pages_processed", 0) or 0
+
+  def _encode_cached(self, response: OCRResponse) -> dict:
+    return response.model_dump()
+
+  def _decode_cached(self, value: dict) -> OCRResponse:
+    return OCRResponse.model_validate(value)
+
 class MistralSmall(AIModel):
+  STAGE = "evaluate"
+  SYSTEM_MESSAGE = "You are quality control for exam questions. Your job is to check the quality of the questions generated by the exam maker, based on a set of criteria in the user prompt."
+
   def __init__(self):
     self.name = os.getenv("MISTRAL_SMALL_NAME")
     self.key =  os.getenv("MISTRAL_KEY")
-    self.client = Mistral(api_key=self.key)
+    self.client = _mistral_client(self.key)
 
-  def generate_response(self, prompt: str):
+  def _messages(self, prompt: str):
+    return [
+      {"role": "system", "content": self.SYSTEM_MESSAGE},
+      {"role": "user", "content": prompt},
+    ]
+
+  def _generate(self, prompt: str):
     response = self.client.chat.complete(
       model= self.name,
-      messages = [
-          {"role": "system", "content": "You are quality control for exam questions. Your job is to check the quality of the questions generated by the exam maker, based on a set of criteria in the user prompt."},
-          {"role": "user", "content": prompt},
-        ],
+      messages = self._messages(prompt),
       response_format = {
         "type": "json_object",
         }
     )
-    return response.choices[0].message.content
\ No newline at end of file
+    self._record_usage(response.usage)
+    return response.choices[0].message.content
+
+  async def _agenerate(self, prompt: str):
+    response = await self.client.chat.complete_async(
+      model= self.name,
+      messages = self._messages(prompt),
+      response_format = {
+        "type": "json_object",
+        }
+    )
+    self._record_usage(response.usage)
+    return response.choices[0].message.content
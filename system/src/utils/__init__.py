@@ -1,25 +1,111 @@
-"""Utility functions and helpers."""
-
-from .timing import function_timer
-from .tokenizer import Tokenizer
-from .database_funcs import (
-    get_mongo_client,
-    update_collection,
-    delete_collection,
-    delete_entries,
-    get_entry_single,
-    get_entries,
-    create_vector_index
-)
+"""Utility functions and helpers.
+
+Helpers are imported on first access, so importing one utility module (e.g.
+src.utils.metrics) does not load the tokenizer, pymongo or requests.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+_EXPORTS = {
+    "function_timer": ".timing",
+    "stage_timer": ".metrics",
+    "metrics_payload": ".metrics",
+    "span": ".tracing",
+    "get_tracer": ".tracing",
+    "profile_job": ".profiler",
+    "Tokenizer": ".tokenizer",
+    "PromptBudgeter": ".prompt_budget",
+    "IncrementalJSONArrayParser": ".json_stream",
+    "ResponseCache": ".response_cache",
+    "get_response_cache": ".response_cache",
+    "EmbeddingCache": ".embedding_cache",
+    "get_embedding_cache": ".embedding_cache",
+    "SingleFlight": ".single_flight",
+    "VectorSearchConfig": ".vector_search",
+    "VectorIndexManager": ".vector_index",
+    "active_index_name": ".vector_index",
+    "get_http_session": ".http_client",
+    "download_bytes": ".http_client",
+    "download_many": ".http_client",
+    "download_to_file": ".http_client",
+    "get_mongo_client": ".database_funcs",
+    "update_collection": ".database_funcs",
+    "delete_collection": ".database_funcs",
+    "delete_entries": ".database_funcs",
+    "get_entry_single": ".database_funcs",
+    "get_entries": ".database_funcs",
+    "create_vector_index": ".database_funcs",
+    "vector_index_definition": ".database_funcs",
+}
+
+if TYPE_CHECKING:
+    from .timing import function_timer
+    from .metrics import stage_timer, metrics_payload
+    from .tracing import span, get_tracer
+    from .profiler import profile_job
+    from .tokenizer import Tokenizer
+    from .prompt_budget import PromptBudgeter
+    from .json_stream import IncrementalJSONArrayParser
+    from .response_cache import ResponseCache, get_response_cache
+    from .embedding_cache import EmbeddingCache, get_embedding_cache
+    from .single_flight import SingleFlight
+    from .vector_search import VectorSearchConfig
+    from .vector_index import VectorIndexManager, active_index_name
+    from .http_client import get_http_session, download_bytes, download_many, download_to_file
+    from .database_funcs import (
+        get_mongo_client,
+        update_collection,
+        delete_collection,
+        delete_entries,
+        get_entry_single,
+        get_entries,
+        create_vector_index,
+        vector_index_definition
+    )
 
 __all__ = [
     "function_timer",
+    "stage_timer",
+    "metrics_payload",
+    "span",
+    "get_tracer",
+    "profile_job",
     "Tokenizer",
+    "PromptBudgeter",
+    "IncrementalJSONArrayParser",
+    "ResponseCache",
+    "get_response_cache",
+    "EmbeddingCache",
+    "get_embedding_cache",
+    "SingleFlight",
+    "VectorSearchConfig",
+    "VectorIndexManager",
+    "active_index_name",
+    "get_http_session",
+    "download_bytes",
+    "download_many",
+    "download_to_file",
     "get_mongo_client",
     "update_collection",
     "delete_collection",
     "delete_entries",
     "get_entry_single",
     "get_entries",
-    "create_vector_index"
-]
\ No newline at end of file
+    "create_vector_index",
+    "vector_index_definition"
+]
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562: import the defining module on first access, then cache the attribute
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
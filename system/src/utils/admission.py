@@ -0,0 +1,337 @@
+"""Admission control for the pipeline endpoints.
+
+Each pool ("generation" for /generate-questions, "ingest" for the upload and
+re-embedding jobs) limits how many requests run at once, in total and per
+user. Requests over either limit wait in a weighted fair queue: a request is
+tagged with max(virtual clock, the user's previous tag) + its estimated cost
+(the questions it asks for, or one per ingestion job), and the lowest tag
+whose user is under the per-user limit runs next. A user who submits 200
+subchapters is charged for all of them up front, so another user's small
+request is dispatched ahead of that backlog instead of behind it.
+
+Requests without a user identity (see requester_id) are only subject to the
+pool-wide limits: treating them as one user would turn the per-user limits
+into global ones for every caller that does not send the header.
+
+Requests are rejected, and the endpoints answer 429 with a Retry-After
+estimate, when the queue or the user's share of it is full, or when a
+request has waited longer than the queue timeout. Limits are per process:
+under gunicorn, divide the intended totals by the number of workers.
+
+The limits are set with ADMISSION_<POOL>_MAX_CONCURRENT and
+ADMISSION_<POOL>_MAX_PER_USER and count whole HTTP requests or jobs. They are
+separate from GENERATION_MAX_CONCURRENCY (see async_question_generation),
+which bounds the subchapters the asyncio generator works on at once across
+the admitted requests.
+"""
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .metrics import record_admission
+
+DEFAULT_USER_HEADER = "X-User-Id"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"request rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A request's place in an AdmissionController, from enqueue to release."""
+
+    def __init__(self, user: Optional[str], cost: float, tag: float):
+        self.user = user
+        self.cost = cost
+        self.tag = tag
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.released = False
+        self._admitted = threading.Event()
+
+    @property
+    def admitted(self) -> bool:
+        return self._admitted.is_set()
+
+
+class AdmissionController:
+    """Concurrency limits with weighted fair queuing for one pool of work."""
+
+    DEFAULT_MAX_QUEUE = 64
+    DEFAULT_MAX_QUEUED_PER_USER = 8
+    DEFAULT_QUEUE_TIMEOUT_SECONDS = 30
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_per_user: int,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_queued_per_user: int = DEFAULT_MAX_QUEUED_PER_USER,
+        queue_timeout_seconds: float = DEFAULT_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.name = name
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_per_user = max(max_per_user, 1)
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[float, int, Ticket]] = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._active: Dict[Optional[str], int] = {}
+        self._queued: Dict[Optional[str], int] = {}
+        self._last_tag: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        # Moving average of how long admitted requests hold their slot
+        self._service_seconds: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, name: str, max_concurrent: int, max_per_user: int) -> "AdmissionController":
+        """
+        Build a controller from ADMISSION_<NAME>_MAX_CONCURRENT, ADMISSION_<NAME>_MAX_PER_USER
+        and the shared ADMISSION_* queue settings.
+
+        Args:
+            name: Pool name, e.g. "generation"
+            max_concurrent: Default global concurrency limit
+            max_per_user: Default per-user concurrency limit
+        """
+        prefix = f"ADMISSION_{name.upper()}"
+        return cls(
+            name,
+            max_concurrent=int(os.getenv(f"{prefix}_MAX_CONCURRENT", max_concurrent)),
+            max_per_user=int(os.getenv(f"{prefix}_MAX_PER_USER", max_per_user)),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", cls.DEFAULT_MAX_QUEUE)),
+            max_queued_per_user=int(
+                os.getenv("ADMISSION_MAX_QUEUED_PER_USER", cls.DEFAULT_MAX_QUEUED_PER_USER)
+            ),
+            queue_timeout_seconds=float(
+                os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", cls.DEFAULT_QUEUE_TIMEOUT_SECONDS)
+            ),
+        )
+
+    def enqueue(self, user: Optional[str], cost: float) -> Ticket:
+        """
+        Queue a request, admitting it straight away when a slot is free.
+
+        Args:
+            user: Requesting user (see requester_id); None applies only the pool-wide limits
+            cost: Estimated cost of the request, at least 1
+
+        Returns:
+            Ticket to wait on and release
+
+        Raises:
+            AdmissionRejected: The queue, or the user's share of it, is full
+        """
+        cost = max(float(cost), 1.0)
+        with self._lock:
+            # The queue limits only apply to requests that would have to wait
+            starts_now = self._running < self.max_concurrent and not self._at_user_limit(user)
+            if starts_now:
+                reason = None
+            elif len(self._queue) >= self.max_queue:
+                reason = "queue_full"
+            elif user is not None and self._queued.get(user, 0) >= self.max_queued_per_user:
+                reason = "user_queue_full"
+            else:
+                reason = None
+            if reason:
+                retry_after = self._retry_after()
+                record_admission(self.name, reason)
+                raise AdmissionRejected(reason, retry_after)
+
+            if user is None:
+                # No history to charge against: ordered by arrival on the virtual clock
+                tag = self._virtual_time + cost
+            else:
+                tag = max(self._virtual_time, self._last_tag.get(user, 0.0)) + cost
+                self._last_tag[user] = tag
+            ticket = Ticket(user, cost, tag)
+            heapq.heappush(self._queue, (tag, next(self._sequence), ticket))
+            self._queued[user] = self._queued.get(user, 0) + 1
+            self._dispatch()
+        return ticket
+
+    def wait(self, ticket: Ticket, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until ticket is admitted; on timeout it is taken out of the queue.
+
+        Args:
+            ticket: Ticket returned by enqueue
+            timeout: Seconds to wait, or None to wait indefinitely
+
+        Returns:
+            True when admitted, False when the wait timed out
+        """
+        if ticket._admitted.wait(timeout):
+            return True
+        with self._lock:
+            if ticket.admitted:
+                return True
+            self._remove(ticket)
+        record_admission(self.name, "timeout", time.monotonic() - ticket.enqueued_at)
+        return False
+
+    def acquire(self, user: Optional[str], cost: float, timeout: Optional[float] = None) -> Ticket:
+        """
+        Enqueue a request and wait for its turn (by default up to the queue timeout).
+
+        Raises:
+            AdmissionRejected: The queue is full or the wait timed out
+        """
+        ticket = self.enqueue(user, cost)
+        if not self.wait(ticket, self.queue_timeout_seconds if timeout is None else timeout):
+            raise AdmissionRejected("queue_timeout", self.retry_after())
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        """Give back an admitted ticket's slot, or withdraw a queued one. Idempotent."""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if not ticket.admitted:
+                self._remove(ticket)
+                return
+            self._running -= 1
+            self._decrement(self._active, ticket.user)
+            held = time.monotonic() - ticket.started_at
+            self._service_seconds = (
+                held if self._service_seconds is None else 0.8 * self._service_seconds + 0.2 * held
+            )
+            self._forget_idle(ticket.user)
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, user: Optional[str], cost: float, timeout: Optional[float] = None) -> Iterator[Ticket]:
+        """Hold a slot for the enclosed block; see acquire."""
+        ticket = self.acquire(user, cost, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying."""
+        with self._lock:
+            return self._retry_after()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Running and queued request counts, for diagnostics."""
+        with self._lock:
+            return {"running": self._running, "queued": len(self._queue), "users": len(self._active)}
+
+    def _dispatch(self) -> None:
+        # Lock held. Start the lowest-tagged tickets whose users are under their limit.
+        deferred = []
+        while self._queue and self._running < self.max_concurrent:
+            entry = heapq.heappop(self._queue)
+            ticket = entry[2]
+            if self._at_user_limit(ticket.user):
+                deferred.append(entry)
+                continue
+            self._running += 1
+            self._active[ticket.user] = self._active.get(ticket.user, 0) + 1
+            self._decrement(self._queued, ticket.user)
+            # The clock advances to the start tag of the request entering service
+            self._virtual_time = max(self._virtual_time, ticket.tag - ticket.cost)
+            ticket.started_at = time.monotonic()
+            ticket._admitted.set()
+            record_admission(self.name, "admitted", ticket.started_at - ticket.enqueued_at)
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+    def _at_user_limit(self, user: Optional[str]) -> bool:
+        # Lock held. Anonymous requests only count against the pool-wide limit.
+        return user is not None and self._active.get(user, 0) >= self.max_per_user
+
+    def _remove(self, ticket: Ticket) -> None:
+        # Lock held. Withdraw a queued ticket and refund its cost if nothing was tagged after it.
+        for index, entry in enumerate(self._queue):
+            if entry[2] is ticket:
+                self._queue[index] = self._queue[-1]
+                self._queue.pop()
+                heapq.heapify(self._queue)
+                break
+        else:
+            return
+        self._decrement(self._queued, ticket.user)
+        if self._last_tag.get(ticket.user) == ticket.tag:
+            self._last_tag[ticket.user] = ticket.tag - ticket.cost
+        self._forget_idle(ticket.user)
+
+    def _forget_idle(self, user: Optional[str]) -> None:
+        # Lock held. Drop users with nothing running or queued whose tags the clock has
+        # passed; once the pool is idle, nobody is owed service and the clock restarts.
+        if not self._running and not self._queue:
+            self._last_tag.clear()
+            self._virtual_time = 0.0
+        elif user not in self._active and user not in self._queued:
+            if self._last_tag.get(user, 0.0) <= self._virtual_time:
+                self._last_tag.pop(user, None)
+
+    @staticmethod
+    def _decrement(counts: Dict[Optional[str], int], user: Optional[str]) -> None:
+        if counts.get(user, 0) <= 1:
+            counts.pop(user, None)
+        else:
+            counts[user] -= 1
+
+    def _retry_after(self) -> int:
+        # Lock held. Roughly the time for the current queue to drain through the free slots.
+        service = self._service_seconds or 1.0
+        waves = (len(self._queue) + 1) / self.max_concurrent
+        return max(1, min(math.ceil(service * waves), 300))
+
+
+def requester_id(headers) -> Optional[str]:
+    """
+    Identify the user a request is admitted for.
+
+    Uses the header named by ADMISSION_USER_HEADER (X-User-Id by default), as
+    set by the calling application or gateway. Returns None without it: the
+    client address would be the calling service's, shared by all its users.
+    """
+    user = headers.get(os.getenv("ADMISSION_USER_HEADER", DEFAULT_USER_HEADER))
+    return (user or "").strip() or None
+
+
+# Pool name -> (default global limit, default per-user limit)
+POOL_DEFAULTS = {
+    "generation": (8, 2),
+    "ingest": (2, 1),
+}
+
+_controllers: Dict[str, AdmissionController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission_controller(name: str) -> AdmissionController:
+    """
+    Get the process-wide controller for a pool ("generation" or "ingest").
+
+    Returns:
+        Shared AdmissionController instance
+    """
+    controller = _controllers.get(name)
+    if controller is None:
+        with _controllers_lock:
+            controller = _controllers.get(name)
+            if controller is None:
+                controller = AdmissionController.from_env(name, *POOL_DEFAULTS[name])
+                _controllers[name] = controller
+    return controller
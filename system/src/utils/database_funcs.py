@@ -1,25 +1,42 @@
 """Database utility functions for MongoDB operations."""
 
 import os
-from typing import Any, Optional
-from pymongo import MongoClient
+from typing import Any, Optional, Sequence
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.operations import SearchIndexModel
 from pymongo.collection import Collection
-from dotenv import load_dotenv
+from .env import load_env
 
-load_dotenv()
+load_env()
 
 
-def get_mongo_client() -> MongoClient:
+def get_mongo_client(**options) -> MongoClient:
     """
     Get MongoDB client instance.
     
+    Args:
+        **options: Extra MongoClient options (e.g. serverSelectionTimeoutMS)
+
     Returns:
         MongoClient instance
     """
     mongo_uri = os.getenv("MONGO_URI")
     if not mongo_uri:
         raise ValueError("MONGO_URI not found in environment variables")
-    return MongoClient(mongo_uri)
+    return MongoClient(mongo_uri, **options)
+
+
+def get_async_mongo_client() -> AsyncMongoClient:
+    """
+    Get asyncio MongoDB client instance.
+    
+    Returns:
+        AsyncMongoClient instance
+    """
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        raise ValueError("MONGO_URI not found in environment variables")
+    return AsyncMongoClient(mongo_uri)
 
 
 def update_collection(
@@ -127,7 +144,8 @@ def create_vector_index(
     index_name: str = "vector_index",
     path: str = "embedding",
     dimensions: int = 1024,
-    similarity: str = "cosine"
+    similarity: str = "cosine",
+    filter_paths: Sequence[str] = ("bookID", "subchapterID")
 ) -> None:
     """
     Create vector search index for embeddings.
@@ -138,28 +156,43 @@ def create_vector_index(
         path: Field containing vector embeddings
         dimensions: Dimensionality of embeddings
         similarity: Similarity metric (cosine, euclidean, dotProduct)
+        filter_paths: Fields that $vectorSearch queries pre-filter on
     """
     print(f"Creating vector index '{index_name}' on '{collection.name}'...")
     try:
-        collection.create_search_index({
-            "name": index_name,
-            "definition": {
-                "mappings": {
-                    "dynamic": True,
-                    "fields": {
-                        path: {
-                            "type": "knnVector",
-                            "dimensions": dimensions,
-                            "similarity": similarity
-                        }
-                    }
-                }
-            }
-        })
+        collection.create_search_index(
+            SearchIndexModel(
+                definition=vector_index_definition(path, dimensions, similarity, filter_paths),
+                name=index_name,
+                type="vectorSearch",
+            )
+        )
         print("Vector index created successfully")
     except Exception as e:
         print(f"Error creating vector index: {e}")
 
+
+def vector_index_definition(
+    path: str = "embedding",
+    dimensions: int = 1024,
+    similarity: str = "cosine",
+    filter_paths: Sequence[str] = ("bookID", "subchapterID")
+) -> dict:
+    """
+    Build a vectorSearch index definition with one vector field and explicit filter fields.
+    
+    Only the declared fields are indexed, so the index does not grow with
+    unrelated document fields such as chunk text.
+    """
+    fields = [{
+        "type": "vector",
+        "path": path,
+        "numDimensions": dimensions,
+        "similarity": similarity
+    }]
+    fields.extend({"type": "filter", "path": filter_path} for filter_path in filter_paths)
+    return {"fields": fields}
+
 def get_object_id(collection: Collection, field: str, title: str) -> Optional[Any]:
     """
     Retrieve the MongoDB ObjectId of a document based on a specific field and title.
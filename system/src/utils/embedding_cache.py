@@ -0,0 +1,178 @@
+"""Persistent cache of text embeddings shared across books and requests.
+
+Embeddings are keyed by (embedding model name, SHA-256 of the text), so the
+same passage is embedded once no matter which book, upload or request it
+comes from. Vectors are stored in MongoDB as packed float32 bytes, a quarter
+of the size of a BSON array of doubles, with an in-process LRU in front.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from .database_funcs import get_mongo_client
+from .metrics import record_cache
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + MongoDB) cache for embedding vectors."""
+
+    DEFAULT_MEMORY_ENTRIES = 4096
+    LOOKUP_BATCH = 500
+
+    def __init__(
+        self,
+        collection: Optional[Collection] = None,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ):
+        self.memory_entries = memory_entries
+
+        self._collection = collection
+        self._indexes_ready = False
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    @classmethod
+    def make_key(cls, model_name: str, text: str) -> str:
+        """Return the cache key for an embedding of text by model_name."""
+        return f"{model_name or ''}:{cls.hash_text(text)}"
+
+    @staticmethod
+    def _decode(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype=np.float32)
+
+    @property
+    def collection(self) -> Collection:
+        if self._collection is None:
+            self._collection = get_mongo_client()["bookTestMaker"]["embeddingCache"]
+        if not self._indexes_ready:
+            self._collection.create_index("model")
+            self._indexes_ready = True
+        return self._collection
+
+    def _memory_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _memory_put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the cached embedding for key, or None on a miss."""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings for keys in order, with None for misses.
+
+        Keys missing from memory are looked up in MongoDB with batched $in queries.
+        """
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        for key in keys:
+            vector = self._memory_get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                missing.append(key)
+
+        record_cache("embedding", "memory_hit", len(keys) - len(missing))
+        missing = list(dict.fromkeys(missing))
+        try:
+            for start in range(0, len(missing), self.LOOKUP_BATCH):
+                batch = missing[start : start + self.LOOKUP_BATCH]
+                for doc in self.collection.find({"_id": {"$in": batch}}, {"vector": 1}):
+                    vector = self._decode(doc["vector"])
+                    found[doc["_id"]] = vector
+                    self._memory_put(doc["_id"], vector)
+        except Exception as exc:
+            print(f"Embedding cache lookup failed: {exc}")
+
+        mongo_hits = sum(1 for key in missing if key in found)
+        record_cache("embedding", "hit", mongo_hits)
+        record_cache("embedding", "miss", len(missing) - mongo_hits)
+        return [found[key].tolist() if key in found else None for key in keys]
+
+    def put(self, key: str, value: Sequence[float], model_name: str = "") -> None:
+        """Store one embedding under key in both tiers."""
+        self.put_many([key], [value], model_name)
+
+    def put_many(self, keys: List[str], vectors: List[Sequence[float]], model_name: str = "") -> None:
+        """Store embeddings under keys in both tiers with one bulk write."""
+        now = datetime.utcnow()
+        operations = []
+        for key, vector in zip(keys, vectors):
+            packed = np.asarray(vector, dtype=np.float32)
+            self._memory_put(key, packed)
+            operations.append(
+                UpdateOne(
+                    {"_id": key},
+                    {
+                        "$setOnInsert": {
+                            "model": model_name or key.rsplit(":", 1)[0],
+                            "textHash": key.rsplit(":", 1)[-1],
+                            "dimensions": int(packed.shape[0]),
+                            "vector": Binary(packed.tobytes()),
+                            "createdAt": now,
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+
+        if not operations:
+            return
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as exc:
+            print(f"Embedding cache write failed: {exc}")
+
+    def clear_memory(self) -> None:
+        """Drop the in-process tier."""
+        with self._lock:
+            self._memory.clear()
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Get the process-wide embedding cache.
+
+    Configured with EMBEDDING_CACHE_ENABLED and EMBEDDING_CACHE_MEMORY_ENTRIES.
+
+    Returns:
+        Shared EmbeddingCache instance, or None when caching is disabled
+    """
+    global _embedding_cache
+    if os.getenv("EMBEDDING_CACHE_ENABLED", "true").strip().lower() in {"0", "false", "no"}:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    memory_entries=int(
+                        os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", EmbeddingCache.DEFAULT_MEMORY_ENTRIES)
+                    ),
+                )
+    return _embedding_cache
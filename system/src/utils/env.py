@@ -0,0 +1,26 @@
+"""One-time loading of the .env file."""
+
+import threading
+
+from dotenv import load_dotenv
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env() -> None:
+    """
+    Load .env into os.environ once per process.
+
+    Modules call this at import instead of load_dotenv(), so the file is
+    located and parsed once rather than by every module that needs it.
+    Variables already set in the environment take precedence, as with
+    load_dotenv().
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            load_dotenv()
+            _loaded = True
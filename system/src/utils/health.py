@@ -0,0 +1,260 @@
+"""Background dependency health checks for readiness probes.
+
+HealthMonitor probes MongoDB (ping), S3 (HeadBucket on AWS_BUCKET_NAME), the
+Mistral API (GET /v1/models, like health_check.py) and, when retrieval uses
+Atlas, whether the active vector index is queryable. Probes run in a daemon
+thread every HEALTH_PROBE_INTERVAL_SECONDS with long-lived clients and short
+timeouts; the HTTP endpoints only read the last precomputed response, so
+orchestrator probes cost a dictionary lookup and never touch a dependency.
+
+Results older than HEALTH_STALE_AFTER_SECONDS (default three intervals)
+count as failed, so a wedged probe thread makes the instance unready
+instead of reporting stale success.
+
+A monitor inherited across fork() (a preloaded app under gunicorn) notices
+the new pid and drops the parent's clients and results before probing.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# boto3, requests and pymongo are imported by the probes, in the probe thread,
+# so creating the monitor does not slow down application startup.
+
+DEFAULT_MISTRAL_URL = "https://api.mistral.ai"
+
+# Dependencies each endpoint needs to report healthy
+READINESS_CHECKS = ("mongo", "s3", "mistral", "vector_index")
+GENERATION_CHECKS = ("mongo", "mistral", "vector_index")
+
+
+class HealthMonitor:
+    """Runs dependency probes on an interval and serves their cached results."""
+
+    DEFAULT_INTERVAL_SECONDS = 15
+    DEFAULT_TIMEOUT_SECONDS = 3
+
+    def __init__(
+        self,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        stale_after_seconds: Optional[float] = None,
+    ):
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.stale_after_seconds = stale_after_seconds or 3 * interval_seconds
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self._checked_at = 0.0
+        self._responses: Dict[Tuple[str, ...], Tuple[Dict[str, Any], int]] = {}
+        self._probes: Dict[str, Callable[[], Optional[str]]] = {
+            "mongo": self._probe_mongo,
+            "s3": self._probe_s3,
+            "mistral": self._probe_mistral,
+            "vector_index": self._probe_vector_index,
+        }
+        self._mongo = None
+        self._s3 = None
+        self._http = None
+        self._pid = os.getpid()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "HealthMonitor":
+        """Build a monitor from HEALTH_PROBE_* and HEALTH_STALE_AFTER_SECONDS."""
+        stale_after = os.getenv("HEALTH_STALE_AFTER_SECONDS")
+        return cls(
+            interval_seconds=float(
+                os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", cls.DEFAULT_INTERVAL_SECONDS)
+            ),
+            timeout_seconds=float(
+                os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", cls.DEFAULT_TIMEOUT_SECONDS)
+            ),
+            stale_after_seconds=float(stale_after) if stale_after else None,
+        )
+
+    # Probes: return None when healthy, a short detail string when skipped,
+    # and raise when the dependency is unavailable.
+
+    def _probe_mongo(self) -> Optional[str]:
+        if self._mongo is None:
+            from .database_funcs import get_mongo_client
+
+            timeout_ms = int(self.timeout_seconds * 1000)
+            self._mongo = get_mongo_client(
+                serverSelectionTimeoutMS=timeout_ms,
+                connectTimeoutMS=timeout_ms,
+                socketTimeoutMS=timeout_ms,
+            )
+        self._mongo.admin.command("ping")
+        return None
+
+    def _probe_s3(self) -> Optional[str]:
+        if self._s3 is None:
+            import boto3
+            from botocore.config import Config
+
+            self._s3 = boto3.client(
+                "s3",
+                endpoint_url=os.getenv("AWS_ENDPOINT_URL_S3") or None,
+                config=Config(
+                    connect_timeout=self.timeout_seconds,
+                    read_timeout=self.timeout_seconds,
+                    retries={"max_attempts": 1},
+                ),
+            )
+        bucket = os.getenv("AWS_BUCKET_NAME")
+        if not bucket:
+            raise ValueError("AWS_BUCKET_NAME not set")
+        self._s3.head_bucket(Bucket=bucket)
+        return None
+
+    def _probe_mistral(self) -> Optional[str]:
+        api_key = os.getenv("MISTRAL_KEY")
+        if not api_key:
+            raise ValueError("MISTRAL_KEY not set")
+        if self._http is None:
+            import requests
+
+            self._http = requests.Session()
+        base_url = (os.getenv("MISTRAL_SERVER_URL") or DEFAULT_MISTRAL_URL).rstrip("/")
+        response = self._http.get(
+            f"{base_url}/v1/models",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=self.timeout_seconds,
+        )
+        if response.status_code == 401:
+            raise PermissionError("Mistral API key rejected")
+        response.raise_for_status()
+        return None
+
+    def _probe_vector_index(self) -> Optional[str]:
+        # Imported here: local_retrieval imports the core package
+        from ..core.local_retrieval import retrieval_backend
+        from .vector_index import VectorIndexManager, active_index_name
+
+        if retrieval_backend() == "local":
+            return "skipped: RETRIEVAL_BACKEND=local"
+        self._probe_mongo()
+        collection = self._mongo["bookTestMaker"]["chunkEmbeddings"]
+        name = active_index_name(collection)
+        index = VectorIndexManager(collection).status(name)
+        if not index:
+            raise LookupError(f"vector index '{name}' not found")
+        if not index.get("queryable"):
+            raise RuntimeError(f"vector index '{name}' not queryable (status {index.get('status')})")
+        return None
+
+    def _after_fork(self) -> None:
+        if self._pid == os.getpid():
+            return
+        # Connection pools and results belong to the parent process
+        self._mongo = None
+        self._s3 = None
+        self._http = None
+        self.checks = {}
+        self._responses = {}
+        self._checked_at = 0.0
+        self._pid = os.getpid()
+
+    def run_once(self) -> Dict[str, Dict[str, Any]]:
+        """Run every probe once and publish the results."""
+        self._after_fork()
+        checks: Dict[str, Dict[str, Any]] = {}
+        for name, probe in self._probes.items():
+            start = time.perf_counter()
+            try:
+                detail = probe()
+                check: Dict[str, Any] = {"ok": True}
+                if detail:
+                    check["detail"] = detail
+            except Exception as exc:
+                check = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+            check["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            check["checked_at"] = datetime.now(timezone.utc).isoformat()
+            checks[name] = check
+
+        # Build both responses now so probes only read a prepared dict
+        responses = {
+            names: self._build_response(checks, names)
+            for names in (READINESS_CHECKS, GENERATION_CHECKS)
+        }
+        self.checks = checks
+        self._responses = responses
+        self._checked_at = time.monotonic()
+        return checks
+
+    @staticmethod
+    def _build_response(
+        checks: Dict[str, Dict[str, Any]], names: Tuple[str, ...]
+    ) -> Tuple[Dict[str, Any], int]:
+        selected = {name: checks[name] for name in names}
+        healthy = all(check["ok"] for check in selected.values())
+        return {"status": "ready" if healthy else "unavailable", "checks": selected}, 200 if healthy else 503
+
+    def status(self, names: Tuple[str, ...] = READINESS_CHECKS) -> Tuple[Dict[str, Any], int]:
+        """
+        Return the cached health response for a set of checks.
+
+        Args:
+            names: Checks that must pass (READINESS_CHECKS or GENERATION_CHECKS)
+
+        Returns:
+            (JSON body, HTTP status): 200 when all pass, 503 when any failed,
+            the results are stale, or no probe round has completed yet
+        """
+        cached = self._responses.get(names)
+        if cached is None:
+            return {"status": "starting", "checks": {}}, 503
+        age = time.monotonic() - self._checked_at
+        if age > self.stale_after_seconds:
+            body = dict(cached[0], status="stale", age_seconds=round(age, 1))
+            return body, 503
+        return cached
+
+    def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as exc:
+                print(f"Health probes failed: {exc}")
+            self._stop_event.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start the background probe thread."""
+        self._after_fork()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background probe thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+_monitor: Optional[HealthMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> HealthMonitor:
+    """
+    Get the process-wide health monitor, starting its probe thread on first use.
+
+    Returns:
+        Shared HealthMonitor instance
+    """
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                monitor = HealthMonitor.from_env()
+                monitor.start()
+                _monitor = monitor
+    return _monitor
@@ -0,0 +1,250 @@
+"""Shared, pooled HTTP client for downloading S3 objects.
+
+All downloads go through one requests.Session whose HTTPAdapter keeps
+keep-alive connections open, so fetching the PDFs of a whole book reuses a
+handful of TCP/TLS connections instead of opening one per subchapter.
+Large objects can be fetched as parallel ranged GETs, and batches of objects
+can be prefetched in the background while the caller parses earlier ones.
+"""
+
+import contextvars
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import record_retry, stage_timer
+from .tracing import span
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_TIMEOUT = 60
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+
+class _CountingRetry(Retry):
+    """Retry policy that counts each retry in the retries metric."""
+
+    def increment(self, method=None, url=None, *args, **kwargs):
+        record_retry("http_download")
+        return super().increment(method, url, *args, **kwargs)
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Get the process-wide pooled HTTP session.
+
+    The connection pool size comes from HTTP_POOL_SIZE. Idempotent requests
+    are retried with backoff on connection errors and 5xx responses.
+
+    Returns:
+        Shared requests.Session instance
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(os.getenv("HTTP_POOL_SIZE", DEFAULT_POOL_SIZE))
+                adapter = HTTPAdapter(
+                    pool_connections=pool_size,
+                    pool_maxsize=pool_size,
+                    max_retries=_CountingRetry(
+                        total=3,
+                        backoff_factor=0.5,
+                        status_forcelist=(500, 502, 503, 504),
+                        allowed_methods=frozenset({"GET", "HEAD"}),
+                    ),
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _url_attributes(url: str) -> Dict[str, str]:
+    """
+    Span attributes identifying a download: host and object key only.
+
+    The query string is dropped because presigned S3 URLs carry credentials
+    and signatures there.
+    """
+    parts = urlsplit(url)
+    return {"host": parts.hostname or "", "key": unquote(parts.path.lstrip("/"))}
+
+
+def _download_workers() -> int:
+    return int(os.getenv("HTTP_DOWNLOAD_WORKERS", DEFAULT_DOWNLOAD_WORKERS))
+
+
+def download_bytes(url: str, timeout: int = DEFAULT_TIMEOUT) -> bytes:
+    """
+    Download an object over the pooled session.
+
+    Args:
+        url: Object URL
+        timeout: Seconds to wait for the server
+
+    Returns:
+        Response body
+    """
+    with stage_timer("download", **_url_attributes(url)) as span:
+        response = get_http_session().get(url, timeout=timeout)
+        response.raise_for_status()
+        if span is not None:
+            span.set_attribute("bytes", len(response.content))
+        return response.content
+
+
+def download_range(url: str, start: int, end: int, timeout: int = DEFAULT_TIMEOUT) -> bytes:
+    """
+    Download bytes start..end (inclusive) of an object with a ranged GET.
+
+    Raises:
+        ValueError: If the server ignored the Range header
+    """
+    with span("download_range", start=start, end=end, **_url_attributes(url)):
+        response = get_http_session().get(
+            url, headers={"Range": f"bytes={start}-{end}"}, timeout=timeout
+        )
+    response.raise_for_status()
+    if response.status_code != 206:
+        raise ValueError(f"Server did not honour range request for {_url_attributes(url)['key']}")
+    return response.content
+
+
+def _ranged_size(url: str, timeout: int) -> Optional[int]:
+    """Return the object size when the server supports ranged reads, else None."""
+    response = get_http_session().head(url, timeout=timeout, allow_redirects=True)
+    if not response.ok or response.headers.get("Accept-Ranges", "").lower() != "bytes":
+        return None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _parts(size: int, part_size: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+def download_to_file(
+    url: str,
+    path: str,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: Optional[int] = None,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> int:
+    """
+    Download an object to path.
+
+    Objects larger than part_size are fetched as parallel ranged GETs written
+    at their offsets; smaller objects, or servers without range support, use
+    a single streamed GET.
+
+    Args:
+        url: Object URL
+        path: Destination file path (created or truncated)
+        part_size: Bytes per ranged GET
+        max_workers: Concurrent ranged GETs, defaults to HTTP_DOWNLOAD_WORKERS
+        timeout: Seconds to wait for the server per request
+
+    Returns:
+        Number of bytes written
+    """
+    with stage_timer("download", **_url_attributes(url)) as span:
+        written = _download_to_file(url, path, part_size, max_workers, timeout)
+        if span is not None:
+            span.set_attribute("bytes", written)
+        return written
+
+
+def _download_to_file(
+    url: str,
+    path: str,
+    part_size: int,
+    max_workers: Optional[int],
+    timeout: int,
+) -> int:
+    size = _ranged_size(url, timeout)
+    if size is None or size <= part_size:
+        written = 0
+        with get_http_session().get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            with open(path, "wb") as out:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    out.write(chunk)
+                    written += len(chunk)
+        return written
+
+    with open(path, "wb") as out:
+        out.truncate(size)
+
+    def _fetch(part: Tuple[int, int]) -> None:
+        start, end = part
+        data = download_range(url, start, end, timeout)
+        with open(path, "r+b") as out:
+            out.seek(start)
+            out.write(data)
+
+    with ThreadPoolExecutor(max_workers=max_workers or _download_workers()) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, _fetch, part)
+            for part in _parts(size, part_size)
+        ]
+        for future in futures:
+            future.result()
+    return size
+
+
+def download_many(
+    urls: List[str],
+    max_workers: Optional[int] = None,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> Iterator[bytes]:
+    """
+    Download objects concurrently and yield their bodies in input order.
+
+    At most max_workers downloads run ahead of the consumer, so parsing one
+    object overlaps with downloading the next ones without buffering the whole
+    batch in memory.
+
+    Args:
+        urls: Object URLs
+        max_workers: Concurrent downloads, defaults to HTTP_DOWNLOAD_WORKERS
+        timeout: Seconds to wait for the server per request
+
+    Yields:
+        Response body for each URL; a failed download raises when reached
+    """
+    workers = max_workers or _download_workers()
+    pending: Deque[Future] = deque()
+    remaining = iter(urls)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for url in remaining:
+            # Run in a copy of the caller's context so download spans nest under its span
+            pending.append(executor.submit(contextvars.copy_context().run, download_bytes, url, timeout))
+            if len(pending) >= workers:
+                break
+
+        try:
+            while pending:
+                content = pending.popleft().result()
+                next_url = next(remaining, None)
+                if next_url is not None:
+                    pending.append(
+                        executor.submit(contextvars.copy_context().run, download_bytes, next_url, timeout)
+                    )
+                yield content
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,95 @@
+"""Registry of background jobs, so a stopping worker can drain them.
+
+Ingestion and re-embedding run in threads after their request has returned
+202. A server shutting down (gunicorn's worker_exit hook, see
+gunicorn.conf.py) calls drain(): new submissions are refused, running jobs
+get until the timeout to finish, and the ids of those that did not finish
+are returned so their books can be marked as interrupted.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class JobRegistry:
+    """Starts jobs in daemon threads and tracks them until they finish."""
+
+    def __init__(self):
+        self._jobs: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._draining = False
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    def submit(self, job_id: str, target: Callable[..., Any], *args: Any) -> bool:
+        """
+        Run target(*args) in a background thread.
+
+        Args:
+            job_id: Identifier of the job, e.g. "ingest:<book id>"
+            target: Job function
+            *args: Arguments for target
+
+        Returns:
+            False when the job was not started: the registry is draining, or
+            a job with the same id is still running
+        """
+        def _run() -> None:
+            try:
+                target(*args)
+            finally:
+                with self._lock:
+                    self._jobs.pop(job_id, None)
+
+        with self._lock:
+            if self._draining or job_id in self._jobs:
+                return False
+            thread = threading.Thread(target=_run, name=f"job-{job_id}", daemon=True)
+            self._jobs[job_id] = thread
+            thread.start()
+        return True
+
+    def running(self) -> List[str]:
+        """Return the ids of the jobs still running."""
+        with self._lock:
+            return list(self._jobs)
+
+    def drain(self, timeout: float) -> List[str]:
+        """
+        Refuse new jobs and wait up to timeout seconds for running ones.
+
+        Args:
+            timeout: Seconds to wait in total
+
+        Returns:
+            Ids of the jobs still running when the timeout expired
+        """
+        with self._lock:
+            self._draining = True
+            threads = list(self._jobs.values())
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        return self.running()
+
+
+_registry: Optional[JobRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_job_registry() -> JobRegistry:
+    """
+    Get the process-wide job registry.
+
+    Returns:
+        Shared JobRegistry instance
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = JobRegistry()
+    return _registry
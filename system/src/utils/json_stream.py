@@ -0,0 +1,99 @@
+"""Incremental parsing of streamed JSON model output."""
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class IncrementalJSONArrayParser:
+    """Extracts objects from a top-level JSON array field while the JSON is still streaming.
+
+    Feed text fragments as they arrive from the model; every call returns the
+    objects of the ``key`` array that were completed by that fragment. For
+    ``{"questions": [{...}, {...}]}`` each question is returned as soon as its
+    closing brace arrives, long before the full document is valid JSON.
+    """
+
+    def __init__(self, key: str = "questions"):
+        self.key = key
+        self._text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start: Optional[int] = None
+        self._last_string: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._object_start: Optional[int] = None
+        self._array_done = False
+
+    @property
+    def text(self) -> str:
+        """Return all text fed so far."""
+        return self._text
+
+    def feed(self, fragment: str) -> List[Dict[str, Any]]:
+        """Consume a text fragment and return the array objects it completed."""
+        self._text += fragment
+        completed: List[Dict[str, Any]] = []
+        text = self._text
+
+        for index in range(self._position, len(text)):
+            char = text[index]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        self._last_string = self._loads(text[self._string_start : index + 1])
+                        self._string_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                # Only strings directly inside the root object can be the array key.
+                self._string_start = index if self._depth == 1 else None
+            elif char in "{[":
+                self._depth += 1
+                if (
+                    char == "["
+                    and self._depth == 2
+                    and self._array_depth is None
+                    and not self._array_done
+                    and self._last_string == self.key
+                ):
+                    self._array_depth = self._depth
+                elif (
+                    char == "{"
+                    and self._array_depth is not None
+                    and self._depth == self._array_depth + 1
+                ):
+                    self._object_start = index
+            elif char in "}]":
+                if (
+                    char == "}"
+                    and self._object_start is not None
+                    and self._depth == self._array_depth + 1
+                ):
+                    item = self._loads(text[self._object_start : index + 1])
+                    if isinstance(item, dict):
+                        completed.append(item)
+                    self._object_start = None
+                elif char == "]" and self._depth == self._array_depth:
+                    self._array_depth = None
+                    self._array_done = True
+                self._depth -= 1
+
+        self._position = len(text)
+        return completed
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as exc:
+            print(f"Skipping malformed streamed JSON value: {exc}")
+            return None
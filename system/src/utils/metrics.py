@@ -0,0 +1,205 @@
+"""Prometheus metrics for the ingestion and generation pipelines.
+
+Stage durations are recorded with time.perf_counter into one histogram
+labelled by stage, so download, extract, chunk, embed, vector_search,
+generate, evaluate and insert can be compared side by side. Each timed stage
+is also a tracing span (see tracing.py). Counters track LLM calls and tokens,
+retries, cache hits and admission decisions; a histogram tracks how many
+tokens each section of a generation prompt takes. Long ingestion loops
+(splitting, chunking, embedding) report the items they have processed and
+still have to process.
+
+When PROMETHEUS_MULTIPROC_DIR is set (e.g. under a multi-worker server) the
+metrics of all worker processes are aggregated on /metrics.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from .tracing import Span, span
+
+STAGE_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300,
+)
+
+PROMPT_TOKEN_BUCKETS = (
+    50, 100, 250, 500, 1000, 2000, 4000, 8000, 12000, 16000, 24000, 32000, 64000,
+)
+
+STAGE_SECONDS = Histogram(
+    "booktestmaker_stage_seconds",
+    "Duration of pipeline stages",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+FUNCTION_SECONDS = Histogram(
+    "booktestmaker_function_seconds",
+    "Duration of functions wrapped with function_timer",
+    ["function"],
+    buckets=STAGE_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+    "booktestmaker_prompt_tokens",
+    "Tokens per section of generation prompts after budgeting (total is the whole prompt)",
+    ["section"],
+    buckets=PROMPT_TOKEN_BUCKETS,
+)
+LLM_CALLS = Counter(
+    "booktestmaker_llm_calls_total",
+    "Calls made to model APIs",
+    ["model", "outcome"],
+)
+LLM_TOKENS = Counter(
+    "booktestmaker_llm_tokens_total",
+    "Tokens reported by model APIs",
+    ["model", "kind"],
+)
+RETRIES = Counter(
+    "booktestmaker_retries_total",
+    "Retried upstream requests",
+    ["operation"],
+)
+CACHE_REQUESTS = Counter(
+    "booktestmaker_cache_requests_total",
+    "Cache lookups by cache, tier and result",
+    ["cache", "result"],
+)
+COALESCED_CALLS = Counter(
+    "booktestmaker_coalesced_calls_total",
+    "Calls that shared an identical in-flight execution",
+    ["flight"],
+)
+
+ADMISSION_DECISIONS = Counter(
+    "booktestmaker_admission_decisions_total",
+    "Admission decisions by pool and outcome (admitted, queue_full, user_queue_full, timeout)",
+    ["pool", "outcome"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "booktestmaker_admission_wait_seconds",
+    "Time requests spent queued before admission or timing out",
+    ["pool"],
+    buckets=STAGE_BUCKETS,
+)
+
+PIPELINE_ITEMS = Counter(
+    "booktestmaker_pipeline_items_total",
+    "Items (subchapters, chunks) processed by ingestion stage",
+    ["stage"],
+)
+PIPELINE_ITEMS_PENDING = Gauge(
+    "booktestmaker_pipeline_items_pending",
+    "Items the running ingestion stages still have to process",
+    ["stage"],
+    multiprocess_mode="livesum",
+)
+
+
+@contextmanager
+def stage_timer(stage: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Record the duration of the enclosed block (including failures) under stage.
+
+    The block is traced as a span named after the stage, carrying attributes;
+    the span is yielded (None when tracing is off).
+    """
+    start = time.perf_counter()
+    try:
+        with span(stage, **attributes) as current:
+            yield current
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def record_llm_call(model: Optional[str], outcome: str = "ok") -> None:
+    LLM_CALLS.labels(model=model or "unknown", outcome=outcome).inc()
+
+
+def record_llm_tokens(model: Optional[str], prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+    """Add token usage reported by a model API."""
+    model = model or "unknown"
+    if prompt_tokens:
+        LLM_TOKENS.labels(model=model, kind="prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(model=model, kind="completion").inc(completion_tokens)
+
+
+def record_prompt_tokens(section_tokens: Dict[str, int]) -> None:
+    """Observe the token count of each section of a built prompt."""
+    for section, tokens in section_tokens.items():
+        PROMPT_TOKENS.labels(section=section).observe(tokens)
+
+
+def record_retry(operation: str) -> None:
+    RETRIES.labels(operation=operation).inc()
+
+
+def record_cache(cache: str, result: str, count: int = 1) -> None:
+    """Count cache lookups; result is e.g. "memory_hit", "hit" or "miss"."""
+    if count:
+        CACHE_REQUESTS.labels(cache=cache, result=result).inc(count)
+
+
+def record_coalesced(flight: str) -> None:
+    COALESCED_CALLS.labels(flight=flight or "unnamed").inc()
+
+
+def record_admission(pool: str, outcome: str, wait_seconds: Optional[float] = None) -> None:
+    ADMISSION_DECISIONS.labels(pool=pool, outcome=outcome).inc()
+    if wait_seconds is not None:
+        ADMISSION_WAIT_SECONDS.labels(pool=pool).observe(wait_seconds)
+
+
+@contextmanager
+def progress(stage: str, total: int) -> Iterator[Callable[[], None]]:
+    """
+    Track a stage working through total items; call the yielded function after each item.
+
+    Items not completed when the block exits (e.g. on an error) are removed
+    from the pending gauge.
+    """
+    pending = PIPELINE_ITEMS_PENDING.labels(stage=stage)
+    pending.inc(total)
+    done = 0
+
+    def advance() -> None:
+        nonlocal done
+        done += 1
+        PIPELINE_ITEMS.labels(stage=stage).inc()
+        pending.dec()
+
+    try:
+        yield advance
+    finally:
+        pending.dec(total - done)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        Tuple of (body, content type)
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,65 @@
+"""Maximal marginal relevance (MMR) selection of retrieved passages."""
+
+from typing import Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+def mmr_select(
+    query_embedding: Sequence[float],
+    candidate_embeddings: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float = 0.7,
+    groups: Optional[Sequence[Hashable]] = None,
+    max_per_group: Optional[int] = None,
+) -> List[int]:
+    """
+    Pick k candidates that are relevant to the query but not redundant with each other.
+
+    Each step takes the candidate maximising
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max(sim(c, s) for s already selected),
+    using cosine similarity. lambda_mult=1 is plain top-k by similarity.
+
+    Args:
+        query_embedding: Query vector
+        candidate_embeddings: Candidate vectors
+        k: Number of candidates to select
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+        groups: Optional group label per candidate, e.g. its subchapter
+        max_per_group: At most this many selections per group when set
+
+    Returns:
+        Indices into candidate_embeddings, in selection order
+    """
+    if not len(candidate_embeddings) or k <= 0:
+        return []
+
+    vectors = np.asarray(candidate_embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    available = np.ones(len(vectors), dtype=bool)
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    group_counts: dict = {}
+    selected: List[int] = []
+
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+
+        selected.append(best)
+        available[best] = False
+        redundancy = similarity[best] if len(selected) == 1 else np.maximum(redundancy, similarity[best])
+
+        if groups is not None and max_per_group:
+            group = groups[best]
+            group_counts[group] = group_counts.get(group, 0) + 1
+            if group_counts[group] >= max_per_group:
+                available &= np.array([label != group for label in groups])
+
+    return selected
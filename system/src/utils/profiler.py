@@ -0,0 +1,220 @@
+"""Low-overhead sampling profiler for long-running background jobs.
+
+A daemon thread snapshots the Python stacks of the profiled job every
+PROFILE_INTERVAL_MS with sys._current_frames(), so the job itself runs
+uninstrumented; the cost is one stack walk per sampled thread per
+interval. Threads started while the job runs (download and S3 pools) are
+sampled too, while threads that already existed (other requests, the
+server) are not.
+
+Samples are aggregated into identical stacks and written to
+PROFILE_DIR/<job id>/ as:
+
+- profile.folded: collapsed stacks ("frame;frame;frame count"), for
+  flamegraph.pl, speedscope or inferno
+- profile.speedscope.json: speedscope's sampled-profile format
+- meta.json: job id, kind, timing and sample counts
+
+Profiling is opt-in per job: pass profile=True from the request, or list
+job ids in PROFILE_JOB_IDS ("*" profiles every job).
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_INTERVAL_MS = 10.0
+
+# (function name, file, first line of the function)
+Frame = Tuple[str, str, int]
+
+
+def profiling_requested(job_id: Any, flag: bool = False) -> bool:
+    """
+    Decide whether a job should be profiled.
+
+    Args:
+        job_id: Job identifier (e.g. the book id)
+        flag: Profiling requested explicitly, e.g. by a request field
+
+    Returns:
+        True if the flag is set or PROFILE_JOB_IDS lists the job (or is "*")
+    """
+    if flag:
+        return True
+    listed = {item.strip() for item in os.getenv("PROFILE_JOB_IDS", "").split(",") if item.strip()}
+    return "*" in listed or str(job_id) in listed
+
+
+class SamplingProfiler:
+    """Samples the stacks of one thread, and of the threads it starts, on a timer."""
+
+    def __init__(self, interval_ms: Optional[float] = None, thread_id: Optional[int] = None):
+        self.interval = (interval_ms or float(os.getenv("PROFILE_INTERVAL_MS") or DEFAULT_INTERVAL_MS)) / 1000
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._excluded: Set[int] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._excluded = set(sys._current_frames()) - {self.thread_id}
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.duration = time.time() - self.started_at
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        self._excluded.add(own_id)
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self._excluded:
+                    continue
+                stack: List[Frame] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                label = "job" if thread_id == self.thread_id else "worker"
+                self.stacks[(label,) + tuple(stack)] += 1
+            self.samples += 1
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    @staticmethod
+    def _frame_name(frame: Frame) -> str:
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def collapsed(self) -> str:
+        """Return the samples as collapsed stacks, heaviest first."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            thread_label, frames = stack[0], stack[1:]
+            names = [thread_label] + [self._frame_name(frame) for frame in frames]
+            lines.append(f"{';'.join(name.replace(';', ':') for name in names)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """Return the samples in speedscope's file format, one sampled profile per thread kind."""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        profiles: Dict[str, Dict[str, Any]] = {}
+        for stack, count in self.stacks.most_common():
+            thread_label, stack_frames = stack[0], stack[1:]
+            sample = []
+            for frame in stack_frames:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                sample.append(index[frame])
+            profile = profiles.setdefault(thread_label, {
+                "type": "sampled",
+                "name": f"{name} ({thread_label} threads)",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": 0,
+                "samples": [],
+                "weights": [],
+            })
+            weight = round(count * self.interval, 6)
+            profile["samples"].append(sample)
+            profile["weights"].append(weight)
+            profile["endValue"] = round(profile["endValue"] + weight, 6)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "booktestmaker-sampling-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+
+    def save(self, directory: str, job_id: Any, kind: str) -> Dict[str, Any]:
+        """
+        Write the profile files for a job.
+
+        Args:
+            directory: Output directory, created if missing
+            job_id: Job identifier recorded in the metadata
+            kind: Job kind (e.g. "ingest", "reembed")
+
+        Returns:
+            The metadata written to meta.json, including the file paths
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = {
+            "collapsed": os.path.join(directory, "profile.folded"),
+            "speedscope": os.path.join(directory, "profile.speedscope.json"),
+        }
+        with open(paths["collapsed"], "w", encoding="utf-8") as out:
+            out.write(self.collapsed())
+        with open(paths["speedscope"], "w", encoding="utf-8") as out:
+            json.dump(self.speedscope(f"{kind} {job_id}"), out)
+
+        meta = {
+            "job_id": str(job_id),
+            "kind": kind,
+            "started_at": self.started_at,
+            "duration_s": round(self.duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "unique_stacks": len(self.stacks),
+            "files": paths,
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as out:
+            json.dump(meta, out, indent=2)
+        return meta
+
+
+@contextmanager
+def profile_job(job_id: Any, kind: str, enabled: bool) -> Iterator[Dict[str, Any]]:
+    """
+    Profile the enclosed block when enabled and save the results under PROFILE_DIR.
+
+    Args:
+        job_id: Job identifier, also the name of the output directory
+        kind: Job kind recorded in the metadata
+        enabled: Whether to profile; when False the block runs untouched
+
+    Yields:
+        A dict that holds the saved metadata once the block has finished
+        (empty while running, or when profiling is disabled or failed)
+    """
+    result: Dict[str, Any] = {}
+    if not enabled:
+        yield result
+        return
+    profiler = SamplingProfiler().start()
+    try:
+        yield result
+    finally:
+        profiler.stop()
+        directory = os.path.join(os.getenv("PROFILE_DIR") or DEFAULT_PROFILE_DIR, str(job_id))
+        try:
+            result.update(profiler.save(directory, job_id, kind))
+            print(f"Profile for {kind} job {job_id} written to {directory}")
+        except OSError as exc:
+            print(f"Saving profile for {job_id} failed: {exc}")
@@ -0,0 +1,162 @@
+"""Token budgeting for question generation prompts."""
+
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .tokenizer import Tokenizer
+
+
+class PromptBudgeter:
+    """Fits subchapter text and RAG context into a fixed token budget.
+
+    Token counts come from the Mistral tokenizer, so the budget maps directly
+    onto what the chat model is billed for. Context entries are dropped
+    lowest-score first, and subchapter text that does not fit is reduced to a
+    few evenly spaced windows so the prompt still covers the whole subchapter.
+    """
+
+    DEFAULT_TOKEN_BUDGET = 24000
+    DEFAULT_TEXT_SHARE = 0.6
+    DEFAULT_MAX_WINDOWS = 3
+    MIN_WINDOW_TOKENS = 512
+    WINDOW_SEPARATOR = "\n[...]\n"
+
+    def __init__(
+        self,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        text_share: float = DEFAULT_TEXT_SHARE,
+        max_windows: int = DEFAULT_MAX_WINDOWS,
+        tokenizer: Optional[Tokenizer] = None,
+    ):
+        if token_budget <= 0:
+            raise ValueError("token_budget must be positive")
+        if not 0 < text_share <= 1:
+            raise ValueError("text_share must be in (0, 1]")
+
+        self.token_budget = token_budget
+        self.text_share = text_share
+        self.max_windows = max(1, max_windows)
+        self.tokenizer = tokenizer or Tokenizer()
+
+    @classmethod
+    def from_env(
+        cls,
+        tokenizer: Optional[Tokenizer] = None,
+        token_budget: Optional[int] = None,
+    ) -> "PromptBudgeter":
+        """
+        Build a budgeter with token_budget, or PROMPT_TOKEN_BUDGET when it is not given.
+
+        Args:
+            tokenizer: Shared tokenizer; a new one is built when omitted
+            token_budget: Explicit budget overriding the environment
+        """
+        if token_budget is None:
+            token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", cls.DEFAULT_TOKEN_BUDGET))
+        return cls(token_budget=token_budget, tokenizer=tokenizer)
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_bos_token=False, add_preceding_space=False)
+
+    def _decode(self, token_ids: List[int]) -> str:
+        text = self.tokenizer.decode(token_ids, add_bos_token=False, add_preceding_space=False)
+        # Cutting a token list can split a multi-byte character; drop the leftovers.
+        return text.encode("utf-8", "ignore").decode("utf-8")
+
+    def count_tokens(self, text: str) -> int:
+        """Return the number of tokens in text."""
+        if not text:
+            return 0
+        return len(self._encode(text))
+
+    def window_text(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """Reduce text to at most max_tokens tokens using evenly spaced windows.
+
+        Returns:
+            Tuple of (windowed text, token count of the windowed text)
+        """
+        if max_tokens <= 0 or not text:
+            return "", 0
+
+        token_ids = self._encode(text)
+        if len(token_ids) <= max_tokens:
+            return text, len(token_ids)
+
+        separator_tokens = self.count_tokens(self.WINDOW_SEPARATOR)
+        windows = min(self.max_windows, max(1, max_tokens // self.MIN_WINDOW_TOKENS))
+        if windows == 1:
+            return self._decode(token_ids[:max_tokens]), max_tokens
+
+        window_size = (max_tokens - separator_tokens * (windows - 1)) // windows
+        stride = (len(token_ids) - window_size) / (windows - 1)
+        parts = []
+        for index in range(windows):
+            start = int(round(index * stride))
+            parts.append(self._decode(token_ids[start : start + window_size]))
+
+        used = window_size * windows + separator_tokens * (windows - 1)
+        return self.WINDOW_SEPARATOR.join(parts), used
+
+    def fit(
+        self,
+        fixed_sections: Dict[str, str],
+        subchapter_text: str,
+        context_entries: List[Dict[str, Any]],
+        format_context: Callable[[Dict[str, Any]], str],
+    ) -> Dict[str, Any]:
+        """Fit subchapter text and context entries into the token budget.
+
+        Args:
+            fixed_sections: Prompt sections that are always sent, keyed by name
+            subchapter_text: Full subchapter text
+            context_entries: Retrieved context entries, optionally with a "score"
+            format_context: Renders a context entry exactly as it appears in the prompt
+
+        Returns:
+            Dict with:
+                - subchapter_text: str - text to place in the prompt
+                - context_entries: List[Dict] - kept entries, in their original order
+                - section_tokens: Dict[str, int] - tokens per prompt section
+                - dropped_context: int - number of context entries dropped
+                - text_windowed: bool - whether the subchapter text was cut
+        """
+        section_tokens = {
+            name: self.count_tokens(section) for name, section in fixed_sections.items()
+        }
+        available = max(self.token_budget - sum(section_tokens.values()), 0)
+
+        context_tokens = [self.count_tokens(format_context(entry)) for entry in context_entries]
+        text_tokens = self.count_tokens(subchapter_text)
+
+        # Text may always use its share; it may use more when context leaves room.
+        text_cap = max(available - sum(context_tokens), int(available * self.text_share))
+        fitted_text = subchapter_text
+        text_windowed = False
+        if text_tokens > text_cap:
+            fitted_text, text_tokens = self.window_text(subchapter_text, text_cap)
+            text_windowed = True
+
+        remaining = available - text_tokens
+        ranked = sorted(
+            range(len(context_entries)),
+            key=lambda i: context_entries[i].get("score", 0.0),
+            reverse=True,
+        )
+        kept: List[int] = []
+        for index in ranked:
+            if context_tokens[index] <= remaining:
+                kept.append(index)
+                remaining -= context_tokens[index]
+        kept.sort()
+
+        section_tokens["subchapter_text"] = text_tokens
+        section_tokens["context"] = sum(context_tokens[i] for i in kept)
+        section_tokens["total"] = sum(section_tokens.values())
+
+        return {
+            "subchapter_text": fitted_text,
+            "context_entries": [context_entries[i] for i in kept],
+            "section_tokens": section_tokens,
+            "dropped_context": len(context_entries) - len(kept),
+            "text_windowed": text_windowed,
+        }
@@ -0,0 +1,192 @@
+"""Content-addressed cache for AI model responses.
+
+Responses are keyed by the SHA-256 of (model name, system message, prompt).
+Lookups go through an in-process LRU first and fall back to a MongoDB
+collection shared by all workers. Entries expire after a TTL, and the Mongo
+tier is trimmed to a maximum size by least recent access.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+
+from .database_funcs import get_mongo_client
+from .metrics import record_cache
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + MongoDB) cache for model responses."""
+
+    DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+    DEFAULT_MAX_ENTRIES = 50000
+    DEFAULT_MEMORY_ENTRIES = 256
+    EVICTION_CHECK_INTERVAL = 100
+
+    def __init__(
+        self,
+        collection: Optional[Collection] = None,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._collection = collection
+        self._indexes_ready = False
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_eviction = 0
+
+    @staticmethod
+    def make_key(model_name: str, system_message: str, prompt: str) -> str:
+        """Return the content address for a model call."""
+        payload = json.dumps([model_name or "", system_message or "", prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def collection(self) -> Collection:
+        if self._collection is None:
+            self._collection = get_mongo_client()["bookTestMaker"]["llmResponseCache"]
+        if not self._indexes_ready:
+            self._collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._collection.create_index([("lastAccessedAt", ASCENDING)])
+            self._indexes_ready = True
+        return self._collection
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_put(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        value = self._memory_get(key)
+        if value is not None:
+            record_cache("response", "memory_hit")
+            return value
+
+        try:
+            now = datetime.utcnow()
+            doc = self.collection.find_one_and_update(
+                {"_id": key, "expiresAt": {"$gt": now}},
+                {"$set": {"lastAccessedAt": now}, "$inc": {"hits": 1}},
+                projection={"value": 1, "expiresAt": 1},
+            )
+        except Exception as exc:
+            print(f"Response cache lookup failed: {exc}")
+            record_cache("response", "error")
+            return None
+
+        if not doc:
+            record_cache("response", "miss")
+            return None
+        record_cache("response", "hit")
+        remaining = (doc["expiresAt"] - datetime.utcnow()).total_seconds()
+        self._memory_put(key, doc["value"], time.time() + min(remaining, self.ttl_seconds))
+        return doc["value"]
+
+    def put(self, key: str, value: Any, model_name: str = "") -> None:
+        """Store value under key in both tiers."""
+        self._memory_put(key, value, time.time() + self.ttl_seconds)
+
+        now = datetime.utcnow()
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "model": model_name,
+                    "value": value,
+                    "createdAt": now,
+                    "lastAccessedAt": now,
+                    "expiresAt": now + timedelta(seconds=self.ttl_seconds),
+                    "hits": 0,
+                },
+                upsert=True,
+            )
+        except Exception as exc:
+            print(f"Response cache write failed: {exc}")
+            return
+
+        self._puts_since_eviction += 1
+        if self._puts_since_eviction >= self.EVICTION_CHECK_INTERVAL:
+            self._puts_since_eviction = 0
+            self.evict()
+
+    def evict(self) -> int:
+        """Trim the Mongo tier to max_entries by least recent access."""
+        try:
+            excess = self.collection.estimated_document_count() - self.max_entries
+            if excess <= 0:
+                return 0
+            stale = self.collection.find({}, {"_id": 1}).sort("lastAccessedAt", ASCENDING).limit(excess)
+            result = self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in stale]}})
+            return result.deleted_count
+        except Exception as exc:
+            print(f"Response cache eviction failed: {exc}")
+            return 0
+
+    def clear_memory(self) -> None:
+        """Drop the in-process tier."""
+        with self._lock:
+            self._memory.clear()
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the process-wide response cache.
+
+    Configured with LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_ENTRIES and LLM_CACHE_MEMORY_ENTRIES. Off unless
+    LLM_CACHE_ENABLED is set: with the cache on, identical generation
+    requests are answered with the same stored questions.
+
+    Returns:
+        Shared ResponseCache instance, or None when caching is disabled
+    """
+    global _response_cache
+    if os.getenv("LLM_CACHE_ENABLED", "false").strip().lower() not in {"1", "true", "yes"}:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    ttl_seconds=int(
+                        os.getenv("LLM_CACHE_TTL_SECONDS", ResponseCache.DEFAULT_TTL_SECONDS)
+                    ),
+                    max_entries=int(
+                        os.getenv("LLM_CACHE_MAX_ENTRIES", ResponseCache.DEFAULT_MAX_ENTRIES)
+                    ),
+                    memory_entries=int(
+                        os.getenv("LLM_CACHE_MEMORY_ENTRIES", ResponseCache.DEFAULT_MEMORY_ENTRIES)
+                    ),
+                )
+    return _response_cache
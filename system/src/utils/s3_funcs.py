@@ -2,12 +2,12 @@ import os
 from typing import Optional, List
 import boto3
 from botocore.exceptions import ClientError
-from dotenv import load_dotenv
+from .env import load_env
 
 """S3 utility functions for AWS S3 operations."""
 
 
-load_dotenv()
+load_env()
 
 def get_s3_client():
   """
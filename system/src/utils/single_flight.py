@@ -0,0 +1,158 @@
+"""Single-flight coalescing of concurrent identical work."""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from .metrics import record_coalesced
+
+T = TypeVar("T")
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared call whose leader was cancelled so followers re-run it."""
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its result (or exception). Nothing is cached
+    once the call completes, so later callers start a fresh execution.
+    """
+
+    enabled = os.getenv("SINGLE_FLIGHT_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.executions = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Returns:
+            Tuple of (result, shared) where shared is True when the result was
+            produced by another caller's execution; the caller that ran fn
+            always gets False
+        """
+        if not self.enabled:
+            with self._lock:
+                self.executions += 1
+            return fn(), False
+
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                leader = False
+            else:
+                future = Future()
+                self._calls[key] = future
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            record_coalesced(self.name)
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            with self._lock:
+                del self._calls[key]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of executions and of callers that shared a result."""
+        with self._lock:
+            return {"executions": self.executions, "shared": self.shared}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.executions = 0
+            self.shared = 0
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for coroutines on the same event loop.
+
+    Follows SingleFlight.enabled. Calls are grouped per event loop, so the same
+    instance can be used from several threads that each run their own loop. If
+    the leading task is cancelled, its followers are not: one of them takes
+    over and runs fn again.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.executions = 0
+        self.shared = 0
+        self._calls: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self._waiters: Dict[Tuple[int, Hashable], int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Await fn once for all concurrent callers with the same key.
+
+        Returns:
+            Tuple of (result, shared) as for SingleFlight.do
+        """
+        if not SingleFlight.enabled:
+            self.executions += 1
+            return await fn(), False
+
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        while True:
+            future = self._calls.get(call_key)
+            if future is None:
+                break
+            self.shared += 1
+            self._waiters[call_key] += 1
+            record_coalesced(self.name)
+            try:
+                return await asyncio.shield(future), True
+            except _LeaderCancelled:
+                # The leader's task was cancelled; the first follower to get
+                # here becomes the new leader and the rest wait on it
+                self.shared -= 1
+                continue
+
+        future = loop.create_future()
+        self._calls[call_key] = future
+        self._waiters[call_key] = 0
+        self.executions += 1
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            del self._calls[call_key]
+            waiters = self._waiters.pop(call_key, 0)
+            future.set_exception(_LeaderCancelled())
+            if not waiters:
+                future.exception()
+            raise
+        except BaseException as exc:
+            del self._calls[call_key]
+            waiters = self._waiters.pop(call_key, 0)
+            future.set_exception(exc)
+            if not waiters:
+                # Mark the exception as retrieved when nobody else is waiting
+                future.exception()
+            raise
+
+        del self._calls[call_key]
+        self._waiters.pop(call_key, None)
+        future.set_result(result)
+        return result, False
@@ -1,10 +1,19 @@
+import functools
 import time
 
+from .metrics import FUNCTION_SECONDS
+
 def function_timer(func):
+  """
+  Record the wall time of each call in the booktestmaker_function_seconds histogram.
+  """
+  histogram = FUNCTION_SECONDS.labels(function=func.__qualname__)
+
+  @functools.wraps(func)
   def wrapper(*args, **kwargs):
-    start_time = time.time()
-    result = func(*args, **kwargs)
-    end_time = time.time()
-    print(f"Function {func.__name__} took {end_time - start_time} seconds")
-    return result
-  return wrapper
\ No newline at end of file
+    start_time = time.perf_counter()
+    try:
+      return func(*args, **kwargs)
+    finally:
+      histogram.observe(time.perf_counter() - start_time)
+  return wrapper
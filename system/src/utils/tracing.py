@@ -0,0 +1,239 @@
+"""Lightweight OpenTelemetry-style tracing for the ingestion and generation pipelines.
+
+A span covers one stage or outbound call; spans opened inside another span
+become its children through a context variable, so nesting follows the call
+stack across threads started with copy_context() and across asyncio tasks.
+Finished spans are written as OTLP-shaped JSON lines to TRACE_EXPORT_PATH,
+which stands in for a collector: scripts/trace_report.py turns the file into
+per-stage latency breakdowns.
+
+Tracing is off unless TRACING_ENABLED is set; disabled spans cost one
+attribute lookup.
+"""
+
+import atexit
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+# Query strings of URLs quoted in exception messages (presigned URL signatures)
+_URL_QUERY = re.compile(r"(https?://[^\s?#]+)[?#][^\s'\"]*")
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = (
+        "tracer", "name", "trace_id", "span_id", "parent_id",
+        "start_ns", "end_ns", "attributes", "status", "error",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        parent: Optional["Span"] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "OK"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "ERROR"
+        self.error = _URL_QUERY.sub(r"\1", f"{type(exc).__name__}: {exc}")
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer.exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "service": self.tracer.service_name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.error},
+        }
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a JSON-lines file, buffered and thread-safe."""
+
+    DEFAULT_BUFFER_SIZE = 64
+
+    def __init__(self, path: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._buffer.append(line)
+            # Root spans end a trace; write it out so it can be inspected right away
+            if span.parent_id is None or len(self._buffer) >= self.buffer_size:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as out:
+                out.write("\n".join(self._buffer) + "\n")
+        except OSError as exc:
+            print(f"Trace export failed: {exc}")
+        self._buffer = []
+
+
+class InMemorySpanExporter:
+    """Keeps finished spans in a list, for benchmarks and offline checks."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def flush(self) -> None:
+        pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans = []
+
+
+class Tracer:
+    """Creates spans and hands finished ones to an exporter."""
+
+    DEFAULT_EXPORT_PATH = "traces/spans.jsonl"
+
+    def __init__(self, exporter: Any = None, enabled: bool = True, service_name: str = "booktestmaker"):
+        self.exporter = exporter
+        self.enabled = enabled and exporter is not None
+        self.service_name = service_name
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """
+        Build the tracer from TRACING_ENABLED, TRACE_EXPORT_PATH and TRACE_SERVICE_NAME.
+        """
+        enabled = os.getenv("TRACING_ENABLED", "false").strip().lower() in {"1", "true", "yes"}
+        if not enabled:
+            return cls(enabled=False)
+        exporter = JsonlSpanExporter(os.getenv("TRACE_EXPORT_PATH") or cls.DEFAULT_EXPORT_PATH)
+        atexit.register(exporter.flush)
+        return cls(exporter, service_name=os.getenv("TRACE_SERVICE_NAME", "booktestmaker"))
+
+    def start_span(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Span] = None,
+    ) -> Optional[Span]:
+        """
+        Start a span without making it current; the caller must end() it.
+
+        Used where a block yields control (e.g. streaming generators), so the
+        span must not become the parent of the consumer's work.
+        """
+        if not self.enabled:
+            return None
+        return Span(self, name, parent or _current_span.get(), attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Time the enclosed block as a child of the current span."""
+        if not self.enabled:
+            yield None
+            return
+        span = Span(self, name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Get the process-wide tracer.
+
+    Returns:
+        Shared Tracer instance, configured from the environment on first use
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer.from_env()
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    """Replace the process-wide tracer, e.g. with an InMemorySpanExporter one."""
+    global _tracer
+    _tracer = tracer
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Open a span on the process-wide tracer; usable as a context manager or decorator.
+
+    Args:
+        name: Span name, e.g. the pipeline stage or outbound call
+        **attributes: Span attributes such as IDs or sizes
+    """
+    with get_tracer().span(name, **attributes) as current:
+        yield current
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
@@ -0,0 +1,354 @@
+"""Token, call, latency and cost accounting for model usage.
+
+The model wrappers (src/models/ai_models.py) report each API call with its
+latency, the token usage the API returned (pages for OCR), and each response
+served from a cache or joined in flight instead of being paid for again.
+Reports go to the innermost open usage scope and every scope enclosing it.
+Scopes follow the call stack through a context variable, like tracing spans:
+
+- "ingest" / "reembed": one pipeline run for a book
+- "generation_request": one call of generate_for_subchapters
+- "generation_subchapter": one subchapter, inside a request or a pool top-up
+
+When a scope closes its totals, broken down by stage and model, are stored
+in the usageRecords collection, priced with USAGE_PRICES. Book reports sum
+the run and subchapter records (request records hold the same calls again,
+grouped per request). Tokens, latency and cost saved by cache hits are
+estimates: prompt and response length at CHARS_PER_TOKEN characters per
+token, and the model's average call latency in this process.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+
+from .database_funcs import get_mongo_client
+
+CHARS_PER_TOKEN = 4
+
+# Scopes whose records add up to a book's usage without counting a call twice
+BOOK_SCOPES = ("ingest", "reembed", "generation_subchapter")
+
+_current_scope: ContextVar[Optional["UsageScope"]] = ContextVar("usage_scope", default=None)
+
+# Average call latency per model, for estimating the latency cache hits saved
+_model_latency_ms: Dict[str, float] = {}
+
+_COUNTERS = (
+    "calls", "errors", "promptTokens", "completionTokens", "pages", "latencyMs",
+    "cacheHits", "savedPromptTokens", "savedCompletionTokens", "savedPages", "savedLatencyMs",
+)
+
+
+class UsageScope:
+    """Usage accumulated by one pipeline run, generation request or subchapter."""
+
+    def __init__(self, scope: str, parent: Optional["UsageScope"] = None, **attributes: Any):
+        self.scope = scope
+        self.parent = parent
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        if parent is not None and "requestId" in parent.attributes:
+            # Subchapter records point back at their request
+            self.attributes.setdefault("requestId", parent.attributes["requestId"])
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._usage: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, model: str, **amounts: float) -> None:
+        """Add amounts (see _COUNTERS) to the (stage, model) entry."""
+        with self._lock:
+            entry = self._usage.get((stage, model))
+            if entry is None:
+                entry = self._usage[(stage, model)] = dict.fromkeys(_COUNTERS, 0)
+            for name, amount in amounts.items():
+                entry[name] += amount
+
+    @property
+    def empty(self) -> bool:
+        return not self._usage
+
+    def to_document(self, prices: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+        """Build the usageRecords document, pricing each entry with prices."""
+        usage = []
+        with self._lock:
+            entries = [(stage, model, dict(entry)) for (stage, model), entry in self._usage.items()]
+        for stage, model, entry in entries:
+            price = prices.get(model, {})
+            entry["latencyMs"] = round(entry["latencyMs"], 1)
+            entry["savedLatencyMs"] = round(entry["savedLatencyMs"], 1)
+            entry["costUsd"] = _cost(price, entry["promptTokens"], entry["completionTokens"], entry["pages"])
+            entry["savedCostUsd"] = _cost(
+                price, entry["savedPromptTokens"], entry["savedCompletionTokens"], entry["savedPages"]
+            )
+            usage.append({"stage": stage, "model": model, **entry})
+
+        totals = {
+            name: sum(entry[name] for entry in usage)
+            for name in ("calls", "errors", "promptTokens", "completionTokens", "pages", "latencyMs",
+                         "cacheHits", "savedLatencyMs", "costUsd", "savedCostUsd")
+        }
+        totals["tokens"] = totals["promptTokens"] + totals["completionTokens"]
+        return {
+            "scope": self.scope,
+            **self.attributes,
+            "startedAt": self.started_at,
+            "durationMs": round((time.perf_counter() - self._start) * 1000, 1),
+            "usage": usage,
+            "totals": totals,
+        }
+
+
+def _cost(price: Dict[str, float], prompt_tokens: float, completion_tokens: float, pages: float) -> float:
+    # Token prices are per million tokens, OCR prices per page
+    return round(
+        prompt_tokens * price.get("prompt", 0) / 1e6
+        + completion_tokens * price.get("completion", 0) / 1e6
+        + pages * price.get("page", 0),
+        6,
+    )
+
+
+def _record(stage: str, model: Optional[str], **amounts: float) -> None:
+    scope = _current_scope.get()
+    while scope is not None:
+        scope.add(stage, model or "unknown", **amounts)
+        scope = scope.parent
+
+
+def record_model_call(stage: str, model: Optional[str], seconds: float, error: bool = False) -> None:
+    """Count one model API call and its latency."""
+    latency_ms = seconds * 1000
+    if not error:
+        average = _model_latency_ms.get(model or "unknown")
+        _model_latency_ms[model or "unknown"] = (
+            latency_ms if average is None else 0.9 * average + 0.1 * latency_ms
+        )
+    _record(stage, model, calls=1, errors=int(error), latencyMs=latency_ms)
+
+
+def record_model_usage(
+    stage: str,
+    model: Optional[str],
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    pages: int = 0,
+) -> None:
+    """Add the tokens (or OCR pages) an API reported for a call."""
+    if prompt_tokens or completion_tokens or pages:
+        _record(stage, model, promptTokens=prompt_tokens, completionTokens=completion_tokens, pages=pages)
+
+
+def record_cache_hit(
+    stage: str,
+    model: Optional[str],
+    count: int = 1,
+    prompt_chars: int = 0,
+    completion_chars: int = 0,
+    pages: int = 0,
+) -> None:
+    """Count responses that were not paid for: cache hits and calls joined in flight."""
+    if count:
+        _record(
+            stage,
+            model,
+            cacheHits=count,
+            savedPromptTokens=prompt_chars // CHARS_PER_TOKEN,
+            savedCompletionTokens=completion_chars // CHARS_PER_TOKEN,
+            savedPages=pages,
+            savedLatencyMs=count * _model_latency_ms.get(model or "unknown", 0.0),
+        )
+
+
+@contextmanager
+def usage_scope(scope: str, **attributes: Any) -> Iterator[Optional[UsageScope]]:
+    """
+    Collect the model usage of the enclosed block and store it when the block exits.
+
+    Args:
+        scope: Scope kind, e.g. "ingest" or "generation_subchapter"
+        **attributes: Stored with the record, e.g. bookId and subchapterId
+
+    Yields:
+        The open UsageScope, or None when USAGE_TRACKING_ENABLED is off
+    """
+    tracker = get_usage_tracker()
+    if tracker is None:
+        yield None
+        return
+    current = UsageScope(scope, _current_scope.get(), **attributes)
+    token = _current_scope.set(current)
+    try:
+        yield current
+    finally:
+        try:
+            _current_scope.reset(token)
+        except ValueError:
+            # Closed from another context, e.g. a generator finalised elsewhere
+            _current_scope.set(current.parent)
+        tracker.save(current)
+
+
+class UsageTracker:
+    """Stores usage records in MongoDB and reports on them."""
+
+    DEFAULT_RETENTION_DAYS = 90
+
+    def __init__(
+        self,
+        collection: Optional[Collection] = None,
+        prices: Optional[Dict[str, Dict[str, float]]] = None,
+        retention_days: int = DEFAULT_RETENTION_DAYS,
+    ):
+        self.prices = prices or {}
+        self.retention_days = retention_days
+        self._collection = collection
+        self._indexes_ready = False
+
+    @property
+    def collection(self) -> Collection:
+        if self._collection is None:
+            self._collection = get_mongo_client()["bookTestMaker"]["usageRecords"]
+        if not self._indexes_ready:
+            self._collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._collection.create_index([("bookId", ASCENDING), ("startedAt", DESCENDING)])
+            self._collection.create_index([("scope", ASCENDING), ("startedAt", DESCENDING)])
+            self._indexes_ready = True
+        return self._collection
+
+    def save(self, scope: UsageScope) -> None:
+        """Store a closed scope's record; scopes without model usage are skipped."""
+        if scope.empty:
+            return
+        document = scope.to_document(self.prices)
+        document["expiresAt"] = scope.started_at + timedelta(days=self.retention_days)
+        try:
+            self.collection.insert_one(document)
+        except Exception as exc:
+            print(f"Storing {scope.scope} usage failed: {exc}")
+
+    def _match(self, since: Optional[datetime], **conditions: Any) -> Dict[str, Any]:
+        match = {"scope": {"$in": list(BOOK_SCOPES)}, **conditions}
+        if since is not None:
+            match["startedAt"] = {"$gte": since}
+        return match
+
+    def books(self, since: Optional[datetime] = None, limit: int = 20, sort: str = "costUsd") -> List[Dict[str, Any]]:
+        """
+        Aggregate usage per book, largest first.
+
+        Args:
+            since: Only count records started at or after this time
+            limit: Number of books to return
+            sort: Total to rank books by, e.g. "costUsd", "tokens" or "latencyMs"
+
+        Returns:
+            One dict per book with bookId, runs and the summed totals
+        """
+        pipeline = [
+            {"$match": self._match(since, bookId={"$exists": True})},
+            {"$group": {
+                "_id": "$bookId",
+                "runs": {"$sum": 1},
+                **{name: {"$sum": f"$totals.{name}"} for name in _TOTALS},
+            }},
+            {"$sort": {sort: -1}},
+            {"$limit": limit},
+        ]
+        return [_rename_id(row, "bookId") for row in self.collection.aggregate(pipeline)]
+
+    def book(self, book_id: str, since: Optional[datetime] = None, limit: int = 20) -> Dict[str, Any]:
+        """
+        Break one book's usage down by stage and model, and by subchapter.
+
+        Returns:
+            Dict with bookId, totals, byStage and the top subchapters by cost
+        """
+        match = {"$match": self._match(since, bookId=book_id)}
+        by_stage = self.collection.aggregate([
+            match,
+            {"$unwind": "$usage"},
+            {"$group": {
+                "_id": {"scope": "$scope", "stage": "$usage.stage", "model": "$usage.model"},
+                **{name: {"$sum": f"$usage.{name}"} for name in _STAGE_TOTALS},
+            }},
+            {"$sort": {"costUsd": -1}},
+        ])
+        subchapters = self.collection.aggregate([
+            match,
+            {"$match": {"subchapterId": {"$exists": True}}},
+            {"$group": {
+                "_id": "$subchapterId",
+                "requests": {"$sum": 1},
+                **{name: {"$sum": f"$totals.{name}"} for name in _TOTALS},
+            }},
+            {"$sort": {"costUsd": -1}},
+            {"$limit": limit},
+        ])
+        stages = [dict(row.pop("_id"), **row) for row in by_stage]
+        totals = {name: sum(row.get(name, 0) for row in stages) for name in _STAGE_TOTALS}
+        totals["tokens"] = totals["promptTokens"] + totals["completionTokens"]
+        return {
+            "bookId": book_id,
+            "totals": totals,
+            "byStage": stages,
+            "subchapters": [_rename_id(row, "subchapterId") for row in subchapters],
+        }
+
+    def requests(self, since: Optional[datetime] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the most expensive generation requests."""
+        query: Dict[str, Any] = {"scope": "generation_request"}
+        if since is not None:
+            query["startedAt"] = {"$gte": since}
+        cursor = self.collection.find(query, {"_id": 0, "expiresAt": 0})
+        return list(cursor.sort("totals.costUsd", DESCENDING).limit(limit))
+
+
+_TOTALS = (
+    "calls", "errors", "tokens", "promptTokens", "completionTokens", "pages",
+    "latencyMs", "cacheHits", "savedLatencyMs", "costUsd", "savedCostUsd",
+)
+_STAGE_TOTALS = _COUNTERS + ("costUsd", "savedCostUsd")
+
+
+def _rename_id(row: Dict[str, Any], name: str) -> Dict[str, Any]:
+    return {name: row.pop("_id"), **row}
+
+
+_tracker: Optional[UsageTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> Optional[UsageTracker]:
+    """
+    Get the process-wide usage tracker.
+
+    Configured with USAGE_TRACKING_ENABLED, USAGE_PRICES (JSON mapping model
+    name to {"prompt": USD per million prompt tokens, "completion": USD per
+    million completion tokens, "page": USD per OCR page}) and
+    USAGE_RETENTION_DAYS.
+
+    Returns:
+        Shared UsageTracker instance, or None when tracking is disabled
+    """
+    global _tracker
+    if os.getenv("USAGE_TRACKING_ENABLED", "true").strip().lower() in {"0", "false", "no"}:
+        return None
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = UsageTracker(
+                    prices=json.loads(os.getenv("USAGE_PRICES") or "{}"),
+                    retention_days=int(
+                        os.getenv("USAGE_RETENTION_DAYS", UsageTracker.DEFAULT_RETENTION_DAYS)
+                    ),
+                )
+    return _tracker
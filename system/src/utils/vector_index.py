@@ -0,0 +1,268 @@
+"""Lifecycle management of the Atlas vector search index on chunkEmbeddings.
+
+VectorIndexManager creates vectorSearch indexes with explicit vector and
+filter fields, waits until they are queryable and swaps between versions
+blue/green style. The active index name is kept in the indexRegistry
+collection, so a rebuild with new dimensions or similarity is built next to
+the live index and only switched to once it can answer queries.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from pymongo.collection import Collection
+from pymongo.operations import SearchIndexModel
+
+from .database_funcs import get_mongo_client, vector_index_definition
+
+DEFAULT_INDEX_NAME = "vector_index"
+REGISTRY_COLLECTION = "indexRegistry"
+
+
+class VectorIndexManager:
+    """Creates, versions and monitors a collection's vector search index."""
+
+    DEFAULT_TIMEOUT_SECONDS = 900
+    DEFAULT_POLL_SECONDS = 5
+
+    def __init__(
+        self,
+        collection: Collection,
+        base_name: str = DEFAULT_INDEX_NAME,
+        path: str = "embedding",
+        dimensions: int = 1024,
+        similarity: str = "cosine",
+        filter_paths: Sequence[str] = ("bookID", "subchapterID"),
+        registry: Optional[Collection] = None,
+    ):
+        self.collection = collection
+        self.base_name = base_name
+        self.path = path
+        self.dimensions = dimensions
+        self.similarity = similarity
+        self.filter_paths = tuple(filter_paths)
+        self.registry = registry if registry is not None else collection.database[REGISTRY_COLLECTION]
+        self.registry_id = f"{collection.name}.{base_name}"
+
+    def definition(self) -> Dict[str, Any]:
+        return vector_index_definition(self.path, self.dimensions, self.similarity, self.filter_paths)
+
+    def definition_hash(self) -> str:
+        payload = json.dumps(self.definition(), sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+    def active(self) -> Optional[Dict[str, Any]]:
+        """Return the registry entry of the active index, if one was recorded."""
+        return self.registry.find_one({"_id": self.registry_id})
+
+    def status(self, name: str) -> Optional[Dict[str, Any]]:
+        """Return the search index description from $listSearchIndexes, or None."""
+        for index in self.collection.list_search_indexes(name):
+            return index
+        return None
+
+    def wait_until_queryable(
+        self,
+        name: str,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        poll_interval: float = DEFAULT_POLL_SECONDS,
+    ) -> float:
+        """
+        Poll until the index reports queryable.
+
+        Returns:
+            Seconds waited
+
+        Raises:
+            RuntimeError: If the index build failed
+            TimeoutError: If it is not queryable within timeout
+        """
+        start = time.monotonic()
+        while True:
+            index = self.status(name) or {}
+            if index.get("queryable"):
+                return time.monotonic() - start
+            if index.get("status") == "FAILED":
+                raise RuntimeError(f"Vector index '{name}' failed to build: {index}")
+            if time.monotonic() - start > timeout:
+                raise TimeoutError(f"Vector index '{name}' not queryable after {timeout:.0f}s")
+            time.sleep(poll_interval)
+
+    def ensure(
+        self,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        keep_previous: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Make sure the active index matches the configured definition.
+
+        When the definition changed (or no index is registered) a new version
+        is built alongside the current one, and the registry is switched to it
+        once it is queryable. The previous version is then dropped unless
+        keep_previous is set.
+
+        Returns:
+            Report dict with index, action ("unchanged" or "created"),
+            build_seconds, previous and the stats() of the active index
+        """
+        definition_hash = self.definition_hash()
+        current = self.active()
+        if current and current.get("definitionHash") == definition_hash:
+            if self.status(current["activeIndex"]) is not None:
+                self.wait_until_queryable(current["activeIndex"], timeout)
+                return {
+                    "index": current["activeIndex"],
+                    "action": "unchanged",
+                    "build_seconds": current.get("buildSeconds"),
+                    "previous": None,
+                    "stats": self.stats(current["activeIndex"]),
+                }
+
+        version = (current or {}).get("version", 0) + 1
+        name = f"{self.base_name}_v{version}"
+        print(f"Building vector index '{name}' on '{self.collection.name}'...")
+        self.collection.create_search_index(
+            SearchIndexModel(definition=self.definition(), name=name, type="vectorSearch")
+        )
+        build_seconds = self.wait_until_queryable(name, timeout)
+        print(f"Vector index '{name}' queryable after {build_seconds:.1f}s")
+
+        previous = (current or {}).get("activeIndex")
+        if previous is None and self.status(self.base_name) is not None:
+            # Index created before versioning was introduced
+            previous = self.base_name
+        self.registry.replace_one(
+            {"_id": self.registry_id},
+            {
+                "_id": self.registry_id,
+                "activeIndex": name,
+                "version": version,
+                "definitionHash": definition_hash,
+                "definition": self.definition(),
+                "buildSeconds": build_seconds,
+                "activatedAt": datetime.utcnow(),
+                "previousIndex": previous,
+            },
+            upsert=True,
+        )
+        _active_names.clear()
+
+        if previous and previous != name and not keep_previous:
+            self.drop(previous)
+
+        return {
+            "index": name,
+            "action": "created",
+            "build_seconds": build_seconds,
+            "previous": previous,
+            "stats": self.stats(name),
+        }
+
+    def drop(self, name: str) -> None:
+        """Drop a search index, ignoring ones that no longer exist."""
+        try:
+            self.collection.drop_search_index(name)
+            print(f"Dropped vector index '{name}'")
+        except Exception as exc:
+            print(f"Error dropping vector index '{name}': {exc}")
+
+    def stats(self, name: str) -> Dict[str, Any]:
+        """
+        Report index status and size.
+
+        Atlas does not expose search index storage through the driver, so the
+        vector payload is estimated from the number of indexed documents and
+        the vector width (float32 per dimension).
+        """
+        index = self.status(name) or {}
+        documents = self.collection.count_documents({self.path: {"$exists": True}})
+        return {
+            "status": index.get("status"),
+            "queryable": bool(index.get("queryable")),
+            "documents": documents,
+            "estimated_vector_bytes": documents * self.dimensions * 4,
+        }
+
+    def wait_until_searchable(
+        self,
+        book_id: Any,
+        timeout: float = 300,
+        poll_interval: float = 2,
+    ) -> float:
+        """
+        Poll until the book's chunks are returned by $vectorSearch.
+
+        Atlas indexes new documents asynchronously; waiting here makes a
+        finished book immediately usable for retrieval.
+
+        Returns:
+            Seconds waited
+        """
+        sample = self.collection.find_one({"bookID": book_id}, {self.path: 1})
+        if not sample:
+            return 0.0
+
+        name = active_index_name(self.collection, self.base_name)
+        pipeline: List[Dict[str, Any]] = [
+            {
+                "$vectorSearch": {
+                    "index": name,
+                    "queryVector": sample[self.path],
+                    "path": self.path,
+                    "filter": {"bookID": book_id},
+                    "exact": True,
+                    "limit": 1,
+                }
+            },
+            {"$project": {"_id": 1}},
+        ]
+        start = time.monotonic()
+        while not list(self.collection.aggregate(pipeline)):
+            if time.monotonic() - start > timeout:
+                raise TimeoutError(f"Book {book_id} not searchable after {timeout:.0f}s")
+            time.sleep(poll_interval)
+        return time.monotonic() - start
+
+
+_active_names: Dict[str, tuple] = {}
+_active_names_lock = threading.Lock()
+_default_collection: Optional[Collection] = None
+ACTIVE_NAME_TTL_SECONDS = 60
+
+
+def active_index_name(
+    collection: Optional[Collection] = None,
+    base_name: str = DEFAULT_INDEX_NAME,
+) -> str:
+    """
+    Return the name of the active vector index for collection.
+
+    Falls back to base_name when no version has been registered, so indexes
+    created before the manager existed keep working. Lookups are cached for
+    ACTIVE_NAME_TTL_SECONDS.
+    """
+    global _default_collection
+    if collection is None:
+        if _default_collection is None:
+            _default_collection = get_mongo_client()["bookTestMaker"]["chunkEmbeddings"]
+        collection = _default_collection
+    registry_id = f"{collection.name}.{base_name}"
+
+    cached = _active_names.get(registry_id)
+    if cached and time.monotonic() - cached[1] < ACTIVE_NAME_TTL_SECONDS:
+        return cached[0]
+
+    try:
+        entry = collection.database[REGISTRY_COLLECTION].find_one({"_id": registry_id}, {"activeIndex": 1})
+        name = (entry or {}).get("activeIndex") or base_name
+    except Exception as exc:
+        print(f"Vector index registry lookup failed: {exc}")
+        name = cached[0] if cached else base_name
+
+    with _active_names_lock:
+        _active_names[registry_id] = (name, time.monotonic())
+    return name
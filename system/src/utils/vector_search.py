@@ -0,0 +1,101 @@
+"""Configuration of Atlas $vectorSearch queries."""
+
+import os
+from typing import Any, Dict, List, Optional
+
+from .vector_index import active_index_name
+
+
+class VectorSearchConfig:
+    """How $vectorSearch stages are built: exact (ENN) or approximate (ANN) search.
+
+    In ANN mode numCandidates is limit * candidate_ratio, capped at
+    MAX_NUM_CANDIDATES; more candidates raise recall at the cost of latency.
+    Filters only work on fields declared as filter fields in the index (see
+    create_vector_index).
+    """
+
+    MODES = {"exact", "ann"}
+    DEFAULT_INDEX_NAME = "vector_index"
+    DEFAULT_PATH = "embedding"
+    DEFAULT_CANDIDATE_RATIO = 20
+    MAX_NUM_CANDIDATES = 10000
+
+    def __init__(
+        self,
+        mode: str = "exact",
+        candidate_ratio: int = DEFAULT_CANDIDATE_RATIO,
+        index_name: Optional[str] = DEFAULT_INDEX_NAME,
+        path: str = DEFAULT_PATH,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Vector search mode must be one of {sorted(self.MODES)}")
+        self.mode = mode
+        self.candidate_ratio = max(candidate_ratio, 1)
+        # None: use the active index registered by VectorIndexManager
+        self._index_name = index_name
+        self.path = path
+
+    @property
+    def index_name(self) -> str:
+        """
+        The configured index, or else the active one.
+
+        The active index is looked up when the first stage is built, not when
+        the configuration is created, and active_index_name caches it.
+        """
+        if self._index_name is not None:
+            return self._index_name
+        return active_index_name(base_name=self.DEFAULT_INDEX_NAME)
+
+    @classmethod
+    def from_env(cls) -> "VectorSearchConfig":
+        """
+        Build the configuration from VECTOR_SEARCH_MODE, VECTOR_SEARCH_CANDIDATE_RATIO
+        and VECTOR_SEARCH_INDEX. Without VECTOR_SEARCH_INDEX the index the
+        VectorIndexManager registered as active is used, resolved on first search.
+        """
+        return cls(
+            mode=os.getenv("VECTOR_SEARCH_MODE", "exact").strip().lower(),
+            candidate_ratio=int(os.getenv("VECTOR_SEARCH_CANDIDATE_RATIO", cls.DEFAULT_CANDIDATE_RATIO)),
+            index_name=os.getenv("VECTOR_SEARCH_INDEX") or None,
+        )
+
+    def num_candidates(self, limit: int) -> int:
+        return min(max(limit * self.candidate_ratio, limit), self.MAX_NUM_CANDIDATES)
+
+    def stage(
+        self,
+        query_vector: List[float],
+        limit: int,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Build a $vectorSearch stage.
+
+        Args:
+            query_vector: Query embedding
+            limit: Number of results to return
+            filter: Pre-filter on indexed filter fields
+
+        Returns:
+            Aggregation stage dict
+        """
+        stage: Dict[str, Any] = {
+            "index": self.index_name,
+            "queryVector": query_vector,
+            "path": self.path,
+            "limit": limit,
+        }
+        if filter:
+            stage["filter"] = filter
+        if self.mode == "exact":
+            stage["exact"] = True
+        else:
+            stage["numCandidates"] = self.num_candidates(limit)
+        return {"$vectorSearch": stage}
+
+    def describe(self) -> str:
+        if self.mode == "exact":
+            return "exact"
+        return f"ann x{self.candidate_ratio}"